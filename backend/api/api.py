@@ -1,10 +1,11 @@
 from contextlib import asynccontextmanager
 
-from api.routes import init_routes
+from api.response_cache import ResponseCacheMiddleware, response_cache
+from api.routes import init_routes, load_and_index
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from database import init_db
+from database.reload import load_job
 
 
 def create_app() -> FastAPI:        
@@ -17,13 +18,18 @@ def create_app() -> FastAPI:
 
     @asynccontextmanager
     async def lifespan(app: FastAPI):
-        init_db()
+        # A carga roda em segundo plano: o servidor aceita conexões de imediato e
+        # /health/ready indica quando os dados estão disponíveis
+        load_job.start(load_and_index, kind="inicializacao")
         yield
 
     app = FastAPI(
         title="Teste Pedro Garcia",
         lifespan=lifespan,
     )
+    # Adicionado antes do CORS para ficar por dentro dele: 304 e HITs também levam os
+    # cabeçalhos de CORS
+    app.add_middleware(ResponseCacheMiddleware, cache=response_cache)
     app.add_middleware(
         CORSMiddleware,
         allow_origins=cors_origins,
@@ -0,0 +1,245 @@
+"""Cache das respostas dos GET de leitura da API.
+
+Os dados só mudam na carga, mas cada GET ia ao PostgreSQL. As respostas 200 ficam em um
+LRU em memória, limitado em bytes e com validade (TTL), com a chave formada pela rota e
+pelos parâmetros da query em ordem. Cada entrada guarda a versão em que foi gerada,
+um contador incrementado a cada carga deste processo (`bump`) e a versão dos dados do
+banco (`data_version_cache`), que cobre as recargas feitas por outros workers.
+
+As respostas levam ETag (hash do corpo) e Last-Modified (momento da carga dos dados, igual
+em todos os workers); `If-None-Match` igual ao ETag recebe 304 sem corpo. Requisições
+idênticas simultâneas com o cache frio esperam a primeira (single flight) em vez de
+repetir a consulta.
+"""
+
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from email.utils import formatdate
+from typing import cast
+
+from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+from starlette.types import ASGIApp
+
+from database.settings import RESPONSE_CACHE_MB, RESPONSE_CACHE_TTL
+from database.versioning import data_version_cache
+
+# Rotas em cache: leitura da API; administração e health checks ficam de fora
+CACHED_PREFIX = "/api/"
+EXCLUDED_PREFIXES = ("/api/admin",)
+# Cabeçalhos da resposta original que não são guardados (recalculados ou por requisição)
+SKIPPED_HEADERS = {"content-length", "etag", "last-modified", "cache-control", "x-cache"}
+
+# (rota, parâmetros normalizados)
+CacheKey = tuple[str, str]
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    version: tuple[int, str]
+    status_code: int
+    body: bytes
+    headers: tuple[tuple[str, str], ...]
+    etag: str
+    last_modified: str | None
+    expires_at: float
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(k) + len(v) for k, v in self.headers)
+
+
+def normalized_key(request: Request) -> CacheKey:
+    """Rota e parâmetros em ordem. Parâmetros vazios ficam na chave: as rotas os tratam
+    de forma diferente da ausência (`?cursor=` é um cursor inválido)."""
+    params = sorted(request.query_params.multi_items())
+    return request.url.path, "&".join(f"{k}={v}" for k, v in params)
+
+
+async def read_body(response: Response) -> bytes:
+    """Corpo da resposta de `call_next`, que chega em streaming."""
+    stream = cast(StreamingResponse, response)
+    return b"".join(
+        [
+            chunk.encode(response.charset) if isinstance(chunk, str) else bytes(chunk)
+            async for chunk in stream.body_iterator
+        ]
+    )
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+class ResponseCache:
+    def __init__(self, max_bytes: int, ttl: float) -> None:
+        self.max_bytes = max_bytes
+        # Uma resposta maior que isso não entra (tomaria o lugar de muitas pequenas)
+        self.max_entry_bytes = max_bytes // 8
+        self.ttl = ttl
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[CacheKey, CachedResponse] = OrderedDict()
+        self._bytes = 0
+        self._inflight: dict[CacheKey, asyncio.Future[CachedResponse | None]] = {}
+        self._stats = dict.fromkeys(
+            ("hits", "misses", "not_modified", "coalesced", "evictions", "expired", "uncacheable"),
+            0,
+        )
+
+    def bump(self) -> None:
+        """Invalida tudo: chamado ao fim de cada carga neste processo."""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._bytes = 0
+        data_version_cache.invalidate()
+
+    def current_version(self) -> tuple[tuple[int, str], str | None]:
+        """(versão das entradas, Last-Modified dos dados em uso)."""
+        version, loaded_at = data_version_cache.current()
+        last_modified = formatdate(loaded_at.timestamp(), usegmt=True) if loaded_at else None
+        return (self.generation, version), last_modified
+
+    def count(self, stat: str) -> None:
+        with self._lock:
+            self._stats[stat] += 1
+
+    def get(self, key: CacheKey, version: tuple[int, str]) -> CachedResponse | None:
+        """Entrada válida para `key`; as de outra versão ou vencidas são descartadas."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.version != version or entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self._stats["expired"] += 1
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: CacheKey, entry: CachedResponse) -> bool:
+        if entry.size > self.max_entry_bytes:
+            return False
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += entry.size
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+        return True
+
+    def _remove(self, key: CacheKey) -> None:
+        self._bytes -= self._entries.pop(key).size
+
+    def stats(self) -> dict[str, int | float]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_ratio": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "generation": self.generation,
+            }
+
+    async def fetch(
+        self, request: Request, call_next: RequestResponseEndpoint
+    ) -> tuple[CachedResponse | Response, str]:
+        """(entrada, "HIT"/"MISS") do cache ou gerada pela rota, ou (resposta, "BYPASS")
+        quando a resposta não é cacheável. Requisições idênticas simultâneas esperam a
+        primeira em vez de também irem ao banco."""
+        version, last_modified = await asyncio.to_thread(self.current_version)
+        key = normalized_key(request)
+        if (entry := self.get(key, version)) is not None:
+            self.count("hits")
+            return entry, "HIT"
+
+        if (pending := self._inflight.get(key)) is not None:
+            self.count("coalesced")
+            entry = await asyncio.shield(pending)
+            if entry is not None:
+                self.count("hits")
+                return entry, "HIT"
+            # A primeira não gerou resposta cacheável: cada uma segue pela rota
+            return await call_next(request), "BYPASS"
+
+        self.count("misses")
+        future: asyncio.Future[CachedResponse | None] = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        entry = None
+        try:
+            response = await call_next(request)
+            if response.status_code != 200:
+                self.count("uncacheable")
+                return response, "BYPASS"
+            body = await read_body(response)
+            entry = CachedResponse(
+                version=version,
+                status_code=response.status_code,
+                body=body,
+                headers=tuple(
+                    (name, value)
+                    for name, value in response.headers.items()
+                    if name not in SKIPPED_HEADERS
+                ),
+                etag=f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"',
+                last_modified=last_modified,
+                expires_at=time.monotonic() + self.ttl,
+            )
+            if not self.put(key, entry):
+                self.count("uncacheable")
+            return entry, "MISS"
+        finally:
+            del self._inflight[key]
+            future.set_result(entry)
+
+
+class ResponseCacheMiddleware(BaseHTTPMiddleware):
+    def __init__(self, app: ASGIApp, cache: ResponseCache) -> None:
+        super().__init__(app)
+        self.cache = cache
+
+    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
+        path = request.url.path
+        if (
+            request.method != "GET"
+            or not path.startswith(CACHED_PREFIX)
+            or path.startswith(EXCLUDED_PREFIXES)
+        ):
+            return await call_next(request)
+
+        entry, cache_status = await self.cache.fetch(request, call_next)
+        if isinstance(entry, Response):
+            return entry
+
+        headers = {
+            "ETag": entry.etag,
+            # O navegador guarda a resposta mas revalida sempre pelo ETag (304 barato)
+            "Cache-Control": "no-cache",
+            "X-Cache": cache_status,
+        }
+        if entry.last_modified is not None:
+            headers["Last-Modified"] = entry.last_modified
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and etag_matches(if_none_match, entry.etag):
+            self.cache.count("not_modified")
+            return Response(status_code=304, headers=headers)
+        response = Response(content=entry.body, status_code=entry.status_code, headers=headers)
+        for name, value in entry.headers:
+            if name not in response.headers:
+                response.headers[name] = value
+        return response
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_MB * 1024 * 1024, RESPONSE_CACHE_TTL)
@@ -1,9 +1,54 @@
-from fastapi import FastAPI, status, Query, Depends, HTTPException
+import secrets
+from functools import partial
+
+from fastapi import FastAPI, status, Query, Depends, HTTPException, Header
 from fastapi.responses import JSONResponse
-from sqlalchemy import func
 from sqlalchemy.orm import Session
 
-from database import get_db, Operadora, DespesaConsolidada, DespesaAgregada
+from api.response_cache import response_cache
+from database import get_db, init_db, Operadora
+from database.reload import load_job
+from database.pagination import (
+    InvalidCursorError,
+    count_cache,
+    decode_cursor,
+    encode_cursor,
+    estimated_count,
+)
+from database.search_index import search_index
+from database.stats_snapshot import COMPLEMENTARES, ESTATISTICAS, read_snapshot
+from database.settings import ADMIN_TOKEN
+from database.versioning import data_version_cache
+
+
+def require_admin(x_admin_token: str | None = Header(None)) -> None:
+    if not ADMIN_TOKEN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Administração desativada: defina ADMIN_TOKEN no .env"
+        )
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token inválido")
+
+
+def load_and_index(force_reload: bool = False) -> bool:
+    """Migra/carrega o banco e reconstrói o índice de busca e o cache de respostas do processo."""
+    reloaded = init_db(force_reload=force_reload)
+    load_job.progress(step="indice_busca")
+    search_index.rebuild()
+    response_cache.bump()
+    return reloaded
+
+
+def read_cursor(
+    cursor: str | None, scope: str, version: str, types: tuple[type, ...]
+) -> tuple[object, ...] | None:
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor, scope, version, types)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from e
 
 
 def init_routes(app: FastAPI) -> None:
@@ -14,29 +59,64 @@ def init_routes(app: FastAPI) -> None:
         return JSONResponse(content=content, status_code=status.HTTP_200_OK)
 
 
+    @app.get("/health/live", tags=["Health Check"])
+    async def health_live() -> JSONResponse:
+        """Processo de pé; não depende do banco nem da carga dos dados."""
+        return JSONResponse(content={"status": "alive"}, status_code=status.HTTP_200_OK)
+
+
+    @app.get("/health/ready", tags=["Health Check"])
+    async def health_ready() -> JSONResponse:
+        """200 quando os dados estão prontos para consulta; 503 com o andamento da carga."""
+        content = {"ready": load_job.ready, "load": load_job.status()}
+        status_code = status.HTTP_200_OK if load_job.ready else status.HTTP_503_SERVICE_UNAVAILABLE
+        return JSONResponse(content=content, status_code=status_code)
+
+
+    # Handlers síncronos: o FastAPI os roda no threadpool, e a consulta da versão dos dados
+    # e a reconstrução do índice de busca não bloqueiam o event loop
     @app.get("/api/operadoras", tags=["Operadoras"])
-    async def list_operadoras(
+    def list_operadoras(
         page: int = Query(1, ge=1),
         limit: int = Query(10, ge=1, le=100),
         search: str = Query("", description="Busca por razão social ou CNPJ"),
+        cursor: str | None = Query(
+            None, description="next_cursor da página anterior (substitui page)"
+        ),
+        count: str = Query(
+            "exact",
+            pattern="^(exact|estimated)$",
+            description="Total sem busca: exato (em cache por versão dos dados) ou estimado",
+        ),
         db: Session = Depends(get_db)
     ):
-        offset = (page - 1) * limit
-        
-        query = db.query(Operadora)
-        
+        # Com cursor a página começa depois da última linha entregue (keyset), sem OFFSET
+        offset = 0 if cursor else (page - 1) * limit
+        version = data_version_cache.get(db.connection())
+
         if search:
-            search_term = f"%{search}%"
-            query = query.filter(
-                (Operadora.razao_social.ilike(search_term)) |
-                (Operadora.cnpj.ilike(search_term))
-            )
-        
-        total_records = query.count()
-        operadoras = query.offset(offset).limit(limit).all()
+            # Índice em memória (trigramas): ILIKE '%termo%' varreria a tabela a cada busca
+            scope = f"busca:{search}"
+            after = read_cursor(cursor, scope, version, (int, int, str, int))
+            search_index.refresh(db)
+            total_records, data, next_key = search_index.search(search, offset, limit, after)
+        else:
+            scope = "operadoras"
+            after = read_cursor(cursor, scope, version, (int,))
+            query = db.query(Operadora).order_by(Operadora.id)
+            if after:
+                query = query.filter(Operadora.id > after[0])
+            operadoras = query.offset(offset).limit(limit + 1).all()
+            next_key = (operadoras[limit - 1].id,) if len(operadoras) > limit else None
 
-        return {
-            "data": [
+            estimated = estimated_count(db, "operadoras") if count == "estimated" else None
+            if estimated is not None:
+                total_records = estimated
+            else:
+                total_records = count_cache.get_or_count(
+                    (version, scope), lambda: db.query(Operadora).count()
+                )
+            data = [
                 {
                     "cnpj": op.cnpj,
                     "razao_social": op.razao_social,
@@ -44,12 +124,34 @@ def init_routes(app: FastAPI) -> None:
                     "modalidade": op.modalidade,
                     "uf": op.uf
                 }
-                for op in operadoras
-            ],
+                for op in operadoras[:limit]
+            ]
+
+        return {
+            "data": data,
             "total": total_records,
-            "page": page,
+            "page": None if cursor else page,
             "limit": limit,
-            "total_pages": (total_records + limit - 1) // limit
+            "total_pages": (total_records + limit - 1) // limit,
+            "next_cursor": encode_cursor(scope, version, next_key) if next_key else None
+        }
+
+
+    @app.get("/api/operadoras/suggest", tags=["Operadoras"])
+    def suggest_operadoras(
+        q: str = Query(
+            ..., min_length=1, description="Início ou trecho da razão social ou do CNPJ"
+        ),
+        limit: int = Query(8, ge=1, le=20),
+        db: Session = Depends(get_db)
+    ):
+        """Autocompletar da caixa de busca: operadoras mais relevantes para o termo."""
+        search_index.refresh(db)
+        return {
+            "data": [
+                {"cnpj": op["cnpj"], "razao_social": op["razao_social"], "uf": op["uf"]}
+                for op in search_index.suggest(q, limit)
+            ]
         }
 
 
@@ -73,10 +175,13 @@ def init_routes(app: FastAPI) -> None:
 
 
     @app.get("/api/operadoras/{cnpj}/despesas", tags=["Operadoras"])
-    async def get_operadora_despesas(
+    def get_operadora_despesas(
         cnpj: str,
         page: int = Query(1, ge=1),
         limit: int = Query(10, ge=1, le=100),
+        cursor: str | None = Query(
+            None, description="next_cursor da página anterior (substitui page)"
+        ),
         db: Session = Depends(get_db)
     ):
         operadora = db.query(Operadora).filter(Operadora.cnpj == cnpj).first()
@@ -87,27 +192,22 @@ def init_routes(app: FastAPI) -> None:
                 detail=f"Operadora com CNPJ {cnpj} não encontrada"
             )
 
-        # Os dados são YTD (acumulados). Calcular valor isolado do trimestre.
+        # Com cursor a página começa depois da última linha entregue (keyset), sem OFFSET
+        offset = 0 if cursor else (page - 1) * limit
+        version = data_version_cache.get(db.connection())
+        scope = f"despesas:{operadora.cnpj}"
+        after = read_cursor(cursor, scope, version, (int, int, int))
+
+        # Os dados são YTD (acumulados); o valor isolado do trimestre é gravado na carga.
+        # O id desempata a ordem; o índice (operadora_id, ano, trimestre, id) cobre o keyset
         from sqlalchemy import text
         
-        query_despesas = text("""
-            WITH despesas_isoladas AS (
-                SELECT 
-                    id,
-                    operadora_id,
-                    ano,
-                    trimestre,
-                    valor_despesa AS valor_ytd,
-                    valor_despesa - COALESCE(
-                        LAG(valor_despesa) OVER (PARTITION BY operadora_id, ano ORDER BY trimestre),
-                        0
-                    ) AS valor_isolado
-                FROM despesas_consolidadas
-            )
-            SELECT ano, trimestre, valor_ytd, valor_isolado
-            FROM despesas_isoladas
-            WHERE operadora_id = :operadora_id
-            ORDER BY ano DESC, trimestre DESC
+        keyset = "AND (ano, trimestre, id) < (:ano, :trimestre, :id)" if after else ""
+        query_despesas = text(f"""
+            SELECT id, ano, trimestre, valor_despesa AS valor_ytd, valor_trimestre AS valor_isolado
+            FROM despesas_consolidadas
+            WHERE operadora_id = :operadora_id {keyset}
+            ORDER BY ano DESC, trimestre DESC, id DESC
             LIMIT :limit OFFSET :offset
         """)
         
@@ -117,16 +217,21 @@ def init_routes(app: FastAPI) -> None:
             WHERE operadora_id = :operadora_id
         """)
         
-        offset = (page - 1) * limit
-        
-        total_result = db.execute(query_count, {"operadora_id": operadora.id}).fetchone()
-        total_records = total_result.total if total_result else 0
+        total_records = count_cache.get_or_count(
+            (version, scope),
+            lambda: db.execute(query_count, {"operadora_id": operadora.id}).scalar_one()
+        )
         
-        despesas = db.execute(query_despesas, {
-            "operadora_id": operadora.id,
-            "limit": limit,
-            "offset": offset
-        }).fetchall()
+        params: dict[str, object] = {
+            "operadora_id": operadora.id, "limit": limit + 1, "offset": offset
+        }
+        if after:
+            params.update(zip(("ano", "trimestre", "id"), after, strict=True))
+        despesas = db.execute(query_despesas, params).fetchall()
+        next_key = (
+            (despesas[limit - 1].ano, despesas[limit - 1].trimestre, despesas[limit - 1].id)
+            if len(despesas) > limit else None
+        )
 
         return {
             "data": [
@@ -136,83 +241,36 @@ def init_routes(app: FastAPI) -> None:
                     "valor_despesa": float(d.valor_isolado),  # Valor isolado do trimestre
                     "valor_ytd": float(d.valor_ytd)  # Valor acumulado (YTD) para referência
                 }
-                for d in despesas
+                for d in despesas[:limit]
             ],
             "operadora": {
                 "cnpj": operadora.cnpj,
                 "razao_social": operadora.razao_social
             },
             "total": total_records,
-            "page": page,
+            "page": None if cursor else page,
             "limit": limit,
-            "total_pages": (total_records + limit - 1) // limit
+            "total_pages": (total_records + limit - 1) // limit,
+            "next_cursor": encode_cursor(scope, version, next_key) if next_key else None
         }
 
 
-    @app.get("/api/estatisticas", tags=["Estatísticas"])
-    async def get_estatisticas(db: Session = Depends(get_db)):
-        # Usamos despesas_agregadas que já tem valores desacumulados pelo ETL
-        stats = db.query(
-            func.sum(DespesaAgregada.total_despesas).label("total"),
-            func.avg(DespesaAgregada.media_trimestral).label("media"),
-            func.count(DespesaAgregada.id).label("registros")
-        ).first()
-        
-        total_despesas = float(stats.total) if stats and stats.total else 0.0
-        media_despesas = float(stats.media) if stats and stats.media else 0.0
-        total_registros = stats.registros if stats else 0
-
-        top_operadoras = (
-            db.query(
-                Operadora.cnpj,
-                Operadora.razao_social,
-                Operadora.uf,
-                func.sum(DespesaAgregada.total_despesas).label("total_despesas")
+    def snapshot_response(db: Session, nome: str) -> JSONResponse:
+        # Calculado uma vez por versão dos dados, na carga (database/stats_snapshot.py)
+        snapshot = read_snapshot(db, nome)
+        if snapshot is None:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Estatísticas ainda não calculadas; aguarde o fim da carga"
             )
-            .join(DespesaAgregada, Operadora.id == DespesaAgregada.operadora_id)
-            .group_by(Operadora.id)
-            .order_by(func.sum(DespesaAgregada.total_despesas).desc())
-            .limit(5)
-            .all()
-        )
+        versao, conteudo = snapshot
+        return JSONResponse(content=conteudo, headers={"X-Data-Version": versao})
 
-        despesas_por_uf = (
-            db.query(
-                DespesaAgregada.uf,
-                func.sum(DespesaAgregada.total_despesas).label("total"),
-                func.avg(DespesaAgregada.media_trimestral).label("media_trimestral"),
-                func.count(DespesaAgregada.id).label("qtd_operadoras")
-            )
-            .group_by(DespesaAgregada.uf)
-            .order_by(func.sum(DespesaAgregada.total_despesas).desc())
-            .all()
-        )
 
-        return {
-            "resumo": {
-                "total_despesas": total_despesas,
-                "media_despesas": round(media_despesas, 2),
-                "total_registros": total_registros
-            },
-            "top_5_operadoras": [
-                {
-                    "cnpj": op.cnpj,
-                    "razao_social": op.razao_social,
-                    "uf": op.uf,
-                    "total_despesas": float(op.total_despesas) if op.total_despesas else 0.0
-                }
-                for op in top_operadoras
-            ],
-            "despesas_por_uf": [
-                {
-                    "uf": item.uf,
-                    "total": float(item.total) if item.total else 0.0,
-                    "media_trimestral": float(item.media_trimestral) if item.media_trimestral else 0.0,
-                    "qtd_operadoras": item.qtd_operadoras
-                }
-                for item in despesas_por_uf
-            ]
-        }
+    @app.get("/api/estatisticas", tags=["Estatísticas"])
+    async def get_estatisticas(db: Session = Depends(get_db)):
+        """Resumo, top 5 operadoras e despesas por UF (despesas_agregadas)."""
+        return snapshot_response(db, ESTATISTICAS)
     
     @app.get("/api/estatisticas-complementares", tags=["Estatísticas"])
     async def get_estatisticas_complementares(db: Session = Depends(get_db)):
@@ -222,151 +280,34 @@ def init_routes(app: FastAPI) -> None:
         - Query 2: Distribuição de despesas por UF (top 5)
         - Query 3: Operadoras acima da média em 2+ trimestres
         """
-        
-        # Query 1: Top 5 operadoras com maior crescimento percentual
-        # ATENÇÃO: Os dados são YTD (acumulados por ano). Precisamos desacumular.
-        from sqlalchemy import text
-        
-        query_crescimento = text("""
-            WITH despesas_isoladas AS (
-                SELECT 
-                    operadora_id,
-                    ano,
-                    trimestre,
-                    valor_despesa - COALESCE(
-                        LAG(valor_despesa) OVER (PARTITION BY operadora_id, ano ORDER BY trimestre),
-                        0
-                    ) AS valor_isolado
-                FROM despesas_consolidadas
-            ),
-            periodo AS (
-                SELECT
-                    MIN(ano * 10 + trimestre) AS primeiro_periodo,
-                    MAX(ano * 10 + trimestre) AS ultimo_periodo
-                FROM despesas_consolidadas
-            ),
-            despesas_primeiro AS (
-                SELECT di.operadora_id, di.valor_isolado
-                FROM despesas_isoladas di
-                CROSS JOIN periodo p
-                WHERE di.ano * 10 + di.trimestre = p.primeiro_periodo
-            ),
-            despesas_ultimo AS (
-                SELECT di.operadora_id, di.valor_isolado
-                FROM despesas_isoladas di
-                CROSS JOIN periodo p
-                WHERE di.ano * 10 + di.trimestre = p.ultimo_periodo
-            )
-            SELECT
-                o.cnpj,
-                o.razao_social,
-                dp.valor_isolado AS despesa_inicial,
-                du.valor_isolado AS despesa_final,
-                ROUND(
-                    ((du.valor_isolado - dp.valor_isolado) / NULLIF(dp.valor_isolado, 0)) * 100,
-                    2
-                ) AS crescimento_percentual
-            FROM despesas_primeiro dp
-            INNER JOIN despesas_ultimo du ON dp.operadora_id = du.operadora_id
-            INNER JOIN operadoras o ON o.id = dp.operadora_id
-            WHERE dp.valor_isolado > 0
-            ORDER BY crescimento_percentual DESC
-            LIMIT 5
-        """)
-        
-        resultado_crescimento = db.execute(query_crescimento).fetchall()
-        top_crescimento = [
-            {
-                "cnpj": row.cnpj,
-                "razao_social": row.razao_social,
-                "despesa_inicial": float(row.despesa_inicial) if row.despesa_inicial else 0.0,
-                "despesa_final": float(row.despesa_final) if row.despesa_final else 0.0,
-                "crescimento_percentual": float(row.crescimento_percentual) if row.crescimento_percentual else 0.0
-            }
-            for row in resultado_crescimento
-        ]
-        
-        # Query 2: Distribuição de despesas por UF (top 5) - usando valores desacumulados
-        query_uf = text("""
-            WITH despesas_isoladas AS (
-                SELECT 
-                    operadora_id,
-                    ano,
-                    trimestre,
-                    valor_despesa - COALESCE(
-                        LAG(valor_despesa) OVER (PARTITION BY operadora_id, ano ORDER BY trimestre),
-                        0
-                    ) AS valor_isolado
-                FROM despesas_consolidadas
-            )
-            SELECT
-                o.uf,
-                COUNT(DISTINCT o.id) AS qtd_operadoras,
-                SUM(di.valor_isolado) AS total_despesas,
-                ROUND(AVG(di.valor_isolado), 2) AS media_por_registro,
-                ROUND(SUM(di.valor_isolado) / NULLIF(COUNT(DISTINCT o.id), 0), 2) AS media_por_operadora
-            FROM despesas_isoladas di
-            INNER JOIN operadoras o ON o.id = di.operadora_id
-            WHERE di.valor_isolado > 0
-            GROUP BY o.uf
-            ORDER BY total_despesas DESC
-            LIMIT 5
-        """)
-        
-        resultado_uf = db.execute(query_uf).fetchall()
-        top_uf = [
-            {
-                "uf": row.uf,
-                "qtd_operadoras": row.qtd_operadoras,
-                "total_despesas": float(row.total_despesas) if row.total_despesas else 0.0,
-                "media_por_registro": float(row.media_por_registro) if row.media_por_registro else 0.0,
-                "media_por_operadora": float(row.media_por_operadora) if row.media_por_operadora else 0.0
-            }
-            for row in resultado_uf
-        ]
-        
-        # Query 3: Operadoras acima da média em 2+ trimestres - usando valores desacumulados
-        query_acima_media = text("""
-            WITH despesas_isoladas AS (
-                SELECT 
-                    operadora_id,
-                    ano,
-                    trimestre,
-                    valor_despesa - COALESCE(
-                        LAG(valor_despesa) OVER (PARTITION BY operadora_id, ano ORDER BY trimestre),
-                        0
-                    ) AS valor_isolado
-                FROM despesas_consolidadas
-            ),
-            media_geral AS (
-                SELECT AVG(valor_isolado) AS media
-                FROM despesas_isoladas
-                WHERE valor_isolado > 0
-            ),
-            trimestres_acima_media AS (
-                SELECT
-                    di.operadora_id,
-                    COUNT(*) AS trimestres_acima
-                FROM despesas_isoladas di
-                CROSS JOIN media_geral mg
-                WHERE di.valor_isolado > mg.media
-                GROUP BY di.operadora_id
+        return snapshot_response(db, COMPLEMENTARES)
+
+
+    @app.post(
+        "/api/admin/reload",
+        tags=["Admin"],
+        status_code=status.HTTP_202_ACCEPTED,
+        dependencies=[Depends(require_admin)],
+    )
+    async def start_reload(
+        force: bool = Query(False, description="Recarrega mesmo sem mudança nos arquivos")
+    ):
+        """Recarrega os dados em segundo plano (tabelas sombra + troca atômica)."""
+        target = partial(load_and_index, force_reload=force)
+        if not load_job.start(target, kind="recarga", force=force):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Já existe uma carga em andamento"
             )
-            SELECT 
-                COUNT(*) AS total_operadoras,
-                (SELECT media FROM media_geral) AS media_geral
-            FROM trimestres_acima_media
-            WHERE trimestres_acima >= 2
-        """)
-        
-        resultado_acima_media = db.execute(query_acima_media).fetchone()
-        
-        return {
-            "top_5_crescimento": top_crescimento,
-            "top_5_uf": top_uf,
-            "operadoras_acima_media": {
-                "total": resultado_acima_media.total_operadoras if resultado_acima_media else 0,
-                "media_geral_referencia": float(resultado_acima_media.media_geral) if resultado_acima_media and resultado_acima_media.media_geral else 0.0,
-                "criterio": "Despesas acima da média geral em pelo menos 2 dos 3 trimestres"
-            }
-        }
\ No newline at end of file
+        return load_job.status()
+
+
+    @app.get("/api/admin/reload", tags=["Admin"], dependencies=[Depends(require_admin)])
+    async def reload_status():
+        return load_job.status()
+
+
+    @app.get("/api/admin/cache", tags=["Admin"], dependencies=[Depends(require_admin)])
+    async def cache_stats():
+        """Contadores do cache de respostas (acertos, falhas, 304, ocupação)."""
+        return response_cache.stats()
@@ -0,0 +1 @@
+# Benchmarks do ETL - executar a partir de backend/: python -m benchmarks.<modulo>
@@ -0,0 +1,90 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from etl.aggregation import segment_aggregator
+from etl.schema import AGREGADO_SCHEMA, apply_schema
+
+
+def generate_despesas(operadoras: int, anos: int = 3, seed: int = 42) -> pd.DataFrame:
+    """Gera o join consolidado x cadastro com valores acumulados no ano (YTD).
+
+    Inclui trimestres faltantes, UF nula e operadoras com duas razões sociais.
+    """
+    rng = np.random.default_rng(seed)
+    cnpj = np.repeat(rng.choice(10**14, size=operadoras, replace=False), anos * 4)
+    ano = np.tile(np.repeat(np.arange(2020, 2020 + anos), 4), operadoras)
+    trimestre = np.tile(np.arange(1, 5), operadoras * anos)
+    despesa = rng.integers(1, 10**8, size=len(cnpj)) / 100
+    ytd = pd.Series(despesa).groupby([cnpj, ano]).cumsum().to_numpy()
+
+    operadora = np.repeat(np.arange(operadoras), anos * 4)
+    razao = np.array([f"Operadora {i}" for i in range(operadoras)], dtype=object)[operadora]
+    renamed = (operadora % 97 == 0) & (ano == 2020 + anos - 1)
+    razao[renamed] = razao[renamed] + " LTDA"
+    uf = rng.choice(np.array(["SP", "RJ", "MG", "RS", None], dtype=object), operadoras)
+
+    df = pd.DataFrame(
+        {
+            "CNPJ": cnpj,
+            "RazaoSocial": razao,
+            "Trimestre": trimestre,
+            "Ano": ano,
+            "ValorDespesas": ytd.round(2),
+            "RegistroANS": 300000 + operadora,
+            "Modalidade": rng.choice(["Medicina de Grupo", "Autogestão"], operadoras)[operadora],
+            "UF": uf[operadora],
+        }
+    )
+    # Descarta ~5% dos trimestres e embaralha a ordem das linhas
+    df = df[rng.random(len(df)) > 0.05]
+    df = df.sample(frac=1, random_state=seed).reset_index(drop=True)
+    return apply_schema(df, AGREGADO_SCHEMA)
+
+
+def aggregate_groupby(df: pd.DataFrame) -> pd.DataFrame:
+    """Implementação de referência com groupby do pandas (versão anterior)."""
+    df = df.sort_values(["CNPJ", "Ano", "Trimestre"])
+    df["DespesaTrimestre"] = (
+        df.groupby(["CNPJ", "Ano"])["ValorDespesas"].diff().fillna(df["ValorDespesas"])
+    )
+    return (
+        df.groupby(["CNPJ", "RegistroANS", "RazaoSocial", "Modalidade", "UF"], observed=True)
+        .agg(
+            TotalDespesas=("DespesaTrimestre", "sum"),
+            MediaTrimestral=("DespesaTrimestre", "mean"),
+            DesvioPadrao=("DespesaTrimestre", "std"),
+            QtdTrimestres=("ValorDespesas", "count"),
+        )
+        .reset_index()
+    )
+
+
+def run(operadoras: int, anos: int) -> None:
+    df = generate_despesas(operadoras, anos)
+    print(f"{len(df)} operadora-trimestres sintéticos ({operadoras} operadoras, {anos} anos)")
+
+    start = time.perf_counter()
+    reference = aggregate_groupby(df)
+    groupby_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = segment_aggregator.aggregate(df)
+    segment_time = time.perf_counter() - start
+
+    pd.testing.assert_frame_equal(reference, result, check_dtype=False, check_exact=True)
+
+    print(f"groupby (pandas):          {groupby_time:8.3f}s")
+    print(f"segmentos ordenados:       {segment_time:8.3f}s")
+    print(f"speedup:                   {groupby_time / segment_time:8.1f}x")
+    print(f"grupos:                    {len(result)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark da agregação por operadora")
+    parser.add_argument("--operadoras", type=int, default=50_000)
+    parser.add_argument("--anos", type=int, default=3)
+    args = parser.parse_args()
+    run(args.operadoras, args.anos)
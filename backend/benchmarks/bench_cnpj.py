@@ -0,0 +1,62 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from etl.libs import normalize_cnpj, normalize_cnpj_series
+
+
+def generate_cnpjs(size: int, seed: int = 42) -> pd.Series:
+    """Gera CNPJs sintéticos: metade válidos, parte formatada, parte inválida ou nula."""
+    rng = np.random.default_rng(seed)
+    base = rng.integers(0, 10, size=(size, 12))
+
+    dv_1 = (base @ np.array((5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2))) % 11
+    dv_1 = np.where(dv_1 < 2, 0, 11 - dv_1)
+    with_dv_1 = np.column_stack([base, dv_1])
+    dv_2 = (with_dv_1 @ np.array((6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2))) % 11
+    dv_2 = np.where(dv_2 < 2, 0, 11 - dv_2)
+    digits = np.column_stack([with_dv_1, dv_2])
+
+    # Corrompe o último dígito de metade das linhas
+    corrupt = rng.random(size) < 0.5
+    digits[corrupt, 13] = (digits[corrupt, 13] + 1) % 10
+
+    cnpjs = pd.Series(["".join(map(str, row)) for row in digits], dtype=object)
+
+    formatted = rng.random(size) < 0.2
+    cnpjs[formatted] = cnpjs[formatted].map(
+        lambda c: f"{c[:2]}.{c[2:5]}.{c[5:8]}/{c[8:12]}-{c[12:]}"
+    )
+    short = rng.random(size) < 0.1
+    cnpjs[short] = cnpjs[short].str.lstrip("0").str[:-1]
+    cnpjs[rng.random(size) < 0.01] = None
+    return cnpjs
+
+
+def run(size: int) -> None:
+    cnpjs = generate_cnpjs(size).astype(str)
+    print(f"{size} CNPJs sintéticos")
+
+    start = time.perf_counter()
+    scalar = cnpjs.apply(lambda x: normalize_cnpj(str(x)) if pd.notna(x) else None)
+    scalar_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vectorized = normalize_cnpj_series(cnpjs)
+    vectorized_time = time.perf_counter() - start
+
+    pd.testing.assert_series_equal(scalar, vectorized, check_dtype=False)
+
+    print(f"normalize_cnpj (apply):   {scalar_time:8.3f}s")
+    print(f"normalize_cnpj_series:    {vectorized_time:8.3f}s")
+    print(f"speedup:                  {scalar_time / vectorized_time:8.1f}x")
+    print(f"CNPJs válidos:            {vectorized.notna().sum()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark da validação de CNPJ")
+    parser.add_argument("--size", type=int, default=2_000_000)
+    args = parser.parse_args()
+    run(args.size)
@@ -0,0 +1,219 @@
+"""Carga do banco: linhas por segundo da carga linha a linha (ORM) contra a carga por COPY.
+
+Gera dados sintéticos (`benchmarks.synthetic`), roda consolidação e agregação para
+produzir os artefatos que `database.bulk_load` carrega e mede as duas cargas, conferindo
+que as tabelas resultantes são iguais.
+
+Atenção: recria as tabelas do banco configurado no .env.
+"""
+
+import argparse
+import contextlib
+import io
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from database.bulk_load import bulk_load, read_consolidado
+from database.db_session import SessionLocal, engine
+from database.init_db import create_tables
+from database.models import DespesaAgregada, DespesaConsolidada, Operadora
+from database.settings import PATHS
+from etl.aggregator import DespesasAggregator
+from etl.consolidator import DespesasConsolidator
+from etl.constants import constant_paths
+from etl.libs import column_normalizer
+from etl.schema import to_export_df
+
+from .bench_etl import _new_client
+from .synthetic import SyntheticSpec, generate_dataset
+
+TABLES = ("operadoras", "despesas_consolidadas", "despesas_agregadas")
+
+
+def prepare_artifacts(root: Path, spec: SyntheticSpec) -> None:
+    """Gera os dados e grava cadastro, consolidado (Arrow) e agregado como o ETL."""
+    generate_dataset(root, spec)
+    constant_paths.set_root(root)
+    client = _new_client()
+    with contextlib.redirect_stdout(io.StringIO()):
+        df_consolidado = DespesasConsolidator(client, column_normalizer).run_batch()
+        df_agregado = DespesasAggregator(client).run(df_consolidado)
+    client.save_arrow_from_df(
+        df_consolidado, constant_paths.consolidado_dir, "consolidado_despesas.arrow"
+    )
+    client.save_csv_from_df(
+        to_export_df(df_agregado), constant_paths.output_dir, "despesas_agregadas.csv"
+    )
+
+    PATHS["operadoras"] = constant_paths.operadoras_dir / "operadoras.csv"
+    PATHS["consolidado_arrow"] = constant_paths.consolidado_dir / "consolidado_despesas.arrow"
+    PATHS["agregado"] = constant_paths.output_dir / "despesas_agregadas.csv"
+
+
+def _cnpj(value: object) -> str:
+    return str(value).replace(".", "").replace("/", "").replace("-", "").zfill(14)
+
+
+def _parse_decimal(value: object) -> float:
+    try:
+        return float(str(value).replace(".", "").replace(",", "."))
+    except (ValueError, TypeError):
+        return 0.0
+
+
+# Carga linha a linha (ORM) que o COPY de `database.bulk_load` substituiu: referência de
+# desempenho e de resultado
+def orm_load_operadoras(db: Session) -> None:
+    if not PATHS["operadoras"].exists():
+        return
+    df_op = pd.read_csv(PATHS["operadoras"], sep=";", encoding="utf-8", dtype=str)
+    for _, row in df_op.iterrows():
+        cnpj = _cnpj(row.get("CNPJ", ""))
+        if len(cnpj) != 14:
+            continue
+        operadora = Operadora(
+            cnpj=cnpj,
+            razao_social=str(row.get("Razao_Social", "")),
+            registro_ans=str(row.get("REG_ANS", "")) or None,
+            modalidade=str(row.get("Modalidade", "")) or None,
+            uf=str(row.get("UF", ""))[:2].upper(),
+        )
+        db.merge(operadora)
+    db.commit()
+
+
+def orm_load_consolidado(db: Session) -> None:
+    df_desp = read_consolidado()
+    if df_desp is None:
+        return
+    # Valores YTD: o valor isolado é a diferença para o trimestre anterior do mesmo ano
+    valores = df_desp["ValorDespesas"].astype(float).round(2)
+    ordem = df_desp.sort_values(["Ano", "Trimestre"], kind="stable").index
+    anterior = (
+        valores[ordem]
+        .groupby([df_desp.loc[ordem, "CNPJ"], df_desp.loc[ordem, "Ano"]])
+        .shift(fill_value=0)
+    )
+    df_desp = df_desp.assign(ValorTrimestre=(valores - anterior).round(2))
+
+    for _, row in df_desp.iterrows():
+        operadora = db.query(Operadora).filter(Operadora.cnpj == _cnpj(row.get("CNPJ", ""))).first()
+        if not operadora:
+            continue
+        despesa = DespesaConsolidada(
+            operadora_id=operadora.id,
+            trimestre=int(row.get("Trimestre", 0)),
+            ano=int(row.get("Ano", 0)),
+            valor_despesa=float(row["ValorDespesas"]),
+            valor_trimestre=float(row["ValorTrimestre"]),
+        )
+        db.add(despesa)
+    db.commit()
+
+
+def orm_load_agregados(db: Session) -> None:
+    if not PATHS["agregado"].exists():
+        return
+    df_agg = pd.read_csv(PATHS["agregado"], sep=";", encoding="utf-8", dtype=str)
+    for _, row in df_agg.iterrows():
+        operadora = db.query(Operadora).filter(Operadora.cnpj == _cnpj(row.get("CNPJ", ""))).first()
+        if not operadora:
+            continue
+        despesa_agg = DespesaAgregada(
+            operadora_id=operadora.id,
+            uf=str(row.get("UF", ""))[:2].upper(),
+            total_despesas=_parse_decimal(row.get("TotalDespesas", "0")),
+            media_trimestral=_parse_decimal(row.get("MediaTrimestral", "0")),
+            desvio_padrao=_parse_decimal(row.get("DesvioPadrao", "0")),
+            qtd_trimestres=int(row.get("QtdTrimestres", 0)) if row.get("QtdTrimestres") else 0,
+        )
+        db.add(despesa_agg)
+    db.commit()
+
+
+def load_orm() -> None:
+    db = SessionLocal()
+    try:
+        orm_load_operadoras(db)
+        orm_load_consolidado(db)
+        orm_load_agregados(db)
+    finally:
+        db.close()
+
+
+def snapshot() -> dict[str, pd.DataFrame]:
+    with engine.connect() as conn:
+        return {
+            table: pd.read_sql(text(f"SELECT * FROM {table} ORDER BY id"), conn) for table in TABLES
+        }
+
+
+def measure(loader: Callable[[], object], repeat: int) -> tuple[float, dict[str, pd.DataFrame]]:
+    """Menor tempo entre `repeat` cargas sobre tabelas recriadas e o conteúdo resultante."""
+    best = float("inf")
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            create_tables()
+            start = time.perf_counter()
+            loader()
+            best = min(best, time.perf_counter() - start)
+    return best, snapshot()
+
+
+def run(spec: SyntheticSpec, repeat: int) -> bool:
+    """Compara as duas cargas em um tamanho de dados; retorna True se as tabelas coincidem."""
+    original_root = constant_paths.root_dir
+    original_paths = dict(PATHS)
+    try:
+        with tempfile.TemporaryDirectory(prefix="bench_db_load_") as tmp:
+            prepare_artifacts(Path(tmp), spec)
+            orm_time, expected = measure(load_orm, repeat)
+            copy_time, actual = measure(bulk_load, repeat)
+    finally:
+        constant_paths.set_root(original_root)
+        PATHS.update(original_paths)
+
+    identical = True
+    for table in TABLES:
+        try:
+            pd.testing.assert_frame_equal(actual[table], expected[table])
+        except AssertionError as e:
+            identical = False
+            print(f"  DIVERGÊNCIA em {table}:\n{e}")
+
+    rows = sum(len(df) for df in expected.values())
+    print(f"\n{spec.operadoras} operadoras x {spec.trimestres} trimestres: {rows} linhas")
+    print(f"{'carga':<20}{'tempo (s)':>12}{'linhas/s':>14}")
+    for name, seconds in (("ORM linha a linha", orm_time), ("COPY", copy_time)):
+        print(f"{name:<20}{seconds:>12.3f}{rows / seconds:>14,.0f}")
+    status = "idênticas" if identical else "DIVERGENTES"
+    print(f"aceleração: {orm_time / copy_time:.1f}x | tabelas {status}")
+    return identical
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Carga do banco: ORM linha a linha x COPY")
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[500, 2_000],
+        help="Quantidades de operadoras a medir",
+    )
+    parser.add_argument("--trimestres", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=1, help="Repetições por carga (menor tempo)")
+    args = parser.parse_args()
+
+    identical = True
+    for operadoras in args.sizes:
+        spec = SyntheticSpec(operadoras=operadoras, trimestres=args.trimestres)
+        identical &= run(spec, args.repeat)
+    if not identical:
+        sys.exit(1)
@@ -0,0 +1,265 @@
+"""Benchmark do ETL sobre dados sintéticos, com histórico para detectar regressões.
+
+Cada execução gera os dados (`benchmarks.synthetic`) em um diretório temporário,
+mede leitura, consolidação, agregação e, opcionalmente, a carga do banco, e acrescenta
+o resultado a um arquivo JSONL. Os tempos são comparados com a última execução do
+mesmo tamanho.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from dataclasses import asdict
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any
+
+import pandas as pd
+
+from etl.aggregator import DespesasAggregator
+from etl.backends import BACKENDS, create_backend
+from etl.clients import LocalStorageClient
+from etl.consolidator import DespesasConsolidator
+from etl.constants import constant_paths
+from etl.libs import CsvDialectSniffer, ZipHandler, column_normalizer
+from etl.schema import to_export_df
+
+from .synthetic import SyntheticSpec, generate_dataset
+
+DEFAULT_RESULTS = constant_paths.cache_dir / "benchmarks" / "bench_etl.jsonl"
+
+
+def _timed(func: Callable[[], Any], repeat: int) -> tuple[float, Any]:
+    """Menor tempo entre `repeat` execuções (saída do ETL suprimida) e o último resultado."""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = func()
+            best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def _new_client() -> LocalStorageClient:
+    # Sem caches em disco: cada repetição mede também a detecção de dialeto e a leitura
+    # das planilhas
+    return LocalStorageClient(ZipHandler(), CsvDialectSniffer(None), excel_cache=None)
+
+
+def _bench_db(repeat: int) -> dict[str, float]:
+    """Carga do banco configurado no .env, a partir dos artefatos da execução atual.
+
+    Atenção: recria as tabelas do banco configurado.
+    """
+    from database.bulk_load import bulk_load
+    from database.init_db import create_tables
+    from database.settings import PATHS
+
+    PATHS["operadoras"] = constant_paths.operadoras_dir / "operadoras.csv"
+    PATHS["consolidado_arrow"] = constant_paths.consolidado_dir / "consolidado_despesas.arrow"
+    PATHS["agregado"] = constant_paths.output_dir / "despesas_agregadas.csv"
+
+    timings: dict[str, float] = {}
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            create_tables()
+            results = bulk_load()
+        for result in results:
+            name = f"load_{result.table}"
+            timings[name] = min(timings.get(name, float("inf")), result.seconds)
+    return timings
+
+
+def bench_size(spec: SyntheticSpec, repeat: int, with_db: bool, backend: str) -> dict[str, Any]:
+    original_root = constant_paths.root_dir
+    with tempfile.TemporaryDirectory(prefix="bench_etl_") as tmp:
+        try:
+            return _bench_dataset(Path(tmp), spec, repeat, with_db, backend)
+        finally:
+            constant_paths.set_root(original_root)
+
+
+def _bench_dataset(
+    root: Path, spec: SyntheticSpec, repeat: int, with_db: bool, backend: str
+) -> dict[str, Any]:
+    start = time.perf_counter()
+    files = generate_dataset(root, spec)
+    generate_time = time.perf_counter() - start
+    constant_paths.set_root(root)
+
+    def read_all() -> int:
+        client = _new_client()
+        return sum(len(client.read(path)) for path in files)
+
+    timings: dict[str, float] = {}
+    timings["read"], rows = _timed(read_all, repeat)
+
+    query_backend = create_backend(backend)
+    consolidator = DespesasConsolidator(_new_client(), column_normalizer, backend=query_backend)
+    timings["consolidate"], df_consolidado = _timed(consolidator.run_batch, repeat)
+
+    aggregator = DespesasAggregator(_new_client(), backend=query_backend)
+    timings["aggregate"], df_agregado = _timed(lambda: aggregator.run(df_consolidado), repeat)
+
+    if with_db:
+        client = _new_client()
+        client.save_arrow_from_df(
+            df_consolidado, constant_paths.consolidado_dir, "consolidado_despesas.arrow"
+        )
+        client.save_csv_from_df(
+            to_export_df(df_agregado), constant_paths.output_dir, "despesas_agregadas.csv"
+        )
+        timings.update(_bench_db(repeat))
+
+    return {
+        "spec": asdict(spec),
+        "backend": backend,
+        "rows": rows,
+        "bytes": sum(path.stat().st_size for path in files),
+        "consolidated_rows": len(df_consolidado),
+        "aggregated_rows": len(df_agregado),
+        "generate_seconds": round(generate_time, 3),
+        "timings": {stage: round(seconds, 4) for stage, seconds in timings.items()},
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def load_history(results_file: Path) -> list[dict[str, Any]]:
+    if not results_file.exists():
+        return []
+    with open(results_file, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def find_baseline(
+    history: list[dict[str, Any]], spec: dict[str, Any], backend: str
+) -> dict[str, Any] | None:
+    """Última execução registrada com o mesmo tamanho de dados e o mesmo backend."""
+    # Registros anteriores à escolha de backend foram medidos com o pandas
+    matches = (
+        record
+        for record in reversed(history)
+        if record["spec"] == spec and record.get("backend", "pandas") == backend
+    )
+    return next(matches, None)
+
+
+def report(result: dict[str, Any], baseline: dict[str, Any] | None, threshold: float) -> bool:
+    """Imprime os tempos comparados ao baseline; retorna True se houve regressão."""
+    spec = result["spec"]
+    print(
+        f"\n{spec['operadoras']} operadoras x {spec['contas']} contas x "
+        f"{spec['trimestres']} trimestres: {result['rows']} linhas, "
+        f"{result['bytes'] / 1024**2:.1f} MB ({result['backend']})"
+    )
+    print(f"{'etapa':<28}{'tempo (s)':>12}{'anterior (s)':>14}{'variação':>12}")
+    regressed = False
+    for stage, seconds in result["timings"].items():
+        previous = (baseline or {}).get("timings", {}).get(stage)
+        if previous is None:
+            print(f"{stage:<28}{seconds:>12.3f}{'-':>14}{'-':>12}")
+            continue
+        change = seconds / previous - 1 if previous else 0.0
+        flag = "  REGRESSÃO" if change > threshold else ""
+        regressed |= bool(flag)
+        print(f"{stage:<28}{seconds:>12.3f}{previous:>14.3f}{change:>+11.1%}{flag}")
+    return regressed
+
+
+def run(
+    sizes: list[int],
+    contas: int,
+    trimestres: int,
+    xlsx_every: int,
+    repeat: int,
+    with_db: bool,
+    results_file: Path,
+    threshold: float,
+    backend: str = "pandas",
+) -> bool:
+    history = load_history(results_file)
+    metadata = {
+        "timestamp": datetime.now(UTC).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+    }
+
+    regressed = False
+    results_file.parent.mkdir(parents=True, exist_ok=True)
+    for operadoras in sizes:
+        spec = SyntheticSpec(
+            operadoras=operadoras, contas=contas, trimestres=trimestres, xlsx_every=xlsx_every
+        )
+        result = {**metadata, **bench_size(spec, repeat, with_db, backend)}
+        baseline = find_baseline(history, result["spec"], backend)
+        regressed |= report(result, baseline, threshold)
+        with open(results_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(result) + "\n")
+
+    print(f"\nResultados acrescentados a {results_file}")
+    return regressed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark do ETL com dados sintéticos")
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[500, 2_000, 8_000],
+        help="Quantidades de operadoras a medir",
+    )
+    parser.add_argument("--contas", type=int, default=SyntheticSpec.contas)
+    parser.add_argument("--trimestres", type=int, default=8)
+    parser.add_argument("--xlsx-every", type=int, default=SyntheticSpec.xlsx_every)
+    parser.add_argument("--repeat", type=int, default=3, help="Repetições por etapa (menor tempo)")
+    parser.add_argument(
+        "--with-db",
+        action="store_true",
+        help="Mede também a carga do banco (recria as tabelas do banco configurado no .env)",
+    )
+    parser.add_argument("--backend", choices=BACKENDS, default="pandas")
+    parser.add_argument("--results", type=Path, default=DEFAULT_RESULTS)
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Aumento relativo de tempo considerado regressão (0.2 = 20%%)",
+    )
+    parser.add_argument(
+        "--fail-on-regression",
+        action="store_true",
+        help="Termina com código 1 se alguma etapa regredir",
+    )
+    args = parser.parse_args()
+    regressed = run(
+        args.sizes,
+        args.contas,
+        args.trimestres,
+        args.xlsx_every,
+        args.repeat,
+        args.with_db,
+        args.results,
+        args.threshold,
+        args.backend,
+    )
+    if regressed and args.fail_on_regression:
+        sys.exit(1)
@@ -0,0 +1,195 @@
+"""Busca de operadoras: latência do `ILIKE '%termo%'` no Postgres contra o índice em memória.
+
+Gera um cadastro sintético com razões sociais variadas (com e sem acentos), carrega no
+banco com `database.bulk_load` e mede, por tipo de termo, o caminho antigo de
+`/api/operadoras?search=` (ILIKE em razão social e CNPJ + `count()`) e
+`database.search_index`. Confere que tudo o que o ILIKE encontra o índice também encontra
+(o índice ignora acentos, então pode encontrar mais).
+
+Atenção: recria as tabelas do banco configurado no .env.
+"""
+
+import argparse
+import contextlib
+import io
+import statistics
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from database.bulk_load import load_operadoras, raw_transaction
+from database.db_session import SessionLocal
+from database.init_db import create_tables
+from database.models import Operadora
+from database.search_index import OperadoraSearchIndex
+from database.settings import PATHS
+
+from .synthetic import MODALIDADES, UFS, _cnpjs
+
+PREFIXOS = ["UNIMED", "AMIL", "BRADESCO", "SUL AMÉRICA", "HAPVIDA", "NOTRE DAME", "PORTO"]
+NUCLEOS = [
+    "SAÚDE",
+    "ASSISTÊNCIA MÉDICA",
+    "ODONTOLÓGICA",
+    "COOPERATIVA DE TRABALHO MÉDICO",
+    "PLANOS DE SAÚDE",
+    "SEGURADORA",
+    "ADMINISTRADORA DE BENEFÍCIOS",
+]
+CIDADES = [
+    "SÃO PAULO",
+    "VITÓRIA",
+    "GOIÂNIA",
+    "BELÉM",
+    "MACEIÓ",
+    "FLORIANÓPOLIS",
+    "RIBEIRÃO PRETO",
+    "CAMPINAS",
+    "CURITIBA",
+    "NITERÓI",
+]
+SUFIXOS = ["LTDA", "S.A.", "S/A", "EIRELI"]
+
+
+def generate_cadastro(size: int, seed: int = 42) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    partes = zip(
+        rng.choice(PREFIXOS, size),
+        rng.choice(NUCLEOS, size),
+        rng.choice(CIDADES, size),
+        rng.choice(SUFIXOS, size),
+        strict=True,
+    )
+    nomes = [
+        f"{prefixo} {nucleo} {cidade} {i} {sufixo}"
+        for i, (prefixo, nucleo, cidade, sufixo) in enumerate(partes)
+    ]
+    return pd.DataFrame(
+        {
+            "REG_ANS": np.arange(300_000, 300_000 + size).astype(str),
+            "CNPJ": _cnpjs(size, rng),
+            "Razao_Social": nomes,
+            "Modalidade": rng.choice(MODALIDADES, size),
+            "UF": rng.choice(UFS, size),
+        }
+    )
+
+
+def terms(cadastro: pd.DataFrame, per_kind: int, seed: int = 7) -> dict[str, list[str]]:
+    """Termos de busca por tipo, como digitados na caixa de busca do frontend."""
+    rng = np.random.default_rng(seed)
+    nomes = cadastro["Razao_Social"].to_numpy()[rng.integers(0, len(cadastro), per_kind)]
+    cnpjs = cadastro["CNPJ"].to_numpy()[rng.integers(0, len(cadastro), per_kind)]
+    return {
+        "2 letras": [nome[:2] for nome in nomes],
+        "prefixo": [nome[:6] for nome in nomes],
+        "palavra do meio": [nome.split()[-3] for nome in nomes],
+        "nome completo": list(nomes),
+        "sem acento": list(rng.choice(["sao paulo", "goiania", "medica", "saude"], per_kind)),
+        "CNPJ parcial": [cnpj[:6] for cnpj in cnpjs],
+        "CNPJ completo": list(cnpjs),
+        "inexistente": [f"xyzw{i}" for i in range(per_kind)],
+    }
+
+
+def search_ilike(db: Session, search: str, offset: int, limit: int) -> tuple[int, list[Operadora]]:
+    """Caminho anterior de /api/operadoras?search=."""
+    search_term = f"%{search}%"
+    query = db.query(Operadora).filter(
+        (Operadora.razao_social.ilike(search_term)) | (Operadora.cnpj.ilike(search_term))
+    )
+    return query.count(), query.offset(offset).limit(limit).all()
+
+
+def latencies(func: Callable[[str], object], values: list[str], repeat: int) -> list[float]:
+    timings = []
+    for value in values:
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func(value)
+            best = min(best, time.perf_counter() - start)
+        timings.append(best * 1000)
+    return timings
+
+
+def run(size: int, per_kind: int, repeat: int, limit: int) -> bool:
+    """Mede os dois caminhos; retorna True se o índice cobre todos os resultados do ILIKE."""
+    cadastro = generate_cadastro(size)
+    original_paths = dict(PATHS)
+    try:
+        with tempfile.TemporaryDirectory(prefix="bench_search_") as tmp:
+            PATHS["operadoras"] = Path(tmp) / "operadoras.csv"
+            cadastro.to_csv(PATHS["operadoras"], sep=";", index=False, encoding="utf-8")
+            with contextlib.redirect_stdout(io.StringIO()):
+                create_tables()
+                with raw_transaction() as cursor:
+                    load_operadoras(cursor)
+                    cursor.execute("ANALYZE operadoras")
+    finally:
+        PATHS.update(original_paths)
+
+    db = SessionLocal()
+    try:
+        index = OperadoraSearchIndex()
+        start = time.perf_counter()
+        index.build(db)
+        build_time = time.perf_counter() - start
+
+        print(f"\n{size} operadoras | índice construído em {build_time * 1000:.0f} ms")
+        print(
+            f"{'termo':<18}{'ILIKE p50':>11}{'p95':>9}{'índice p50':>12}{'p95':>9}"
+            f"{'aceleração':>12}{'total ILIKE':>13}{'total índice':>14}"
+        )
+        covered = True
+        for kind, values in terms(cadastro, per_kind).items():
+            ilike = latencies(lambda v: search_ilike(db, v, 0, limit), values, repeat)
+            indexed = latencies(lambda v: index.search(v, 0, limit), values, repeat)
+
+            ilike_total = index_total = 0
+            for value in values:
+                expected = {op.cnpj for op in search_ilike(db, value, 0, size)[1]}
+                total, found, _ = index.search(value, 0, size)
+                ilike_total += len(expected)
+                index_total += total
+                if not expected <= {op["cnpj"] for op in found}:
+                    covered = False
+                    print(f"  DIVERGÊNCIA: {value!r} encontrado pelo ILIKE e não pelo índice")
+
+            ilike_p50, indexed_p50 = statistics.median(ilike), statistics.median(indexed)
+            print(
+                f"{kind:<18}{ilike_p50:>11.2f}{np.percentile(ilike, 95):>9.2f}"
+                f"{indexed_p50:>12.3f}{np.percentile(indexed, 95):>9.3f}"
+                f"{ilike_p50 / indexed_p50:>11.0f}x{ilike_total:>13}{index_total:>14}"
+            )
+        print("latências em ms (melhor de cada termo); totais somados sobre os termos")
+        return covered
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Busca de operadoras: ILIKE x índice em memória")
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[1_000, 20_000],
+        help="Quantidades de operadoras a medir",
+    )
+    parser.add_argument("--terms", type=int, default=20, help="Termos por tipo")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetições por termo (menor tempo)")
+    parser.add_argument("--limit", type=int, default=10, help="Tamanho da página")
+    args = parser.parse_args()
+
+    covered = True
+    for size in args.sizes:
+        covered &= run(size, args.terms, args.repeat, args.limit)
+    if not covered:
+        sys.exit(1)
@@ -0,0 +1,125 @@
+"""Paridade entre os backends do ETL: pandas e DuckDB devem produzir as mesmas saídas.
+
+Gera dados sintéticos (`benchmarks.synthetic`) com encodings, separadores e formatos
+variados, consolida e agrega com cada backend e compara os DataFrames exatamente
+(valores e tipos). Com `--root`, compara sobre os dados reais já baixados nessa raiz.
+Termina com código 1 se algum resultado divergir.
+"""
+
+import argparse
+import contextlib
+import io
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+import pandas as pd
+
+from etl.aggregator import DespesasAggregator
+from etl.backends import create_backend
+from etl.clients import LocalStorageClient
+from etl.consolidator import DespesasConsolidator
+from etl.constants import constant_paths
+from etl.libs import CsvDialectSniffer, ZipHandler, column_normalizer
+
+from .synthetic import SyntheticSpec, generate_dataset
+
+# Cenários padrão: o xlsx e o cp1252 exercitam o recurso ao pandas dentro do DuckDB
+DEFAULT_SPECS = [
+    SyntheticSpec(operadoras=300, contas=8, trimestres=6, xlsx_every=3),
+    SyntheticSpec(operadoras=3_000, contas=20, trimestres=9, seed=7),
+]
+
+
+def _quiet(func: Callable[[], Any]) -> tuple[float, Any]:
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        result = func()
+        return time.perf_counter() - start, result
+
+
+def run_backend(name: str, chunksize: int | None) -> dict[str, Any]:
+    backend = create_backend(name)
+    client = LocalStorageClient(ZipHandler(), CsvDialectSniffer(None), excel_cache=None)
+    consolidator = DespesasConsolidator(client, column_normalizer, chunksize, backend=backend)
+    aggregator = DespesasAggregator(client, backend=backend)
+
+    _, df_operadoras = _quiet(consolidator.load_operadoras_df)
+    consolidate_time, df_consolidado = _quiet(lambda: consolidator.run_batch(df_operadoras))
+    aggregate_time, df_agregado = _quiet(lambda: aggregator.run(df_consolidado, df_operadoras))
+    return {
+        "consolidado": df_consolidado,
+        "agregado": df_agregado,
+        "timings": {"consolidate": consolidate_time, "aggregate": aggregate_time},
+    }
+
+
+def compare(label: str, chunksize: int | None) -> bool:
+    """Compara o DuckDB com o pandas na raiz atual; retorna True se forem idênticos."""
+    expected = run_backend("pandas", chunksize)
+    actual = run_backend("duckdb", chunksize)
+
+    identical = True
+    for output in ("consolidado", "agregado"):
+        try:
+            pd.testing.assert_frame_equal(actual[output], expected[output], check_exact=True)
+        except AssertionError as e:
+            identical = False
+            print(f"  DIVERGÊNCIA em {output}:\n{e}")
+
+    timings = " ".join(
+        f"{stage} {expected['timings'][stage]:.2f}s -> {actual['timings'][stage]:.2f}s"
+        for stage in ("consolidate", "aggregate")
+    )
+    status = "idênticos" if identical else "DIVERGENTES"
+    print(
+        f"{label} (chunksize={chunksize}): {len(expected['consolidado'])} linhas consolidadas, "
+        f"{len(expected['agregado'])} agregadas, {status} | pandas -> duckdb: {timings}"
+    )
+    return identical
+
+
+def run(specs: list[SyntheticSpec], root: Path | None, chunksizes: list[int | None]) -> bool:
+    original_root = constant_paths.root_dir
+    identical = True
+    try:
+        if root is not None:
+            constant_paths.set_root(root)
+            for chunksize in chunksizes:
+                identical &= compare(str(root), chunksize)
+            return identical
+
+        for spec in specs:
+            with tempfile.TemporaryDirectory(prefix="parity_backends_") as tmp:
+                generate_dataset(Path(tmp), spec)
+                constant_paths.set_root(Path(tmp))
+                label = f"{spec.operadoras} operadoras x {spec.trimestres} trimestres"
+                for chunksize in chunksizes:
+                    identical &= compare(label, chunksize)
+    finally:
+        constant_paths.set_root(original_root)
+    return identical
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Paridade de saídas entre backends do ETL")
+    parser.add_argument(
+        "--root",
+        type=Path,
+        default=None,
+        help="Raiz com data/trimestres e data/operadoras reais (padrão: dados sintéticos)",
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        nargs="+",
+        default=[0, 50_000],
+        help="Tamanhos de bloco do caminho pandas a comparar (0 = arquivo inteiro)",
+    )
+    args = parser.parse_args()
+    chunksizes = [chunksize or None for chunksize in args.chunksize]
+    if not run(DEFAULT_SPECS, args.root, chunksizes):
+        sys.exit(1)
@@ -0,0 +1,177 @@
+"""Gerador de dados sintéticos no formato da ANS, para benchmarks sem acesso ao site.
+
+Escreve `data/trimestres/<T>T<ano>.<ext>` (balancetes) e `data/operadoras/operadoras.csv`
+sob uma raiz qualquer. Os arquivos variam encoding, separador, nomes de colunas
+(`COLUMN_MAPPINGS`) e formato (csv, txt, xlsx), e os saldos são acumulados no ano (YTD).
+"""
+
+import argparse
+import csv
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from etl.libs import COLUMN_MAPPINGS
+
+# Variações de arquivo usadas em rodízio: (encoding, separador, extensão)
+FILE_VARIANTS = [
+    ("utf-8", ";", "csv"),
+    ("latin1", ";", "csv"),
+    ("cp1252", ",", "csv"),
+    ("utf-8", "\t", "txt"),
+    ("latin1", "|", "txt"),
+]
+
+# Contas fixas: a primeira é a filtrada pelo ETL; as demais exercitam os descartes
+CONTAS_BASE = [
+    ("411111111", "DESPESAS COM EVENTOS / SINISTROS"),
+    ("411211111", "Despesas com Eventos / Sinistros"),
+    ("41111", "DESPESAS COM EVENTOS / SINISTROS"),
+    ("311111111", "CONTRAPRESTAÇÕES EFETIVAS DE PLANO DE ASSISTÊNCIA À SAÚDE"),
+    ("461111111", "DESPESAS ADMINISTRATIVAS"),
+]
+DESCRICOES_EXTRAS = [
+    "PROVISÃO TÉCNICA",
+    "APLICAÇÕES FINANCEIRAS",
+    "CRÉDITOS DE OPERAÇÕES COM PLANOS",
+    "TRIBUTOS E ENCARGOS SOCIAIS A RECOLHER",
+]
+MODALIDADES = ["Medicina de Grupo", "Cooperativa Médica", "Autogestão", "Odontologia de Grupo"]
+UFS = ["SP", "RJ", "MG", "RS", "PR", "BA", "SC", "PE"]
+
+
+@dataclass(frozen=True)
+class SyntheticSpec:
+    operadoras: int = 1_000
+    contas: int = 20
+    trimestres: int = 4
+    ano_inicial: int = 2023
+    # Um a cada N arquivos é gravado como xlsx (0 desativa); xlsx é lento de gerar e de ler
+    xlsx_every: int = 0
+    seed: int = 42
+
+
+def _cnpjs(size: int, rng: np.random.Generator) -> list[str]:
+    base = rng.integers(0, 10, size=(size, 12))
+    dv_1 = (base @ np.array((5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2))) % 11
+    base = np.column_stack([base, np.where(dv_1 < 2, 0, 11 - dv_1)])
+    dv_2 = (base @ np.array((6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2))) % 11
+    digits = np.column_stack([base, np.where(dv_2 < 2, 0, 11 - dv_2)])
+    return ["".join(map(str, row)) for row in digits]
+
+
+def _contas(size: int, rng: np.random.Generator) -> list[tuple[str, str]]:
+    contas = CONTAS_BASE[:size]
+    while len(contas) < size:
+        codigo = str(rng.integers(100_000_000, 399_999_999))
+        contas.append((codigo, DESCRICOES_EXTRAS[len(contas) % len(DESCRICOES_EXTRAS)]))
+    return contas
+
+
+def generate_operadoras(spec: SyntheticSpec, rng: np.random.Generator) -> pd.DataFrame:
+    """Cadastro no formato gravado por `ANSApiClient.download_operadoras_ativas`."""
+    return pd.DataFrame(
+        {
+            "REG_ANS": np.arange(300_000, 300_000 + spec.operadoras).astype(str),
+            "CNPJ": _cnpjs(spec.operadoras, rng),
+            "Razao_Social": [f"OPERADORA SINTÉTICA {i} S.A." for i in range(spec.operadoras)],
+            "Modalidade": rng.choice(MODALIDADES, spec.operadoras),
+            "UF": rng.choice(UFS, spec.operadoras),
+        }
+    )
+
+
+def _column_names(index: int) -> dict[str, str]:
+    """Alterna entre as variações de nome de `COLUMN_MAPPINGS` a cada arquivo."""
+    names = {col: variants[index % len(variants)] for col, variants in COLUMN_MAPPINGS.items()}
+    names["VL_SALDO_INICIAL"] = "VL_SALDO_INICIAL"
+    return names
+
+
+def _write_balancete(df: pd.DataFrame, path: Path, encoding: str, sep: str) -> None:
+    if path.suffix == ".xlsx":
+        df.to_excel(path, index=False)
+        return
+    decimal = "." if sep == "," else ","
+    df.to_csv(
+        path,
+        sep=sep,
+        decimal=decimal,
+        encoding=encoding,
+        index=False,
+        quoting=csv.QUOTE_ALL,
+        float_format="%.2f",
+    )
+
+
+def generate_dataset(root: Path, spec: SyntheticSpec) -> list[Path]:
+    """Gera cadastro e balancetes trimestrais sob `root/data`; retorna os balancetes."""
+    rng = np.random.default_rng(spec.seed)
+    data_dir = root / "data"
+    (data_dir / "operadoras").mkdir(parents=True, exist_ok=True)
+    trimestres_dir = data_dir / "trimestres"
+    trimestres_dir.mkdir(parents=True, exist_ok=True)
+
+    df_operadoras = generate_operadoras(spec, rng)
+    df_operadoras.to_csv(data_dir / "operadoras" / "operadoras.csv", sep=";", index=False)
+
+    contas = _contas(spec.contas, rng)
+    # Operadoras fora do cadastro (~2%) exercitam o descarte do join
+    reg_ans = np.arange(300_000, 300_000 + int(spec.operadoras * 1.02))
+    linhas = len(reg_ans) * len(contas)
+    reg_col = np.repeat(reg_ans, len(contas)).astype(str)
+    codigo_col = np.tile([codigo for codigo, _ in contas], len(reg_ans))
+    descricao_col = np.tile([descricao for _, descricao in contas], len(reg_ans))
+
+    files: list[Path] = []
+    saldo = np.zeros(linhas)
+    for index in range(spec.trimestres):
+        ano = spec.ano_inicial + index // 4
+        trimestre = index % 4 + 1
+        if trimestre == 1:
+            saldo = np.zeros(linhas)
+        saldo_inicial = saldo
+        saldo = saldo + rng.integers(0, 5_000_000, size=linhas) / 100
+
+        encoding, sep, ext = FILE_VARIANTS[index % len(FILE_VARIANTS)]
+        if spec.xlsx_every and (index + 1) % spec.xlsx_every == 0:
+            ext = "xlsx"
+        names = _column_names(index)
+        data = pd.Timestamp(year=ano, month=trimestre * 3, day=1) + pd.offsets.MonthEnd(0)
+        df = pd.DataFrame(
+            {
+                names["DATA"]: data.strftime("%Y-%m-%d"),
+                names["REG_ANS"]: reg_col,
+                names["CD_CONTA_CONTABIL"]: codigo_col,
+                names["DESCRICAO"]: descricao_col,
+                names["VL_SALDO_INICIAL"]: saldo_inicial,
+                names["VL_SALDO_FINAL"]: saldo,
+            }
+        )
+        path = trimestres_dir / f"{trimestre}T{ano}.{ext}"
+        _write_balancete(df, path, encoding, sep)
+        files.append(path)
+
+    return files
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera dados sintéticos no formato da ANS")
+    parser.add_argument("root", type=Path, help="Raiz onde `data/` será criado")
+    parser.add_argument("--operadoras", type=int, default=SyntheticSpec.operadoras)
+    parser.add_argument("--contas", type=int, default=SyntheticSpec.contas)
+    parser.add_argument("--trimestres", type=int, default=SyntheticSpec.trimestres)
+    parser.add_argument("--xlsx-every", type=int, default=SyntheticSpec.xlsx_every)
+    parser.add_argument("--seed", type=int, default=SyntheticSpec.seed)
+    args = parser.parse_args()
+    spec = SyntheticSpec(
+        operadoras=args.operadoras,
+        contas=args.contas,
+        trimestres=args.trimestres,
+        xlsx_every=args.xlsx_every,
+        seed=args.seed,
+    )
+    for path in generate_dataset(args.root, spec):
+        print(f"{path} ({path.stat().st_size / 1024**2:.1f} MB)")
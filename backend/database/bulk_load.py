@@ -0,0 +1,383 @@
+"""Carga do banco em lote.
+
+Cada arquivo vai por `COPY FROM STDIN` para uma tabela de staging temporária (todas as
+colunas como texto) e é validado e inserido com um único `INSERT ... SELECT`; o
+`operadora_id` é resolvido por junção com `operadoras`, sem uma consulta por linha.
+Linhas inválidas não interrompem a carga: são rejeitadas com o motivo, contadas no
+resumo e gravadas em `output/rejeitados/<tabela>.csv`.
+"""
+
+import io
+import time
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import closing, contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from psycopg2 import extensions
+
+from .db_session import engine
+from .settings import PATHS, REJECTS_DIR
+
+# O pandas só é importado quando há carga a fazer: a API inicia sem ele
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+# fmt: off
+UFS = [
+    "AC", "AL", "AP", "AM", "BA", "CE", "DF", "ES", "GO", "MA", "MT", "MS", "MG",
+    "PA", "PB", "PR", "PE", "PI", "RJ", "RN", "RS", "RO", "RR", "SC", "SP", "SE", "TO",
+]
+# fmt: on
+
+# CNPJ sem pontuação e com zeros à esquerda, como o zfill(14) da carga anterior
+CNPJ_SQL = """
+    CASE WHEN length(translate({col}, './-', '')) >= 14 THEN translate({col}, './-', '')
+         ELSE lpad(translate({col}, './-', ''), 14, '0') END
+"""
+
+# Valores decimais exportados pelo ETL ("1234,56"); pontos são separadores de milhar
+DECIMAL_BR_SQL = "replace(replace({col}, '.', ''), ',', '.')"
+DECIMAL_BR_PATTERN = r"^-?[0-9]+(\.[0-9]+)?$"
+# float escrito pelo pandas ("1234.5", "1e-05")
+FLOAT_PATTERN = r"^-?[0-9]+(\.[0-9]+)?([eE][-+]?[0-9]+)?$"
+# Limite de DECIMAL(18, 2)
+MAX_VALOR = 1e16
+
+
+@dataclass
+class LoadResult:
+    table: str
+    rows_in: int
+    rows_loaded: int
+    rejects: dict[str, int] = field(default_factory=dict)
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows_in / self.seconds if self.seconds else 0.0
+
+
+OPERADORAS_COLUMNS = {
+    "REG_ANS": "registro_ans",
+    "CNPJ": "cnpj",
+    "Razao_Social": "razao_social",
+    "Modalidade": "modalidade",
+    "UF": "uf",
+}
+
+OPERADORAS_SQL = f"""
+    CREATE TEMP TABLE validated_operadoras ON COMMIT DROP AS
+    SELECT *,
+        CASE
+            WHEN motivo_campos IS NOT NULL THEN motivo_campos
+            WHEN row_number() OVER (
+                PARTITION BY motivo_campos IS NULL, cnpj_limpo ORDER BY linha
+            ) > 1 THEN 'cnpj_duplicado'
+        END AS motivo
+    FROM (
+        SELECT *,
+            CASE
+                WHEN cnpj_limpo IS NULL OR cnpj_limpo !~ '^[0-9]{{14}}$' THEN 'cnpj_invalido'
+                WHEN razao_social IS NULL OR length(razao_social) > 255
+                    THEN 'razao_social_invalida'
+                WHEN uf_limpa IS NULL OR NOT uf_limpa = ANY(%(ufs)s) THEN 'uf_invalida'
+                WHEN length(registro_ans) > 20 OR length(modalidade) > 100
+                    THEN 'campo_excede_tamanho'
+            END AS motivo_campos
+        FROM (
+            SELECT *,
+                {CNPJ_SQL.format(col="cnpj")} AS cnpj_limpo,
+                upper(left(trim(uf), 2)) AS uf_limpa
+            FROM staging_operadoras
+        ) s
+    ) v;
+
+    INSERT INTO operadoras (cnpj, razao_social, registro_ans, modalidade, uf)
+    SELECT cnpj_limpo, razao_social, registro_ans, modalidade, uf_limpa
+    FROM validated_operadoras
+    WHERE motivo IS NULL
+    ORDER BY linha;
+"""
+
+CONSOLIDADO_COLUMNS = {
+    "CNPJ": "cnpj",
+    "Trimestre": "trimestre",
+    "Ano": "ano",
+    "ValorDespesas": "valor_despesa",
+}
+
+CONSOLIDADO_SQL = f"""
+    CREATE TEMP TABLE validated_despesas_consolidadas ON COMMIT DROP AS
+    SELECT s.*, o.id AS operadora_id,
+        CASE
+            WHEN o.id IS NULL THEN 'operadora_inexistente'
+            WHEN s.trimestre IS NULL OR s.trimestre !~ '^[1-4]$'
+                OR s.ano IS NULL OR s.ano !~ '^[0-9]{{4}}$' THEN 'periodo_invalido'
+            WHEN s.valor_despesa IS NULL OR s.valor_despesa !~ '{FLOAT_PATTERN}'
+                OR abs(s.valor_despesa::numeric) >= {MAX_VALOR:.0f} THEN 'valor_invalido'
+        END AS motivo
+    FROM staging_despesas_consolidadas s
+    LEFT JOIN operadoras o ON o.cnpj = {CNPJ_SQL.format(col="s.cnpj")};
+
+    -- Valores YTD: o valor isolado do trimestre é a diferença para o trimestre anterior do ano
+    INSERT INTO despesas_consolidadas (
+        operadora_id, trimestre, ano, valor_despesa, valor_trimestre
+    )
+    SELECT operadora_id, trimestre, ano, valor_despesa,
+        valor_despesa - coalesce(
+            lag(valor_despesa) OVER (PARTITION BY operadora_id, ano ORDER BY trimestre, linha),
+            0
+        )
+    FROM (
+        SELECT linha, operadora_id, trimestre::int AS trimestre, ano::int AS ano,
+            valor_despesa::numeric(18, 2) AS valor_despesa
+        FROM validated_despesas_consolidadas
+        WHERE motivo IS NULL
+    ) aceitas
+    ORDER BY linha;
+"""
+
+AGREGADO_COLUMNS = {
+    "CNPJ": "cnpj",
+    "UF": "uf",
+    "TotalDespesas": "total_despesas",
+    "MediaTrimestral": "media_trimestral",
+    "DesvioPadrao": "desvio_padrao",
+    "QtdTrimestres": "qtd_trimestres",
+}
+
+_VALOR_BR_INVALIDO = " OR ".join(
+    f"abs(coalesce({DECIMAL_BR_SQL.format(col=col)}, '0')::numeric) >= {MAX_VALOR:.0f}"
+    for col in ("total_despesas", "media_trimestral", "desvio_padrao")
+)
+
+AGREGADO_SQL = f"""
+    CREATE TEMP TABLE validated_despesas_agregadas ON COMMIT DROP AS
+    SELECT *,
+        CASE
+            WHEN operadora_id IS NULL THEN 'operadora_inexistente'
+            WHEN uf_limpa IS NULL OR NOT uf_limpa = ANY(%(ufs)s) THEN 'uf_invalida'
+            WHEN total_br !~ '{DECIMAL_BR_PATTERN}'
+                OR media_br !~ '{DECIMAL_BR_PATTERN}'
+                OR desvio_br !~ '{DECIMAL_BR_PATTERN}'
+                OR qtd_trimestres !~ '^[0-9]{{1,9}}$' THEN 'valor_invalido'
+            WHEN {_VALOR_BR_INVALIDO} THEN 'valor_invalido'
+        END AS motivo
+    FROM (
+        SELECT s.*, o.id AS operadora_id,
+            upper(left(trim(s.uf), 2)) AS uf_limpa,
+            {DECIMAL_BR_SQL.format(col="s.total_despesas")} AS total_br,
+            {DECIMAL_BR_SQL.format(col="s.media_trimestral")} AS media_br,
+            {DECIMAL_BR_SQL.format(col="s.desvio_padrao")} AS desvio_br
+        FROM staging_despesas_agregadas s
+        LEFT JOIN operadoras o ON o.cnpj = {CNPJ_SQL.format(col="s.cnpj")}
+    ) v;
+
+    INSERT INTO despesas_agregadas (
+        operadora_id, uf, total_despesas, media_trimestral, desvio_padrao, qtd_trimestres
+    )
+    SELECT operadora_id, uf_limpa, total_br::numeric(18, 2), media_br::numeric(18, 2),
+        desvio_br::numeric(18, 2), qtd_trimestres::int
+    FROM validated_despesas_agregadas
+    WHERE motivo IS NULL
+    ORDER BY linha;
+"""
+
+
+def consolidado_source() -> Path | None:
+    # Arrow é o formato intermediário gerado pela Parte 1; o zip (ou o CSV extraído) é fallback
+    return next(
+        (
+            PATHS[key]
+            for key in ("consolidado_arrow", "consolidado_zip", "consolidado")
+            if PATHS[key].exists()
+        ),
+        None,
+    )
+
+
+def source_files() -> dict[str, Path]:
+    """Arquivos que a carga lê, por chave de PATHS; os ausentes não entram."""
+    sources = {key: PATHS[key] for key in ("operadoras", "agregado") if PATHS[key].exists()}
+    consolidado = consolidado_source()
+    if consolidado is not None:
+        sources["consolidado"] = consolidado
+    return sources
+
+
+def read_consolidado() -> "pd.DataFrame | None":
+    import pandas as pd
+
+    source = consolidado_source()
+    if source is None:
+        return None
+
+    print(f"Carregando despesas consolidadas de {source}")
+    if source == PATHS["consolidado_arrow"]:
+        df_desp = pd.read_feather(source)
+        valor = pd.to_numeric(df_desp["ValorDespesas"], errors="coerce")
+        df_desp["ValorDespesas"] = valor.fillna(0.0)
+        return df_desp.astype({"CNPJ": str, "Trimestre": int, "Ano": int})
+
+    # pandas lê o CSV direto do stream do zip, sem extraí-lo
+    df_desp = pd.read_csv(source, sep=";", encoding="utf-8", dtype=str)
+    valor_str = df_desp["ValorDespesas"].fillna("0").str.replace(".", "").str.replace(",", ".")
+    df_desp["ValorDespesas"] = pd.to_numeric(valor_str, errors="coerce").fillna(0.0)
+    return df_desp
+
+
+def copy_df(cursor: extensions.cursor, table: str, df: "pd.DataFrame") -> None:
+    """Cria a staging `table` com as colunas de `df` como texto e a preenche via COPY.
+
+    `linha` é a posição do registro no arquivo de origem (1 = primeiro registro).
+    """
+    columns = ", ".join(f"{column} TEXT" for column in df.columns)
+    cursor.execute(f"CREATE TEMP TABLE {table} (linha BIGINT, {columns}) ON COMMIT DROP")
+
+    buffer = io.StringIO()
+    df.to_csv(buffer, header=False)
+    buffer.seek(0)
+    # NaN sai do pandas como campo vazio, que o COPY em CSV lê como NULL
+    cursor.copy_expert(
+        f"COPY {table} (linha, {', '.join(df.columns)}) FROM STDIN WITH (FORMAT csv)", buffer
+    )
+
+
+def staging_df(df: "pd.DataFrame", columns: dict[str, str]) -> "pd.DataFrame":
+    """Colunas da origem renomeadas para a staging; as ausentes ficam nulas."""
+    import pandas as pd
+
+    df = df.reindex(columns=list(columns)).rename(columns=columns)
+    df.index = pd.RangeIndex(1, len(df) + 1)
+    return df
+
+
+def load_table(
+    cursor: extensions.cursor, table: str, df: "pd.DataFrame", load_sql: str
+) -> LoadResult:
+    start = time.perf_counter()
+    copy_df(cursor, f"staging_{table}", df)
+    cursor.execute(load_sql, {"ufs": UFS})
+    loaded = cursor.rowcount
+
+    cursor.execute(
+        f"SELECT motivo, count(*) FROM validated_{table} "
+        "WHERE motivo IS NOT NULL GROUP BY motivo ORDER BY motivo"
+    )
+    rejects = dict(cursor.fetchall())
+    write_rejects(cursor, table, df.columns, rejects)
+    return LoadResult(table, len(df), loaded, rejects, time.perf_counter() - start)
+
+
+def write_rejects(
+    cursor: extensions.cursor, table: str, columns: Iterable[str], rejects: dict[str, int]
+) -> None:
+    """Grava as linhas rejeitadas (posição, motivo e valores originais) em CSV."""
+    reject_file = REJECTS_DIR / f"{table}.csv"
+    if not rejects:
+        reject_file.unlink(missing_ok=True)
+        return
+
+    REJECTS_DIR.mkdir(parents=True, exist_ok=True)
+    query = (
+        f"SELECT linha, motivo, {', '.join(columns)} FROM validated_{table} "
+        "WHERE motivo IS NOT NULL ORDER BY linha"
+    )
+    with open(reject_file, "w", encoding="utf-8", newline="") as f:
+        cursor.copy_expert(
+            f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER true, DELIMITER ';')", f
+        )
+
+
+def load_operadoras(cursor: extensions.cursor) -> LoadResult | None:
+    if not PATHS["operadoras"].exists():
+        return None
+    import pandas as pd
+
+    print(f"Carregando operadoras de {PATHS['operadoras']}")
+    df_op = pd.read_csv(PATHS["operadoras"], sep=";", encoding="utf-8", dtype=str)
+    return load_table(cursor, "operadoras", staging_df(df_op, OPERADORAS_COLUMNS), OPERADORAS_SQL)
+
+
+def load_consolidado(cursor: extensions.cursor) -> LoadResult | None:
+    df_desp = read_consolidado()
+    if df_desp is None:
+        return None
+    return load_table(
+        cursor,
+        "despesas_consolidadas",
+        staging_df(df_desp, CONSOLIDADO_COLUMNS),
+        CONSOLIDADO_SQL,
+    )
+
+
+def load_agregados(cursor: extensions.cursor) -> LoadResult | None:
+    if not PATHS["agregado"].exists():
+        return None
+    import pandas as pd
+
+    print(f"Carregando despesas agregadas de {PATHS['agregado']}")
+    df_agg = pd.read_csv(PATHS["agregado"], sep=";", encoding="utf-8", dtype=str)
+    return load_table(
+        cursor, "despesas_agregadas", staging_df(df_agg, AGREGADO_COLUMNS), AGREGADO_SQL
+    )
+
+
+def print_summary(results: list[LoadResult]) -> None:
+    for result in results:
+        print(
+            f"{result.table}: {result.rows_loaded}/{result.rows_in} linhas carregadas "
+            f"em {result.seconds:.2f}s ({result.rows_per_second:,.0f} linhas/s)"
+        )
+        for motivo, count in result.rejects.items():
+            print(f"  {count} rejeitadas por {motivo}")
+        if result.rejects:
+            print(f"  detalhes em {REJECTS_DIR / f'{result.table}.csv'}")
+
+
+@contextmanager
+def raw_transaction() -> Iterator[extensions.cursor]:
+    """Cursor do psycopg2 (necessário para o COPY) em uma transação confirmada ao final."""
+    connection = engine.raw_connection()
+    try:
+        with closing(connection.cursor()) as cursor:
+            yield cursor
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+
+# Na ordem das chaves estrangeiras: o consolidado e o agregado dependem das operadoras
+LOADERS = {
+    "operadoras": load_operadoras,
+    "despesas_consolidadas": load_consolidado,
+    "despesas_agregadas": load_agregados,
+}
+
+
+def load_all(
+    cursor: extensions.cursor, on_table: Callable[[str, int], None] | None = None
+) -> list[LoadResult]:
+    """Carrega as tabelas em ordem; `on_table(tabela, concluídas)` informa o andamento."""
+    results = []
+    for done, (table, loader) in enumerate(LOADERS.items()):
+        if on_table is not None:
+            on_table(table, done)
+        result = loader(cursor)
+        if result is not None:
+            results.append(result)
+    return results
+
+
+def bulk_load() -> list[LoadResult]:
+    """Carrega operadoras, consolidado e agregado em uma única transação."""
+    with raw_transaction() as cursor:
+        results = load_all(cursor)
+    print_summary(results)
+    return results
@@ -1,3 +1,5 @@
+from decimal import Decimal
+
 from sqlalchemy import String, Numeric, ForeignKey
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -30,6 +32,8 @@ class DespesaConsolidada(Base):
     trimestre: Mapped[int] = mapped_column(nullable=False)
     ano: Mapped[int] = mapped_column(nullable=False)
     valor_despesa: Mapped[Numeric] = mapped_column(Numeric(18, 2), nullable=False)
+    # valor_despesa é YTD; valor isolado do trimestre calculado na carga
+    valor_trimestre: Mapped[Decimal] = mapped_column(Numeric(18, 2), nullable=False)
 
     operadora: Mapped["Operadora"] = relationship(back_populates="despesas_consolidadas")
 
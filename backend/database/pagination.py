@@ -0,0 +1,93 @@
+"""Paginação por cursor (keyset) e contagens em cache para os endpoints de listagem.
+
+Com OFFSET o banco percorre e descarta todas as linhas anteriores à página, e o COUNT(*)
+de cada requisição varre o filtro inteiro: páginas profundas e listagens sem filtro ficavam
+linearmente mais lentas. O cursor carrega a chave de ordenação da última linha entregue
+(JSON em base64, opaco para o cliente) e a página seguinte começa nela pelo índice. O
+cursor leva também o escopo da listagem e a versão dos dados: ids mudam a cada carga, e
+um cursor de outra versão é recusado.
+
+As contagens ficam em cache por filtro e versão dos dados; no modo estimado a listagem sem
+filtro usa `pg_class.reltuples`, atualizado pelo ANALYZE da carga.
+"""
+
+import base64
+import binascii
+import json
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Hashable, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Prefixo da versão gravado no cursor: suficiente para detectar troca de carga
+CURSOR_VERSION_CHARS = 12
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def encode_cursor(scope: str, version: str, key: Sequence[object]) -> str:
+    payload = {"s": scope, "v": version[:CURSOR_VERSION_CHARS], "k": list(key)}
+    raw = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(
+    cursor: str, scope: str, version: str, types: tuple[type, ...]
+) -> tuple[object, ...]:
+    """Chave gravada no cursor, com os tipos `types`; InvalidCursorError se malformado, de outra
+    listagem ou de outra carga."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        key, cursor_scope, cursor_version = payload["k"], payload["s"], payload["v"]
+    except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError) as e:
+        raise InvalidCursorError("Cursor inválido") from e
+    if cursor_scope != scope:
+        raise InvalidCursorError("Cursor de outra listagem")
+    if cursor_version != version[:CURSOR_VERSION_CHARS]:
+        raise InvalidCursorError("Cursor expirado: os dados foram recarregados")
+    if not (
+        isinstance(key, list)
+        and len(key) == len(types)
+        and all(type(value) is type_ for value, type_ in zip(key, types, strict=True))
+    ):
+        raise InvalidCursorError("Cursor inválido")
+    return tuple(key)
+
+
+class CountCache:
+    """Contagens por (versão dos dados, filtro), com descarte das menos usadas."""
+
+    def __init__(self, maxsize: int = 4096) -> None:
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._counts: OrderedDict[Hashable, int] = OrderedDict()
+
+    def get_or_count(self, key: Hashable, count: Callable[[], int]) -> int:
+        with self._lock:
+            if key in self._counts:
+                self._counts.move_to_end(key)
+                return self._counts[key]
+        # Contagem fora do lock: requisições simultâneas podem contar em dobro, sem erro
+        total = count()
+        with self._lock:
+            self._counts[key] = total
+            while len(self._counts) > self.maxsize:
+                self._counts.popitem(last=False)
+        return total
+
+
+count_cache = CountCache()
+
+
+def estimated_count(db: Session, table: str) -> int | None:
+    """Linhas estimadas pelo planejador; None se a tabela ainda não foi analisada."""
+    estimate = db.execute(
+        text("SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:table AS regclass)"),
+        {"table": table},
+    ).scalar()
+    return estimate if estimate is not None and estimate >= 0 else None
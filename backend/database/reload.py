@@ -0,0 +1,254 @@
+"""Recarga dos dados sem indisponibilidade da API.
+
+As três tabelas são reconstruídas em um schema sombra (mesma estrutura das tabelas em
+uso, via `LIKE`), com a carga em lote de `bulk_load`; índices secundários e chaves
+estrangeiras são criados depois da carga, seguidos de ANALYZE. Em uma transação curta as
+tabelas em uso saem do schema `public` e as sombras entram no lugar, junto com as
+impressões digitais dos arquivos e o snapshot das estatísticas calculado sobre as
+sombras (`stats_snapshot`). Consultas em andamento terminam com os dados antigos
+(a troca espera os locks delas) e as seguintes já leem os novos: nenhuma consulta vê
+tabelas pela metade ou uma mistura das duas cargas.
+
+Uso: `python -m database.reload [--force]` ou `POST /api/admin/reload`; na API a carga
+roda em segundo plano (`LoadJob`) e o andamento aparece em `/health/ready`.
+"""
+
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any
+
+from psycopg2 import errors, extensions
+from sqlalchemy import text
+
+from .bulk_load import (
+    LOADERS,
+    LoadResult,
+    load_all,
+    print_summary,
+    raw_transaction,
+    source_files,
+)
+from .db_session import engine
+from .stats_snapshot import compute_snapshots, save_snapshots
+from .versioning import (
+    INIT_LOCK_KEY,
+    data_changed,
+    data_version,
+    fingerprint_sources,
+    save_fingerprints,
+    stored_fingerprints,
+)
+
+SHADOW_SCHEMA = "carga_sombra"
+RETIRED_SCHEMA = "carga_anterior"
+# Ordem de referência: as despesas apontam para operadoras
+LOAD_ORDER = ("operadoras", "despesas_consolidadas", "despesas_agregadas")
+
+# A troca desiste dos locks rápido e tenta de novo, em vez de enfileirar as consultas
+# da API atrás dela (ou entrar em deadlock com uma requisição que já leu uma das tabelas)
+SWAP_LOCK_TIMEOUT = "500ms"
+SWAP_ATTEMPTS = 20
+
+SECONDARY_INDEXES_SQL = """
+    SELECT ic.relname, pg_get_indexdef(i.indexrelid)
+    FROM pg_index i
+    JOIN pg_class ic ON ic.oid = i.indexrelid
+    JOIN pg_class t ON t.oid = i.indrelid
+    WHERE t.relnamespace = %(schema)s::regnamespace
+        AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)
+"""
+
+FOREIGN_KEYS_SQL = """
+    SELECT t.relname, c.conname, pg_get_constraintdef(c.oid)
+    FROM pg_constraint c
+    JOIN pg_class t ON t.oid = c.conrelid
+    WHERE c.contype = 'f' AND t.relnamespace = 'public'::regnamespace
+        AND t.relname = ANY(%(tables)s)
+"""
+
+
+@contextmanager
+def init_lock() -> Iterator[None]:
+    """Serializa migrações e recargas entre processos (workers da API, CLI)."""
+    with engine.connect() as lock_conn:
+        lock_conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": INIT_LOCK_KEY})
+        try:
+            yield
+        finally:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": INIT_LOCK_KEY})
+            lock_conn.commit()
+
+
+def build_shadow_tables(cursor: extensions.cursor) -> list[LoadResult]:
+    """Cria e carrega as tabelas sombra, com índices, chaves estrangeiras e estatísticas."""
+    cursor.execute(f"DROP SCHEMA IF EXISTS {SHADOW_SCHEMA} CASCADE")
+    cursor.execute(f"CREATE SCHEMA {SHADOW_SCHEMA}")
+    for table in LOAD_ORDER:
+        cursor.execute(f"CREATE TABLE {SHADOW_SCHEMA}.{table} (LIKE public.{table} INCLUDING ALL)")
+
+    # Índices secundários saem antes da carga e voltam depois, construídos de uma vez;
+    # chaves primárias e únicas ficam (a carga depende delas)
+    cursor.execute(SECONDARY_INDEXES_SQL, {"schema": SHADOW_SCHEMA})
+    index_definitions = cursor.fetchall()
+    for index_name, _ in index_definitions:
+        cursor.execute(f'DROP INDEX {SHADOW_SCHEMA}."{index_name}"')
+
+    # Definições renderizadas sem schema, para resolverem nas sombras com o search_path abaixo
+    cursor.execute("SET LOCAL search_path TO public")
+    cursor.execute(FOREIGN_KEYS_SQL, {"tables": list(LOAD_ORDER)})
+    foreign_keys = cursor.fetchall()
+
+    cursor.execute(f"SET LOCAL search_path TO {SHADOW_SCHEMA}, public")
+    results = load_all(
+        cursor,
+        on_table=lambda table, done: load_job.progress(
+            step="carga", table=table, tables_done=done, tables_total=len(LOADERS)
+        ),
+    )
+
+    load_job.progress(step="indices", table=None, tables_done=len(LOADERS))
+    for _, definition in index_definitions:
+        cursor.execute(definition)
+    for table, name, definition in foreign_keys:
+        cursor.execute(f'ALTER TABLE {SHADOW_SCHEMA}.{table} ADD CONSTRAINT "{name}" {definition}')
+    for table in LOAD_ORDER:
+        cursor.execute(f"ANALYZE {SHADOW_SCHEMA}.{table}")
+    return results
+
+
+def swap_tables(
+    fingerprints: dict[str, tuple[str, str, int]], snapshots: dict[str, dict[str, Any]]
+) -> None:
+    """Troca as tabelas em uso pelas sombras em uma única transação, com o snapshot das
+    estatísticas calculado sobre elas."""
+    load_job.progress(step="troca")
+    for attempt in range(1, SWAP_ATTEMPTS + 1):
+        try:
+            with raw_transaction() as cursor:
+                cursor.execute(f"SET LOCAL lock_timeout = '{SWAP_LOCK_TIMEOUT}'")
+                cursor.execute(
+                    f"LOCK TABLE {', '.join(f'public.{table}' for table in LOAD_ORDER)} "
+                    "IN ACCESS EXCLUSIVE MODE"
+                )
+                cursor.execute(f"CREATE SCHEMA {RETIRED_SCHEMA}")
+                for table in LOAD_ORDER:
+                    cursor.execute(f"ALTER TABLE public.{table} SET SCHEMA {RETIRED_SCHEMA}")
+                for table in LOAD_ORDER:
+                    cursor.execute(f"ALTER TABLE {SHADOW_SCHEMA}.{table} SET SCHEMA public")
+                cursor.execute(f"DROP SCHEMA {SHADOW_SCHEMA}")
+                save_fingerprints(cursor, fingerprints)
+                save_snapshots(cursor, snapshots, data_version(fingerprints))
+            return
+        except errors.LockNotAvailable:
+            print(f"Tabelas em uso; nova tentativa de troca ({attempt}/{SWAP_ATTEMPTS})")
+            time.sleep(min(0.1 * attempt, 2.0))
+    raise RuntimeError(f"Não foi possível trocar as tabelas após {SWAP_ATTEMPTS} tentativas")
+
+
+def reload_data(force: bool = False) -> bool:
+    """Recarrega os dados se os arquivos mudaram (ou com `force`); retorna True se recarregou.
+
+    Deve ser chamada dentro de `init_lock()`.
+    """
+    sources = source_files()
+    if not sources:
+        print("Nenhum arquivo de dados encontrado; dados atuais mantidos")
+        return False
+
+    load_job.progress(step="verificacao")
+    fingerprints = fingerprint_sources(sources)
+    if not force:
+        with engine.connect() as conn:
+            if not data_changed(fingerprints, stored_fingerprints(conn)):
+                print("Arquivos de dados inalterados desde a última carga; carga ignorada")
+                return False
+
+    start = time.perf_counter()
+    with raw_transaction() as cursor:
+        # Sobra de uma troca anterior interrompida antes da limpeza
+        cursor.execute(f"DROP SCHEMA IF EXISTS {RETIRED_SCHEMA} CASCADE")
+        results = build_shadow_tables(cursor)
+        load_job.progress(step="estatisticas")
+        snapshots = compute_snapshots(cursor)
+    print_summary(results)
+
+    swap_tables(fingerprints, snapshots)
+    with raw_transaction() as cursor:
+        cursor.execute(f"DROP SCHEMA {RETIRED_SCHEMA} CASCADE")
+    print(f"Tabelas trocadas; recarga concluída em {time.perf_counter() - start:.2f}s")
+    return True
+
+
+class LoadJob:
+    """Carga dos dados em segundo plano na API (inicialização e recargas), uma por vez.
+
+    `ready` passa a True na primeira carga concluída e não volta: durante as recargas
+    seguintes a API continua servindo os dados anteriores.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._status: dict[str, Any] = {"state": "idle"}
+        self.ready = False
+
+    def status(self) -> dict[str, Any]:
+        with self._lock:
+            status = dict(self._status)
+        if status["state"] == "running":
+            status["elapsed_seconds"] = round(time.perf_counter() - status.pop("_start"), 2)
+        else:
+            status.pop("_start", None)
+        return status
+
+    def start(self, target: Callable[[], bool], **info: Any) -> bool:
+        """Executa `target` em uma thread; False se já houver uma carga em andamento."""
+        with self._lock:
+            if self._status["state"] == "running":
+                return False
+            self._status = {
+                "state": "running",
+                **info,
+                "started_at": datetime.now().isoformat(timespec="seconds"),
+                "_start": time.perf_counter(),
+            }
+        threading.Thread(target=self._run, args=(target,), daemon=True).start()
+        return True
+
+    def progress(self, **info: Any) -> None:
+        """Atualiza a etapa da carga em andamento (sem efeito fora de uma, como na CLI)."""
+        with self._lock:
+            if self._status["state"] == "running":
+                self._status.update(info)
+
+    def _run(self, target: Callable[[], bool]) -> None:
+        try:
+            reloaded = target()
+            outcome = {"state": "done", "reloaded": reloaded}
+            self.ready = True
+        except Exception as e:
+            print(f"Erro na carga dos dados: {e}")
+            outcome = {"state": "failed", "error": str(e)}
+        with self._lock:
+            self._status.update(
+                outcome, step=None, finished_at=datetime.now().isoformat(timespec="seconds")
+            )
+
+
+load_job = LoadJob()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Recarrega os dados sem indisponibilidade")
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Recarrega mesmo que os arquivos não tenham mudado",
+    )
+    args = parser.parse_args()
+    with init_lock():
+        reload_data(force=args.force)
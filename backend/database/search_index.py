@@ -0,0 +1,185 @@
+"""Índice de busca de operadoras em memória.
+
+`ILIKE '%termo%'` não usa o índice btree de `razao_social`: cada tecla na caixa de busca
+do frontend virava uma varredura sequencial de `operadoras`, mais outra para o `count()`.
+O índice mantém as operadoras no processo da API, com a razão social normalizada (sem
+acentos, minúsculas, pontuação como espaço) e o CNPJ só com dígitos, e listas invertidas
+de trigramas dos dois. Uma busca intersecta as listas dos trigramas do termo e confirma a
+substring nos candidatos: mesma semântica do ILIKE, mais a insensibilidade a acentos, com
+total exato e resultados ordenados por relevância.
+
+É reconstruído ao fim de cada carga e, nos outros workers, quando a versão dos dados
+(`data_version`) muda.
+"""
+
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass
+from typing import Any
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .db_session import SessionLocal
+from .versioning import data_version_cache
+
+NGRAM = 3
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+_NON_DIGIT = re.compile(r"\D")
+# Termo que pode ser um CNPJ (completo ou parcial, formatado ou não)
+_CNPJ_TERM = re.compile(r"[\d.\-/\s]+")
+
+# Campos devolvidos pela API, na ordem da resposta de /api/operadoras
+FIELDS = ("cnpj", "razao_social", "registro_ans", "modalidade", "uf")
+
+
+def fold(value: str) -> str:
+    """Minúsculas, sem acentos, com pontuação e espaços repetidos reduzidos a um espaço."""
+    decomposed = unicodedata.normalize("NFKD", value.casefold())
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(_NON_ALNUM.sub(" ", stripped).split())
+
+
+def ngrams(value: str) -> set[str]:
+    return {value[i : i + NGRAM] for i in range(len(value) - NGRAM + 1)}
+
+
+def _postings(values: list[str]) -> dict[str, list[int]]:
+    postings: dict[str, list[int]] = {}
+    for position, value in enumerate(values):
+        for gram in ngrams(value):
+            postings.setdefault(gram, []).append(position)
+    return postings
+
+
+@dataclass(frozen=True)
+class _Index:
+    """Estado imutável: a reconstrução monta um novo e troca a referência."""
+
+    version: str
+    ids: list[int]
+    rows: list[dict[str, Any]]
+    names: list[str]
+    cnpjs: list[str]
+    name_postings: dict[str, list[int]]
+    cnpj_postings: dict[str, list[int]]
+
+    def _candidates(
+        self, term: str, values: list[str], postings: dict[str, list[int]]
+    ) -> list[int]:
+        if len(term) < NGRAM:
+            # Termo curto demais para trigramas: varre os valores em memória
+            return [position for position, value in enumerate(values) if term in value]
+        lists = sorted((postings.get(gram, ()) for gram in ngrams(term)), key=len)
+        if not lists[0]:
+            return []
+        candidates = set(lists[0]).intersection(*lists[1:])
+        return [position for position in candidates if term in values[position]]
+
+    def matches(self, term: str) -> list[tuple[Any, ...]]:
+        """Chaves de ordenação (relevância, posição, nome, id) das operadoras encontradas."""
+        name_term = fold(term)
+        digits = _NON_DIGIT.sub("", term) if _CNPJ_TERM.fullmatch(term) else ""
+
+        ranked: dict[int, tuple[int, int]] = {}
+        if digits:
+            for position in self._candidates(digits, self.cnpjs, self.cnpj_postings):
+                cnpj = self.cnpjs[position]
+                rank = 0 if cnpj == digits else 1 if cnpj.startswith(digits) else 6
+                ranked[position] = (rank, cnpj.find(digits))
+        if name_term:
+            for position in self._candidates(name_term, self.names, self.name_postings):
+                name = self.names[position]
+                index = name.find(name_term)
+                if name == name_term:
+                    rank = 2
+                elif index == 0:
+                    rank = 3
+                elif name[index - 1] == " ":
+                    rank = 4  # início de palavra
+                else:
+                    rank = 5
+                ranked[position] = min(ranked.get(position, (rank, index)), (rank, index))
+        return [
+            (*key, self.names[position], self.ids[position], position)
+            for position, key in ranked.items()
+        ]
+
+
+class OperadoraSearchIndex:
+    def __init__(self) -> None:
+        self._index: _Index | None = None
+        self._build_lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._index is not None
+
+    def build(self, db: Session, version: str = "") -> _Index:
+        result = db.execute(text(f"SELECT id, {', '.join(FIELDS)} FROM operadoras ORDER BY id"))
+        ids, rows = [], []
+        for id_, *values in result:
+            ids.append(id_)
+            rows.append(dict(zip(FIELDS, values, strict=True)))
+        names = [fold(row["razao_social"]) for row in rows]
+        cnpjs = [row["cnpj"] for row in rows]
+        index = _Index(version, ids, rows, names, cnpjs, _postings(names), _postings(cnpjs))
+        self._index = index
+        return index
+
+    def refresh(self, db: Session, force: bool = False) -> bool:
+        """Reconstrói o índice se a versão dos dados mudou; True se reconstruiu.
+
+        A versão vem de `data_version_cache` (consultada no banco a cada poucos segundos).
+        """
+        version = data_version_cache.get(db.connection())
+        if not force and self._index is not None and self._index.version == version:
+            return False
+        with self._build_lock:
+            if not force and self._index is not None and self._index.version == version:
+                return False
+            self.build(db, version)
+            return True
+
+    def rebuild(self) -> None:
+        """Reconstrução ao fim de uma carga, com sessão própria."""
+        data_version_cache.invalidate()
+        start = time.perf_counter()
+        db = SessionLocal()
+        try:
+            with self._build_lock:
+                index = self.build(db, data_version_cache.get(db.connection()))
+        finally:
+            db.close()
+        print(
+            f"Índice de busca: {len(index.rows)} operadoras em {time.perf_counter() - start:.3f}s"
+        )
+
+    def search(
+        self, term: str, offset: int = 0, limit: int = 10, after: tuple[Any, ...] | None = None
+    ) -> tuple[int, list[dict[str, Any]], tuple[Any, ...] | None]:
+        """(total exato, página ordenada por relevância, chave da última linha se houver mais).
+
+        `after` é a chave devolvida pela página anterior (paginação por cursor).
+        """
+        index = self._index
+        if index is None:
+            raise RuntimeError("Índice de busca ainda não construído")
+        matches = index.matches(term)
+        total = len(matches)
+        if after is not None:
+            after = tuple(after)
+            matches = [match for match in matches if match[:-1] > after]
+        page = heapq.nsmallest(offset + limit + 1, matches)[offset:]
+        next_key = page[limit - 1][:-1] if len(page) > limit else None
+        return total, [index.rows[key[-1]] for key in page[:limit]], next_key
+
+    def suggest(self, term: str, limit: int = 8) -> list[dict[str, Any]]:
+        return self.search(term, 0, limit)[1]
+
+
+search_index = OperadoraSearchIndex()
@@ -14,6 +14,13 @@ _raw_password = os.getenv("PG_PASSWORD", "")
 PG_PASSWORD = quote_plus(_raw_password)
 PG_DATABASE = os.getenv("PG_DATABASE", "intuitive_care")
 
+# Token dos endpoints de administração (/api/admin/*); sem ele ficam desativados
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# Cache de respostas dos GET da API (api/response_cache.py): limite em MB e validade em s
+RESPONSE_CACHE_MB = int(os.getenv("RESPONSE_CACHE_MB", "64"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+
 
 PG_URL = f"postgresql://{PG_USER}:{PG_PASSWORD}@{PG_HOST}:{PG_PORT}/postgres"
 DB_URL = f"postgresql://{PG_USER}:{PG_PASSWORD}@{PG_HOST}:{PG_PORT}/{PG_DATABASE}"
@@ -25,5 +32,10 @@ ROOT_DIR = Path(__file__).parent.parent.parent
 PATHS = {
     "operadoras": ROOT_DIR / "data" / "operadoras" / "operadoras.csv",
     "consolidado": ROOT_DIR / "data" / "consolidado" / "consolidado_despesas.csv",
+    "consolidado_arrow": ROOT_DIR / "data" / "consolidado" / "consolidado_despesas.arrow",
+    "consolidado_zip": ROOT_DIR / "output" / "consolidado_despesas.zip",
     "agregado": ROOT_DIR / "output" / "despesas_agregadas.csv",
 }
+
+# Linhas rejeitadas pela carga do banco (database.bulk_load)
+REJECTS_DIR = ROOT_DIR / "output" / "rejeitados"
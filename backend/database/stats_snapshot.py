@@ -0,0 +1,251 @@
+"""Snapshot das estatísticas servidas pela API.
+
+`/api/estatisticas` e `/api/estatisticas-complementares` agregam as tabelas inteiras, mas
+os dados só mudam na carga. As duas respostas são calculadas uma vez por versão dos dados
+(na recarga, sobre as tabelas sombra, e gravadas na mesma transação da troca) e ficam em
+`estatisticas_snapshot`; os endpoints leem uma linha pela chave primária.
+
+A versão é o SHA-256 das impressões digitais dos arquivos carregados (`data_version`).
+"""
+
+import json
+from typing import Any
+
+from psycopg2 import extensions
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .bulk_load import raw_transaction
+from .db_session import engine
+from .versioning import data_version, stored_fingerprints
+
+ESTATISTICAS = "estatisticas"
+COMPLEMENTARES = "estatisticas-complementares"
+SNAPSHOTS = (ESTATISTICAS, COMPLEMENTARES)
+
+RESUMO_SQL = """
+    SELECT
+        sum(total_despesas) AS total,
+        avg(media_trimestral) AS media,
+        count(id) AS registros
+    FROM despesas_agregadas
+"""
+
+TOP_OPERADORAS_SQL = """
+    SELECT o.cnpj, o.razao_social, o.uf, sum(da.total_despesas) AS total_despesas
+    FROM operadoras o
+    JOIN despesas_agregadas da ON o.id = da.operadora_id
+    GROUP BY o.id
+    ORDER BY sum(da.total_despesas) DESC
+    LIMIT 5
+"""
+
+DESPESAS_POR_UF_SQL = """
+    SELECT
+        uf,
+        sum(total_despesas) AS total,
+        avg(media_trimestral) AS media_trimestral,
+        count(id) AS qtd_operadoras
+    FROM despesas_agregadas
+    GROUP BY uf
+    ORDER BY sum(total_despesas) DESC
+"""
+
+# Os dados são YTD (acumulados por ano): valor_trimestre já vem desacumulado da carga
+CRESCIMENTO_SQL = """
+    WITH primeiro_periodo AS (
+        SELECT ano, trimestre FROM despesas_consolidadas
+        ORDER BY ano, trimestre
+        LIMIT 1
+    ),
+    ultimo_periodo AS (
+        SELECT ano, trimestre FROM despesas_consolidadas
+        ORDER BY ano DESC, trimestre DESC
+        LIMIT 1
+    ),
+    despesas_primeiro AS (
+        SELECT dc.operadora_id, dc.valor_trimestre AS valor_isolado
+        FROM despesas_consolidadas dc
+        JOIN primeiro_periodo p USING (ano, trimestre)
+    ),
+    despesas_ultimo AS (
+        SELECT dc.operadora_id, dc.valor_trimestre AS valor_isolado
+        FROM despesas_consolidadas dc
+        JOIN ultimo_periodo p USING (ano, trimestre)
+    )
+    SELECT
+        o.cnpj,
+        o.razao_social,
+        dp.valor_isolado AS despesa_inicial,
+        du.valor_isolado AS despesa_final,
+        ROUND(
+            ((du.valor_isolado - dp.valor_isolado) / NULLIF(dp.valor_isolado, 0)) * 100,
+            2
+        ) AS crescimento_percentual
+    FROM despesas_primeiro dp
+    INNER JOIN despesas_ultimo du ON dp.operadora_id = du.operadora_id
+    INNER JOIN operadoras o ON o.id = dp.operadora_id
+    WHERE dp.valor_isolado > 0
+    ORDER BY crescimento_percentual DESC
+    LIMIT 5
+"""
+
+TOP_UF_SQL = """
+    SELECT
+        o.uf,
+        COUNT(DISTINCT o.id) AS qtd_operadoras,
+        SUM(dc.valor_trimestre) AS total_despesas,
+        ROUND(AVG(dc.valor_trimestre), 2) AS media_por_registro,
+        ROUND(SUM(dc.valor_trimestre) / NULLIF(COUNT(DISTINCT o.id), 0), 2) AS media_por_operadora
+    FROM despesas_consolidadas dc
+    INNER JOIN operadoras o ON o.id = dc.operadora_id
+    WHERE dc.valor_trimestre > 0
+    GROUP BY o.uf
+    ORDER BY total_despesas DESC
+    LIMIT 5
+"""
+
+ACIMA_MEDIA_SQL = """
+    WITH despesas_isoladas AS (
+        SELECT operadora_id, valor_trimestre AS valor_isolado
+        FROM despesas_consolidadas
+    ),
+    media_geral AS (
+        SELECT AVG(valor_isolado) AS media
+        FROM despesas_isoladas
+        WHERE valor_isolado > 0
+    ),
+    trimestres_acima_media AS (
+        SELECT
+            di.operadora_id,
+            COUNT(*) AS trimestres_acima
+        FROM despesas_isoladas di
+        CROSS JOIN media_geral mg
+        WHERE di.valor_isolado > mg.media
+        GROUP BY di.operadora_id
+    )
+    SELECT
+        COUNT(*) AS total_operadoras,
+        (SELECT media FROM media_geral) AS media_geral
+    FROM trimestres_acima_media
+    WHERE trimestres_acima >= 2
+"""
+
+
+def _rows(cursor: extensions.cursor, sql: str) -> list[dict[str, Any]]:
+    cursor.execute(sql)
+    columns = [column.name for column in cursor.description]
+    return [dict(zip(columns, row, strict=True)) for row in cursor.fetchall()]
+
+
+def _float(value: Any) -> float:
+    return float(value) if value else 0.0
+
+
+def compute_estatisticas(cursor: extensions.cursor) -> dict[str, Any]:
+    resumo = _rows(cursor, RESUMO_SQL)[0]
+    return {
+        "resumo": {
+            "total_despesas": _float(resumo["total"]),
+            "media_despesas": round(_float(resumo["media"]), 2),
+            "total_registros": resumo["registros"],
+        },
+        "top_5_operadoras": [
+            {
+                "cnpj": op["cnpj"],
+                "razao_social": op["razao_social"],
+                "uf": op["uf"],
+                "total_despesas": _float(op["total_despesas"]),
+            }
+            for op in _rows(cursor, TOP_OPERADORAS_SQL)
+        ],
+        "despesas_por_uf": [
+            {
+                "uf": item["uf"],
+                "total": _float(item["total"]),
+                "media_trimestral": _float(item["media_trimestral"]),
+                "qtd_operadoras": item["qtd_operadoras"],
+            }
+            for item in _rows(cursor, DESPESAS_POR_UF_SQL)
+        ],
+    }
+
+
+def compute_complementares(cursor: extensions.cursor) -> dict[str, Any]:
+    """Item 3.4: crescimento, distribuição por UF e operadoras acima da média."""
+    acima_media = _rows(cursor, ACIMA_MEDIA_SQL)[0]
+    return {
+        "top_5_crescimento": [
+            {
+                "cnpj": row["cnpj"],
+                "razao_social": row["razao_social"],
+                "despesa_inicial": _float(row["despesa_inicial"]),
+                "despesa_final": _float(row["despesa_final"]),
+                "crescimento_percentual": _float(row["crescimento_percentual"]),
+            }
+            for row in _rows(cursor, CRESCIMENTO_SQL)
+        ],
+        "top_5_uf": [
+            {
+                "uf": row["uf"],
+                "qtd_operadoras": row["qtd_operadoras"],
+                "total_despesas": _float(row["total_despesas"]),
+                "media_por_registro": _float(row["media_por_registro"]),
+                "media_por_operadora": _float(row["media_por_operadora"]),
+            }
+            for row in _rows(cursor, TOP_UF_SQL)
+        ],
+        "operadoras_acima_media": {
+            "total": acima_media["total_operadoras"],
+            "media_geral_referencia": _float(acima_media["media_geral"]),
+            "criterio": "Despesas acima da média geral em pelo menos 2 dos 3 trimestres",
+        },
+    }
+
+
+def compute_snapshots(cursor: extensions.cursor) -> dict[str, dict[str, Any]]:
+    """Respostas dos dois endpoints sobre as tabelas visíveis no search_path do cursor."""
+    return {
+        ESTATISTICAS: compute_estatisticas(cursor),
+        COMPLEMENTARES: compute_complementares(cursor),
+    }
+
+
+def save_snapshots(
+    cursor: extensions.cursor, snapshots: dict[str, dict[str, Any]], versao: str
+) -> None:
+    cursor.execute("DELETE FROM estatisticas_snapshot")
+    cursor.executemany(
+        "INSERT INTO estatisticas_snapshot (nome, versao, conteudo) VALUES (%s, %s, %s)",
+        [(nome, versao, json.dumps(conteudo)) for nome, conteudo in snapshots.items()],
+    )
+
+
+def read_snapshot(db: Session, nome: str) -> tuple[str, dict[str, Any]] | None:
+    """(versão, resposta) do snapshot `nome`; None se ainda não foi gerado."""
+    row = db.execute(
+        text("SELECT versao, conteudo FROM estatisticas_snapshot WHERE nome = :nome"),
+        {"nome": nome},
+    ).first()
+    return (row.versao, row.conteudo) if row else None
+
+
+def ensure_snapshots() -> bool:
+    """Regera o snapshot se ele não corresponde aos dados carregados; True se regerou.
+
+    Cobre bancos migrados sem recarga (dados inalterados) e cargas feitas fora da recarga.
+    """
+    with engine.connect() as conn:
+        versao = data_version(stored_fingerprints(conn))
+        atual = conn.exec_driver_sql(
+            "SELECT count(*) FILTER (WHERE versao = %(versao)s), count(*) "
+            "FROM estatisticas_snapshot",
+            {"versao": versao},
+        ).one()
+    if atual[0] == atual[1] == len(SNAPSHOTS):
+        return False
+
+    with raw_transaction() as cursor:
+        save_snapshots(cursor, compute_snapshots(cursor), versao)
+    print(f"Snapshot das estatísticas regerado (versão {versao[:12]})")
+    return True
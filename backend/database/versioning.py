@@ -0,0 +1,210 @@
+"""Versão do schema e impressão digital dos dados carregados.
+
+`schema_migrations` registra as migrações aplicadas e `data_fingerprints` o SHA-256 de
+cada arquivo da última carga. Na inicialização só as migrações pendentes são aplicadas
+e os dados só são recarregados se algum arquivo de origem mudou (ou se uma migração
+exigir), em vez de recriar e recarregar tudo a cada boot.
+"""
+
+import hashlib
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+from psycopg2 import extensions
+from sqlalchemy import Connection
+
+from .db_session import engine
+from .settings import SQL_DIR
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    script: Path
+    # Migrações que recriam tabelas de dados exigem recarregar os arquivos
+    reload: bool = False
+
+
+MIGRATIONS = [
+    Migration(1, "schema inicial", SQL_DIR / "db_schema.sql", reload=True),
+    Migration(2, "valor isolado do trimestre", SQL_DIR / "migrations" / "002_valor_trimestre.sql"),
+    Migration(
+        3, "snapshot das estatísticas", SQL_DIR / "migrations" / "003_estatisticas_snapshot.sql"
+    ),
+    Migration(
+        4, "índice da paginação por cursor", SQL_DIR / "migrations" / "004_keyset_despesas.sql"
+    ),
+]
+
+DATA_TABLES = (
+    "estatisticas_snapshot",
+    "despesas_agregadas",
+    "despesas_consolidadas",
+    "operadoras",
+)
+
+META_SQL = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT PRIMARY KEY,
+        description TEXT NOT NULL,
+        applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    );
+    CREATE TABLE IF NOT EXISTS data_fingerprints (
+        source TEXT PRIMARY KEY,
+        path TEXT NOT NULL,
+        sha256 CHAR(64) NOT NULL,
+        size_bytes BIGINT NOT NULL,
+        loaded_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    );
+"""
+
+# Chave do pg_advisory_lock que serializa a inicialização entre workers da API
+INIT_LOCK_KEY = 727_001
+
+
+def drop_data_tables(conn: Connection) -> None:
+    for table in DATA_TABLES:
+        conn.exec_driver_sql(f"DROP TABLE IF EXISTS {table} CASCADE")
+    conn.exec_driver_sql("DROP DOMAIN IF EXISTS uf_brasil CASCADE")
+
+
+def schema_version(conn: Connection) -> int:
+    sql = "SELECT coalesce(max(version), 0) FROM schema_migrations"
+    return int(conn.exec_driver_sql(sql).scalar_one())
+
+
+def apply_migrations(conn: Connection) -> bool:
+    """Aplica as migrações pendentes; retorna True se alguma exige recarregar os dados."""
+    conn.exec_driver_sql(META_SQL)
+    current = schema_version(conn)
+    if current == 0:
+        # Banco anterior ao controle de versão (ou novo): o schema é recriado do zero
+        drop_data_tables(conn)
+
+    reload = False
+    for migration in MIGRATIONS:
+        if migration.version <= current:
+            continue
+        print(f"Aplicando migração {migration.version}: {migration.description}")
+        conn.exec_driver_sql(migration.script.read_text(encoding="utf-8"))
+        conn.exec_driver_sql(
+            "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+            (migration.version, migration.description),
+        )
+        reload |= migration.reload
+    return reload
+
+
+def reset_schema(conn: Connection) -> None:
+    """Recria o schema do zero: remove as tabelas e os registros de controle."""
+    drop_data_tables(conn)
+    conn.exec_driver_sql("DROP TABLE IF EXISTS schema_migrations, data_fingerprints")
+    apply_migrations(conn)
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(1024 * 1024):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fingerprint_sources(sources: dict[str, Path]) -> dict[str, tuple[str, str, int]]:
+    """(caminho, SHA-256, tamanho) de cada arquivo de origem."""
+    return {
+        source: (str(path), file_sha256(path), path.stat().st_size)
+        for source, path in sources.items()
+    }
+
+
+def data_version(fingerprints: dict[str, tuple[str, str, int]]) -> str:
+    """Identificador dos dados carregados; como em `data_changed`, o caminho não conta."""
+    digest = hashlib.sha256()
+    for source, (_, sha256, size) in sorted(fingerprints.items()):
+        digest.update(f"{source}:{sha256}:{size}\n".encode())
+    return digest.hexdigest()
+
+
+def stored_fingerprints(conn: Connection) -> dict[str, tuple[str, str, int]]:
+    rows = conn.exec_driver_sql(
+        "SELECT source, path, sha256, size_bytes FROM data_fingerprints"
+    ).all()
+    return {source: (path, sha256, size) for source, path, sha256, size in rows}
+
+
+def data_loaded_at(conn: Connection) -> datetime | None:
+    """Momento da carga dos dados em uso (gravado na transação da troca); None sem carga."""
+    loaded_at: datetime | None = conn.exec_driver_sql(
+        "SELECT max(loaded_at) FROM data_fingerprints"
+    ).scalar_one()
+    return loaded_at
+
+
+def data_changed(
+    current: dict[str, tuple[str, str, int]], stored: dict[str, tuple[str, str, int]]
+) -> bool:
+    # O caminho não conta: o mesmo conteúdo em outro diretório não exige recarga
+    return {source: fp[1:] for source, fp in current.items()} != {
+        source: fp[1:] for source, fp in stored.items()
+    }
+
+
+def save_fingerprints(
+    cursor: extensions.cursor, fingerprints: dict[str, tuple[str, str, int]]
+) -> None:
+    """Grava as impressões digitais da carga, na mesma transação (cursor do psycopg2)."""
+    cursor.execute("DELETE FROM data_fingerprints")
+    cursor.executemany(
+        "INSERT INTO data_fingerprints (source, path, sha256, size_bytes) VALUES (%s, %s, %s, %s)",
+        [(source, *fingerprint) for source, fingerprint in fingerprints.items()],
+    )
+
+
+class DataVersionCache:
+    """Versão dos dados carregados, consultada no banco no máximo a cada `ttl` segundos.
+
+    Usada pela API para invalidar o que depende dos dados (índice de busca, cursores,
+    contagens) sem uma consulta extra por requisição.
+    """
+
+    def __init__(self, ttl: float = 5.0) -> None:
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._version: str | None = None
+        self._loaded_at: datetime | None = None
+        self._checked_at = 0.0
+
+    def get(self, conn: Connection | None = None) -> str:
+        """Versão atual; sem `conn`, abre uma conexão só quando precisa consultar o banco."""
+        return self.current(conn)[0]
+
+    def current(self, conn: Connection | None = None) -> tuple[str, datetime | None]:
+        """(versão, momento da carga), consultados juntos no banco."""
+        with self._lock:
+            now = time.monotonic()
+            if self._version is None or now - self._checked_at >= self.ttl:
+                if conn is None:
+                    with engine.connect() as own_conn:
+                        self._refresh(own_conn)
+                else:
+                    self._refresh(conn)
+                self._checked_at = now
+            assert self._version is not None
+            return self._version, self._loaded_at
+
+    def _refresh(self, conn: Connection) -> None:
+        self._version = data_version(stored_fingerprints(conn))
+        self._loaded_at = data_loaded_at(conn)
+
+    def invalidate(self) -> None:
+        """Força a próxima consulta (após uma carga neste processo)."""
+        with self._lock:
+            self._version = None
+
+
+data_version_cache = DataVersionCache()
@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+
+
+class SortedSegmentAggregator:
+    """Agrega despesas por operadora sobre segmentos contíguos de linhas ordenadas.
+
+    Cada chave vira um vetor de códigos inteiros uma única vez; a desacumulação YTD e
+    as métricas (soma, média, desvio padrão amostral e contagem) são reduções NumPy
+    sobre os limites de cada segmento, sem groupby do pandas.
+    """
+
+    GROUP_KEYS = ["CNPJ", "RegistroANS", "RazaoSocial", "Modalidade", "UF"]
+    ENTITY_KEY = "CNPJ"
+    YEAR_KEY = "Ano"
+    QUARTER_KEY = "Trimestre"
+    VALUE = "ValorDespesas"
+    METRICS = ["TotalDespesas", "MediaTrimestral", "DesvioPadrao", "QtdTrimestres"]
+
+    @staticmethod
+    def _key_codes(values: pd.Series) -> np.ndarray:
+        """Códigos inteiros densos que ordenam como a chave original; nulos viram -1."""
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # groupby ordena categóricas pela ordem das categorias, que é a dos códigos
+            return np.asarray(values.cat.codes.to_numpy())
+        return np.asarray(pd.factorize(values, sort=True)[0])
+
+    @staticmethod
+    def _segment_starts(*keys: np.ndarray) -> np.ndarray:
+        """Posições onde alguma das chaves (já ordenadas) muda de valor."""
+        changed = np.zeros(len(keys[0]), dtype=bool)
+        changed[:1] = True
+        for key in keys:
+            changed[1:] |= key[1:] != key[:-1]
+        return np.flatnonzero(changed)
+
+    @staticmethod
+    def _stable_order(*keys: np.ndarray) -> np.ndarray:
+        """Ordem estável pelas chaves inteiras (a primeira é a mais significativa).
+
+        As chaves e a posição da linha são empacotadas num único int64 distinto por linha,
+        o que permite o argsort padrão (bem mais rápido que lexsort) sem perder a
+        estabilidade. Se o empacotamento não couber em 63 bits, recorre ao lexsort.
+        """
+        size = len(keys[0])
+        packed = np.zeros(size, dtype=np.int64)
+        capacity = size
+        for key in keys:
+            low = int(key.min())
+            span = int(key.max()) - low + 1
+            capacity *= span
+            if capacity >= 2**63:
+                return np.lexsort(keys[::-1])
+            packed = packed * span + (key.astype(np.int64) - low)
+        return np.argsort(packed * size + np.arange(size))
+
+    @staticmethod
+    def _segment_moments(
+        values: np.ndarray, starts: np.ndarray, count: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Soma, média e desvio padrão amostral de cada segmento.
+
+        Reproduz as recorrências do groupby do pandas (soma de Kahan e variância de
+        Welford) para que os resultados sejam idênticos bit a bit. A iteração é sobre a
+        k-ésima linha de todos os segmentos ao mesmo tempo, então o número de passos é
+        o tamanho do maior segmento (a quantidade de trimestres), não o de linhas.
+        """
+        total = np.zeros(len(starts))
+        compensation = np.zeros(len(starts))
+        mean = np.zeros(len(starts))
+        squares = np.zeros(len(starts))
+        active = np.arange(len(starts))
+        for k in range(int(count.max(initial=0))):
+            active = active[count[active] > k]
+            value = values[starts[active] + k]
+
+            y = value - compensation[active]
+            t = total[active] + y
+            compensation[active] = t - total[active] - y
+            total[active] = t
+
+            old_mean = mean[active]
+            mean[active] = old_mean + (value - old_mean) / (k + 1)
+            squares[active] += (value - mean[active]) * (value - old_mean)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            std = np.where(count > 1, np.sqrt(squares / (count - 1)), np.nan)
+        return total, total / count, std
+
+    @staticmethod
+    def _is_sorted(*keys: np.ndarray) -> bool:
+        """Verifica se as linhas já estão em ordem lexicográfica pelas chaves."""
+        decided = np.zeros(max(len(keys[0]) - 1, 0), dtype=bool)
+        for key in keys:
+            if (~decided & (key[1:] < key[:-1])).any():
+                return False
+            decided |= key[1:] != key[:-1]
+        return True
+
+    def deaccumulate(self, df: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+        """Ordena por entidade/período e converte valores acumulados no ano em trimestrais.
+
+        Retorna a ordem das linhas e a despesa de cada trimestre nessa ordem, equivalente
+        a `groupby([CNPJ, Ano]).diff().fillna(valor)` após ordenar por CNPJ/Ano/Trimestre.
+        """
+        entity = self._key_codes(df[self.ENTITY_KEY])
+        year = df[self.YEAR_KEY].to_numpy()
+        order = self._stable_order(entity, year, df[self.QUARTER_KEY].to_numpy())
+
+        valor = df[self.VALUE].to_numpy(dtype=np.float64)[order]
+        despesa = np.empty_like(valor)
+        despesa[1:] = valor[1:] - valor[:-1]
+        year_starts = self._segment_starts(entity[order], year[order])
+        despesa[year_starts] = valor[year_starts]
+        return order, despesa
+
+    def aggregate(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Métricas por operadora na ordem das chaves, como `groupby(GROUP_KEYS, sort=True)`."""
+        if df.empty:
+            return pd.DataFrame(columns=[*self.GROUP_KEYS, *self.METRICS])
+
+        order, despesa = self.deaccumulate(df)
+
+        codes = [self._key_codes(df[key]) for key in self.GROUP_KEYS]
+        # Linhas com alguma chave nula ficam fora dos grupos, como no groupby
+        keep = np.flatnonzero(np.logical_and.reduce([code >= 0 for code in codes])[order])
+        order, despesa = order[keep], despesa[keep]
+        codes = [code[order] for code in codes]
+
+        # A ordem por CNPJ/Ano/Trimestre normalmente já agrupa as chaves; caso contrário,
+        # a ordenação estável reagrupa mantendo a ordem cronológica dentro de cada grupo
+        if not self._is_sorted(*codes):
+            regroup = self._stable_order(*codes)
+            order, despesa = order[regroup], despesa[regroup]
+            codes = [code[regroup] for code in codes]
+
+        starts = self._segment_starts(*codes)
+        count = np.diff(np.append(starts, len(despesa)))
+        total, mean, std = self._segment_moments(despesa, starts, count)
+
+        df_agg = df[self.GROUP_KEYS].iloc[order[starts]].reset_index(drop=True)
+        df_agg["TotalDespesas"] = total
+        df_agg["MediaTrimestral"] = mean
+        df_agg["DesvioPadrao"] = std
+        df_agg["QtdTrimestres"] = count.astype(np.int64)
+        return df_agg
+
+
+segment_aggregator = SortedSegmentAggregator()
@@ -1,21 +1,32 @@
 import pandas as pd
 
+from .aggregation import SortedSegmentAggregator, segment_aggregator
+from .backends import DuckDBBackend
 from .clients import LocalStorageClient
 from .constants import constant_paths
-from .libs import normalize_cnpj
+from .instrumentation import instrumentation
+from .libs import normalize_cnpj_series
+from .schema import AGREGADO_SCHEMA, CONSOLIDADO_SCHEMA, OPERADORAS_SCHEMA, apply_schema
 
 
 class DespesasAggregator:
-    def __init__(self, local_storage_client: LocalStorageClient) -> None:
+    def __init__(
+        self,
+        local_storage_client: LocalStorageClient,
+        segment_aggregator: SortedSegmentAggregator = segment_aggregator,
+        backend: DuckDBBackend | None = None,
+    ) -> None:
         self.local_storage_client = local_storage_client
+        self.segment_aggregator = segment_aggregator
+        # None: junção e métricas em pandas/NumPy; com backend, ambas em uma consulta
+        self.backend = backend
 
     def _load_consolidate_df(self) -> pd.DataFrame:
-        df = self.local_storage_client.extract_despesas_consolidate_df()
+        df = self.local_storage_client.load_despesas_consolidate_df()
         return df
 
     def _clean_consolidate_df(self, df: pd.DataFrame) -> pd.DataFrame:
-        df["CNPJ"] = df["CNPJ"].astype(str)
-        df["CNPJ"] = df["CNPJ"].apply(lambda x: normalize_cnpj(str(x)) if pd.notna(x) else None)
+        df["CNPJ"] = normalize_cnpj_series(df["CNPJ"])
         df["ValorDespesas"] = pd.to_numeric(df["ValorDespesas"], errors="coerce")
         df = df[
             df["CNPJ"].notna()
@@ -23,15 +34,16 @@ class DespesasAggregator:
             & df["RazaoSocial"].notna()
             & df["RazaoSocial"].str.strip().ne("")
         ]
-        return df
+        # CNPJs já validados voltam a ser códigos inteiros para a junção e o agrupamento
+        return apply_schema(df, CONSOLIDADO_SCHEMA)
 
     def join_operadoras(
         self, df_consolidate: pd.DataFrame, df_operadoras: pd.DataFrame
     ) -> pd.DataFrame:
+        df_operadoras = apply_schema(df_operadoras, OPERADORAS_SCHEMA)
         df_operadoras = df_operadoras.rename(columns={"REG_ANS": "RegistroANS"})
         df_operadoras = df_operadoras.drop_duplicates(subset=["RegistroANS"], keep="first")
         df_operadoras = df_operadoras.drop_duplicates(subset=["CNPJ"], keep="first")
-        df_operadoras["CNPJ"] = df_operadoras["CNPJ"].astype(str).str.zfill(14)
 
         df_merge = df_consolidate.merge(
             df_operadoras,
@@ -49,26 +61,14 @@ class DespesasAggregator:
             "Modalidade",
             "UF",
         ]
-        df_merge = df_merge[keep_cols]
-
-        return df_merge
+        return apply_schema(df_merge[keep_cols], AGREGADO_SCHEMA)
 
     def aggregate(self, df: pd.DataFrame) -> pd.DataFrame:
         """Agrupa dados por operadora e UF com métricas estatísticas."""
-        df = df.sort_values(["CNPJ", "Ano", "Trimestre"])
-        df["DespesaTrimestre"] = (
-            df.groupby(["CNPJ", "Ano"])["ValorDespesas"].diff().fillna(df["ValorDespesas"])
-        )
-        df_agg = (
-            df.groupby(["CNPJ", "RegistroANS", "RazaoSocial", "Modalidade", "UF"])
-            .agg(
-                TotalDespesas=("DespesaTrimestre", "sum"),
-                MediaTrimestral=("DespesaTrimestre", "mean"),
-                DesvioPadrao=("DespesaTrimestre", "std"),
-                QtdTrimestres=("ValorDespesas", "count"),
-            )
-            .reset_index()
-        )
+        return self.finalize_metrics(self.segment_aggregator.aggregate(df))
+
+    def finalize_metrics(self, df_agg: pd.DataFrame) -> pd.DataFrame:
+        """Arredonda as métricas e ordena pelo total de despesas."""
         df_agg["DesvioPadrao"] = df_agg["DesvioPadrao"].fillna(0)
         df_agg[["TotalDespesas", "MediaTrimestral", "DesvioPadrao"]] = df_agg[
             ["TotalDespesas", "MediaTrimestral", "DesvioPadrao"]
@@ -76,14 +76,38 @@ class DespesasAggregator:
         df_agg = df_agg.sort_values("TotalDespesas", ascending=False)
         return df_agg
 
-    def run(self) -> pd.DataFrame:
-        df_consolidate = self._load_consolidate_df()
-        df_consolidate = self._clean_consolidate_df(df_consolidate)
+    def run(
+        self,
+        df_consolidate: pd.DataFrame | None = None,
+        df_operadoras: pd.DataFrame | None = None,
+    ) -> pd.DataFrame:
+        """Agrega o consolidado; sem DataFrames recebidos em memória, lê os artefatos em disco."""
+        if df_consolidate is None:
+            df_consolidate = self._load_consolidate_df()
+        with instrumentation.stage("validate") as record:
+            record.rows_in = len(df_consolidate)
+            df_consolidate = self._clean_consolidate_df(df_consolidate.copy())
+            record.rows_out = len(df_consolidate)
 
-        df_operadoras = self.local_storage_client.read(
-            constant_paths.operadoras_dir / "operadoras.csv"
-        )
+        if df_operadoras is None:
+            df_operadoras = self.local_storage_client.read(
+                constant_paths.operadoras_dir / "operadoras.csv"
+            )
+
+        if self.backend is not None:
+            with instrumentation.stage("join_aggregate") as record:
+                record.rows_in = len(df_consolidate)
+                df = self.finalize_metrics(self.backend.aggregate(df_consolidate, df_operadoras))
+                record.rows_out = len(df)
+            return df
+
+        with instrumentation.stage("join") as record:
+            record.rows_in = len(df_consolidate)
+            df = self.join_operadoras(df_consolidate, df_operadoras)
+            record.rows_out = len(df)
 
-        df = self.join_operadoras(df_consolidate, df_operadoras)
-        df = self.aggregate(df)
+        with instrumentation.stage("aggregate") as record:
+            record.rows_in = len(df)
+            df = self.aggregate(df)
+            record.rows_out = len(df)
         return df
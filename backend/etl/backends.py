@@ -0,0 +1,227 @@
+"""Backends de execução da consolidação e da agregação.
+
+O padrão é o pandas, implementado em `DespesasConsolidator` e `DespesasAggregator`.
+`DuckDBBackend` executa as mesmas etapas como planos preguiçosos no DuckDB embarcado:
+leitura, filtro e soma por período de cada arquivo viram uma única consulta (só as
+colunas usadas são lidas e o filtro é aplicado durante a leitura), e a junção com o
+cadastro, a desacumulação e as métricas da Parte 2 viram outra. Os resultados são os
+mesmos do pandas, com os mesmos tipos (`python -m benchmarks.parity_backends`).
+
+O DuckDB é uma dependência opcional: `poetry install -E duckdb`.
+"""
+
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+import pandas as pd
+
+from .libs import CsvDialect, CsvDialectSniffer
+from .schema import AGREGADO_SCHEMA, OPERADORAS_SCHEMA, apply_schema
+
+if TYPE_CHECKING:
+    from .consolidator import DespesasConsolidator
+
+BACKENDS = ("pandas", "duckdb")
+
+
+def _import_duckdb() -> Any:
+    try:
+        import duckdb
+    except ImportError as e:
+        raise ImportError(
+            "O backend duckdb requer o pacote opcional duckdb (poetry install -E duckdb)"
+        ) from e
+    return duckdb
+
+
+def _quote(column: str) -> str:
+    return '"' + column.replace('"', '""') + '"'
+
+
+class DuckDBBackend:
+    name = "duckdb"
+
+    # Encodings detectados pelo CsvDialectSniffer que o leitor CSV do DuckDB entende;
+    # os demais (cp1252) e o Excel seguem pelo pandas
+    ENCODINGS = {"utf-8": "utf-8", "latin1": "latin-1"}
+    CSV_EXTENSIONS = {".csv", ".txt"}
+
+    FILTER_SQL = """
+        SELECT
+            year(data) AS Ano,
+            quarter(data) AS Trimestre,
+            reg_ans AS REG_ANS,
+            sum(valor) AS VL_SALDO_FINAL
+        FROM (
+            SELECT
+                TRY_CAST({reg_ans} AS BIGINT) AS reg_ans,
+                coalesce(
+                    TRY_CAST({data} AS TIMESTAMP), try_strptime({data}, '%d/%m/%Y')
+                ) AS data,
+                coalesce(TRY_CAST(replace({valor}, ',', '.') AS DOUBLE), 0) AS valor
+            FROM read_csv(
+                $path, delim = $sep, encoding = $encoding, header = true, all_varchar = true
+            )
+            WHERE starts_with({conta}, $conta_prefixo)
+                AND length({conta}) = $conta_digitos
+                AND upper(trim({descricao}, E' \\t\\r\\n')) = $descricao
+        )
+        WHERE data IS NOT NULL AND reg_ans IS NOT NULL
+        GROUP BY ALL
+        ORDER BY REG_ANS, Ano, Trimestre
+    """
+
+    # Mesma semântica de DespesasAggregator.join_operadoras + SortedSegmentAggregator:
+    # cadastro deduplicado por REG_ANS e depois por CNPJ (primeira ocorrência), despesa
+    # trimestral = diferença para o trimestre anterior do mesmo ano, e métricas acumuladas
+    # em ordem cronológica (soma de Kahan e variância de Welford, como no pandas)
+    AGGREGATE_SQL = """
+        WITH operadoras AS (
+            SELECT * FROM (
+                SELECT *, row_number() OVER (PARTITION BY CNPJ ORDER BY pos) AS rn_cnpj
+                FROM (
+                    SELECT
+                        REG_ANS AS RegistroANS,
+                        CNPJ,
+                        CAST(Modalidade AS VARCHAR) AS Modalidade,
+                        CAST(UF AS VARCHAR) AS UF,
+                        pos,
+                        row_number() OVER (PARTITION BY REG_ANS ORDER BY pos) AS rn_reg
+                    FROM operadoras_df
+                )
+                WHERE rn_reg = 1
+            )
+            WHERE rn_cnpj = 1
+        ),
+        despesas AS (
+            SELECT
+                c.CNPJ,
+                CAST(c.RazaoSocial AS VARCHAR) AS RazaoSocial,
+                c.Ano,
+                c.Trimestre,
+                c.pos,
+                o.RegistroANS,
+                o.Modalidade,
+                o.UF,
+                c.ValorDespesas - coalesce(
+                    lag(c.ValorDespesas) OVER (
+                        PARTITION BY c.CNPJ, c.Ano ORDER BY c.Trimestre, c.pos
+                    ),
+                    0
+                ) AS despesa
+            FROM consolidado_df c
+            JOIN operadoras o ON c.CNPJ = o.CNPJ
+        )
+        SELECT
+            CNPJ,
+            RegistroANS,
+            RazaoSocial,
+            Modalidade,
+            UF,
+            fsum(despesa ORDER BY Ano, Trimestre, pos) AS TotalDespesas,
+            fsum(despesa ORDER BY Ano, Trimestre, pos) / count(*) AS MediaTrimestral,
+            stddev_samp(despesa ORDER BY Ano, Trimestre, pos) AS DesvioPadrao,
+            count(*) AS QtdTrimestres
+        FROM despesas
+        WHERE RegistroANS IS NOT NULL
+            AND RazaoSocial IS NOT NULL
+            AND Modalidade IS NOT NULL
+            AND UF IS NOT NULL
+        GROUP BY ALL
+        ORDER BY CNPJ, RegistroANS, RazaoSocial, Modalidade, UF
+    """
+
+    def __init__(self, threads: int | None = None) -> None:
+        _import_duckdb()
+        self.threads = threads
+        self._connection: Any = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> dict[str, Any]:
+        # A conexão não atravessa processos; cada worker do pool abre a sua
+        return {"threads": self.threads}
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__init__(state["threads"])  # type: ignore[misc]
+
+    def _cursor(self) -> Any:
+        """Cursor próprio da chamada, para uso concorrente entre as threads do pipeline."""
+        with self._lock:
+            if self._connection is None:
+                config = {"threads": self.threads} if self.threads else {}
+                self._connection = _import_duckdb().connect(config=config)
+            return self._connection.cursor()
+
+    def csv_dialect(self, file_path: Path, sniffer: CsvDialectSniffer) -> CsvDialect | None:
+        """Dialeto do arquivo se o DuckDB consegue lê-lo nativamente; senão None."""
+        if file_path.suffix.lower() not in self.CSV_EXTENSIONS:
+            return None
+        dialect = sniffer.sniff(file_path)
+        if dialect is None or dialect.encoding not in self.ENCODINGS:
+            return None
+        return dialect
+
+    def sum_despesas_por_periodo(
+        self,
+        file_path: Path,
+        dialect: CsvDialect,
+        columns: dict[str, str],
+        consolidator: "DespesasConsolidator",
+    ) -> pd.DataFrame | None:
+        """Despesas filtradas e somadas por REG_ANS/Ano/Trimestre, lidas direto do CSV.
+
+        Retorna None se o DuckDB não conseguir ler o arquivo (o consolidador recorre ao
+        pandas, que reavalia o dialeto).
+        """
+        duckdb = _import_duckdb()
+        query = self.FILTER_SQL.format(
+            reg_ans=_quote(columns["REG_ANS"]),
+            data=_quote(columns["DATA"]),
+            valor=_quote(columns["VL_SALDO_FINAL"]),
+            conta=_quote(columns["CD_CONTA_CONTABIL"]),
+            descricao=_quote(columns["DESCRICAO"]),
+        )
+        params = {
+            "path": str(file_path),
+            "sep": dialect.sep,
+            "encoding": self.ENCODINGS[dialect.encoding],
+            "conta_prefixo": consolidator.CONTA_PREFIXO,
+            "conta_digitos": consolidator.CONTA_DIGITOS,
+            "descricao": consolidator.DESCRICAO_DESPESAS,
+        }
+        try:
+            return self._cursor().execute(query, params).df()
+        except duckdb.Error as e:
+            print(f"DuckDB não leu {file_path.name} ({type(e).__name__}); usando pandas")
+            return None
+
+    def aggregate(self, df_consolidate: pd.DataFrame, df_operadoras: pd.DataFrame) -> pd.DataFrame:
+        """Junção com o cadastro e métricas por operadora, antes do arredondamento."""
+        df_operadoras = apply_schema(df_operadoras, OPERADORAS_SCHEMA)
+        cursor = self._cursor()
+        # A posição da linha desempata a ordem como a ordenação estável do pandas
+        cursor.register(
+            "consolidado_df",
+            df_consolidate[["CNPJ", "RazaoSocial", "Ano", "Trimestre", "ValorDespesas"]].assign(
+                pos=np.arange(len(df_consolidate))
+            ),
+        )
+        cursor.register(
+            "operadoras_df",
+            df_operadoras[["REG_ANS", "CNPJ", "Modalidade", "UF"]].assign(
+                pos=np.arange(len(df_operadoras))
+            ),
+        )
+        df = cursor.execute(self.AGGREGATE_SQL).df()
+        return apply_schema(df, AGREGADO_SCHEMA)
+
+
+def create_backend(name: str, threads: int | None = None) -> DuckDBBackend | None:
+    """Backend pelo nome; `pandas` (None) mantém a implementação padrão."""
+    if name == "pandas":
+        return None
+    if name == "duckdb":
+        return DuckDBBackend(threads)
+    raise ValueError(f"Backend desconhecido: {name} (opções: {', '.join(BACKENDS)})")
@@ -0,0 +1,205 @@
+import hashlib
+import json
+import os
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import Any
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .constants import constant_paths
+
+
+def hash_file(file_path: Path, block_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while block := f.read(block_size):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ConsolidateCache:
+    """Cache incremental do resultado filtrado de cada arquivo trimestral.
+
+    Os artefatos Parquet são endereçados pelo SHA-256 do conteúdo do arquivo de entrada.
+    O manifesto guarda também um `context`: quando as regras de filtro mudam, todo o
+    cache é descartado. O join com o cadastro de operadoras é feito depois do cache.
+    """
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = cache_dir
+        self.artifacts_dir = cache_dir / "artifacts"
+        self.manifest_file = cache_dir / "manifest.json"
+        self._manifest: dict[str, Any] | None = None
+
+    @property
+    def manifest(self) -> dict[str, Any]:
+        if self._manifest is None:
+            self._manifest = {"context": None, "files": {}, "results": {}}
+            if self.manifest_file.exists():
+                try:
+                    self._manifest = json.loads(self.manifest_file.read_text(encoding="utf-8"))
+                except (OSError, json.JSONDecodeError):
+                    print("Manifesto do cache corrompido, recriando")
+        return self._manifest
+
+    def set_context(self, context: str) -> None:
+        if self.manifest["context"] == context:
+            return
+
+        if self.manifest["context"] is not None:
+            print("Regras de filtro mudaram, invalidando cache")
+        for entry in self.manifest["results"].values():
+            self._remove_artifact(entry.get("artifact"))
+        self._manifest = {"context": context, "files": {}, "results": {}}
+
+    def file_digest(self, file_path: Path) -> str:
+        """SHA-256 do arquivo; reaproveita o valor do manifesto se tamanho e mtime não mudaram."""
+        stat = file_path.stat()
+        entry = self.manifest["files"].get(file_path.name)
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return str(entry["sha256"])
+
+        digest = hash_file(file_path)
+        self.manifest["files"][file_path.name] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": digest,
+        }
+        return digest
+
+    def get(self, file_path: Path) -> tuple[pd.DataFrame | None, str | None] | None:
+        entry = self.manifest["results"].get(self.file_digest(file_path))
+        if entry is None:
+            return None
+
+        if entry.get("skip_reason") is not None:
+            return None, str(entry["skip_reason"])
+
+        artifact = self.artifacts_dir / entry["artifact"]
+        if not artifact.exists():
+            return None
+        return pd.read_parquet(artifact), None
+
+    def put(self, file_path: Path, df: pd.DataFrame | None, skip_reason: str | None) -> None:
+        digest = self.file_digest(file_path)
+        entry: dict[str, str | None] = {"artifact": None, "skip_reason": skip_reason}
+
+        if df is not None:
+            self.artifacts_dir.mkdir(parents=True, exist_ok=True)
+            artifact = f"{digest}.parquet"
+            tmp_file = self.artifacts_dir / f"{artifact}.tmp"
+            df.to_parquet(tmp_file, index=False)
+            os.replace(tmp_file, self.artifacts_dir / artifact)
+            entry["artifact"] = artifact
+
+        self.manifest["results"][digest] = entry
+
+    def prune(self, data_files: list[Path]) -> None:
+        """Remove do manifesto arquivos que não existem mais e artefatos sem referência."""
+        names = {data_file.name for data_file in data_files}
+        files = self.manifest["files"]
+        for name in [name for name in files if name not in names]:
+            del files[name]
+
+        digests = {entry["sha256"] for entry in files.values()}
+        results = self.manifest["results"]
+        for digest in [digest for digest in results if digest not in digests]:
+            self._remove_artifact(results.pop(digest).get("artifact"))
+
+    def save(self) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.manifest_file.with_suffix(".tmp")
+        tmp_file.write_text(json.dumps(self.manifest, indent=2), encoding="utf-8")
+        os.replace(tmp_file, self.manifest_file)
+
+    def _remove_artifact(self, artifact: str | None) -> None:
+        if artifact:
+            (self.artifacts_dir / artifact).unlink(missing_ok=True)
+
+
+class ExcelConversionCache:
+    """Planilhas convertidas uma única vez para Parquet, endereçadas pelo SHA-256 do conteúdo.
+
+    A conversão acontece durante a primeira leitura em streaming da planilha: cada bloco
+    de linhas é gravado no Parquet à medida que é lido, e o arquivo só é publicado se a
+    leitura chegar ao fim. As células ficam como texto, na forma em que o leitor do pandas
+    as interpreta. Leituras seguintes do mesmo conteúdo vão direto ao Parquet.
+    """
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = cache_dir
+        # (caminho, tamanho, mtime) -> SHA-256, para não recalcular o hash na mesma execução
+        self._digests: dict[tuple[str, int, int], str] = {}
+
+    def _digest(self, file_path: Path) -> str:
+        stat = file_path.stat()
+        key = (str(file_path.resolve()), stat.st_size, stat.st_mtime_ns)
+        if key not in self._digests:
+            self._digests[key] = hash_file(file_path)
+        return self._digests[key]
+
+    def path_for(self, file_path: Path) -> Path:
+        return self.cache_dir / f"{file_path.name}.{self._digest(file_path)}.parquet"
+
+    def get(self, file_path: Path) -> Path | None:
+        """Parquet convertido da planilha, se o conteúdo atual já foi convertido."""
+        converted = self.path_for(file_path)
+        return converted if converted.exists() else None
+
+    def read_columns(self, converted: Path) -> list[str]:
+        return list(pq.read_schema(converted).names)
+
+    def iter_chunks(
+        self, converted: Path, chunksize: int, columns: list[str] | None = None
+    ) -> Iterator[pd.DataFrame]:
+        parquet_file = pq.ParquetFile(converted)
+        names = parquet_file.schema_arrow.names if columns is None else columns
+        batches = parquet_file.iter_batches(batch_size=chunksize, columns=columns)
+        empty = True
+        for batch in batches:
+            empty = False
+            yield batch.to_pandas()
+        if empty:
+            yield pd.DataFrame(columns=names, dtype="str")
+
+    def convert(self, file_path: Path, chunks: Iterable[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+        """Repassa os blocos da planilha gravando-os no Parquet do cache."""
+        target = self.path_for(file_path)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # Sufixo por processo: workers do pool podem converter planilhas ao mesmo tempo
+        tmp_file = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+        writer: pq.ParquetWriter | None = None
+        try:
+            for chunk in chunks:
+                schema = pa.schema([(str(col), pa.string()) for col in chunk.columns])
+                table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp_file, schema)
+                writer.write_table(table)
+                yield chunk
+            if writer is not None:
+                writer.close()
+                writer = None
+                os.replace(tmp_file, target)
+                self._remove_stale(file_path, target)
+        finally:
+            if writer is not None:
+                writer.close()
+            tmp_file.unlink(missing_ok=True)
+
+    def _remove_stale(self, file_path: Path, current: Path) -> None:
+        """Remove conversões de versões anteriores da mesma planilha."""
+        prefix = f"{file_path.name}."
+        for converted in self.cache_dir.iterdir():
+            if (
+                converted.name.startswith(prefix)
+                and converted.suffix == ".parquet"
+                and converted != current
+            ):
+                converted.unlink(missing_ok=True)
+
+
+excel_conversion_cache = ExcelConversionCache(constant_paths.cache_dir / "excel")
@@ -1,43 +1,83 @@
-import io
+import os
 import re
+from collections.abc import Iterator
 from pathlib import Path
+from typing import Any
 
+import openpyxl
 import pandas as pd
-import requests
+import pyarrow as pa
 
+from .cache import ExcelConversionCache, excel_conversion_cache
 from .constants import constant_paths
-from .libs import ZipHandler
+from .downloader import Downloader, DownloadMirror
+from .instrumentation import instrumentation
+from .libs import CsvDialect, CsvDialectSniffer, ZipHandler, csv_dialect_sniffer
 
 
 class LocalStorageClient:
     SUPPORTED_EXTENSIONS = {".csv", ".txt", ".xlsx", ".xls"}
+    EXCEL_EXTENSIONS = {".xlsx", ".xls"}
+    # Linhas por bloco na leitura em streaming das planilhas
+    EXCEL_CHUNK_ROWS = 50_000
 
-    def __init__(self, zip_handler: ZipHandler):
+    def __init__(
+        self,
+        zip_handler: ZipHandler,
+        csv_sniffer: CsvDialectSniffer = csv_dialect_sniffer,
+        excel_cache: ExcelConversionCache | None = excel_conversion_cache,
+    ):
         self.zip_handler = zip_handler
-
-    def save_files(self, files_bytes: dict[str, io.BytesIO], output_dir: Path) -> None:
-        output_dir.mkdir(parents=True, exist_ok=True)
-        for name, bytes in files_bytes.items():
-            path = output_dir / name
-            bytes.seek(0)
-            with open(path, "wb") as f:
-                f.write(bytes.read())
+        self.csv_sniffer = csv_sniffer
+        self.excel_cache = excel_cache
 
     def save_csv_from_df(self, df: pd.DataFrame, output_dir: Path, file_name: str) -> None:
         output_dir.mkdir(parents=True, exist_ok=True)
-        df.to_csv(
-            output_dir / file_name,
-            sep=";",
-            decimal=",",
-            encoding="utf-8",
-            index=False,
-        )
+        with instrumentation.stage("export", file_name) as record:
+            record.rows_in = len(df)
+            df.to_csv(
+                output_dir / file_name,
+                sep=";",
+                decimal=",",
+                encoding="utf-8",
+                index=False,
+            )
+            record.bytes_written = (output_dir / file_name).stat().st_size
+
+    def save_arrow_from_df(self, df: pd.DataFrame, output_dir: Path, file_name: str) -> None:
+        """Grava o DataFrame em Arrow IPC sem compressão, legível via memory map."""
+        output_dir.mkdir(parents=True, exist_ok=True)
+        with instrumentation.stage("export", file_name) as record:
+            record.rows_in = len(df)
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            tmp_path = output_dir / f"{file_name}.tmp"
+            with (
+                pa.OSFile(str(tmp_path), "wb") as sink,
+                pa.ipc.new_file(sink, table.schema) as writer,
+            ):
+                writer.write_table(table)
+            os.replace(tmp_path, output_dir / file_name)
+            record.bytes_written = (output_dir / file_name).stat().st_size
+
+    def read_arrow(self, file_path: Path) -> pd.DataFrame:
+        print(f"Lendo arquivo {file_path.name} (formato: arrow)")
+        with instrumentation.stage("read", file_path) as record:
+            record.bytes_read = file_path.stat().st_size
+            with pa.memory_map(str(file_path), "r") as source:
+                table = pa.ipc.open_file(source).read_all()
+            df = table.to_pandas()
+            record.rows_out = len(df)
+        print(f"{len(df)} linhas")
+        return df
 
     def save_zip_csv_from_df(
         self, df: pd.DataFrame, output_dir: Path, zip_name: str, csv_name: str
     ) -> None:
         output_dir.mkdir(parents=True, exist_ok=True)
-        self.zip_handler.export_df_to_zip(df, output_dir, zip_name, csv_name)
+        with instrumentation.stage("export", zip_name) as record:
+            record.rows_in = len(df)
+            self.zip_handler.export_df_to_zip(df, output_dir, zip_name, csv_name)
+            record.bytes_written = (output_dir / zip_name).stat().st_size
 
     def read(self, file_path: Path) -> pd.DataFrame:
         """Lê arquivo detectando formato automaticamente pela extensão."""
@@ -48,21 +88,187 @@ class LocalStorageClient:
 
         print(f"Lendo arquivo {file_path.name} (formato: {extension})")
 
-        if extension in {".xlsx", ".xls"}:
-            return self._read_excel(file_path)
-        return self._read_csv(file_path)
+        with instrumentation.stage("read", file_path) as record:
+            record.bytes_read = file_path.stat().st_size
+            if extension in self.EXCEL_EXTENSIONS:
+                df = self._read_excel(file_path)
+            else:
+                df = self._read_csv(file_path)
+            record.rows_out = len(df)
+        return df
+
+    def read_columns(self, file_path: Path) -> list[str]:
+        """Lê apenas o cabeçalho do arquivo."""
+        extension = file_path.suffix.lower()
+
+        if extension not in self.SUPPORTED_EXTENSIONS:
+            raise ValueError(f"Formato não suportado: {extension}")
+
+        if extension in self.EXCEL_EXTENSIONS:
+            if self.excel_cache is not None:
+                converted = self.excel_cache.get(file_path)
+                if converted is not None:
+                    return self.excel_cache.read_columns(converted)
+            workbook = openpyxl.load_workbook(file_path, read_only=True)
+            try:
+                header = next(workbook.active.iter_rows(max_row=1, values_only=True), ())
+            finally:
+                workbook.close()
+            return self._excel_header(header)
+
+        dialect = self.csv_sniffer.sniff(file_path)
+        if dialect is None:
+            return [str(col) for col in self._read_csv_probing(file_path).columns]
+
+        df = pd.read_csv(file_path, sep=dialect.sep, encoding=dialect.encoding, nrows=0)
+        return [str(col) for col in df.columns]
+
+    def read_chunks(
+        self,
+        file_path: Path,
+        usecols: list[str],
+        dtype: dict[str, str],
+        chunksize: int,
+    ) -> Iterator[pd.DataFrame]:
+        """Lê o arquivo em blocos de `chunksize` linhas, apenas com as colunas pedidas."""
+        extension = file_path.suffix.lower()
+
+        if extension not in self.SUPPORTED_EXTENSIONS:
+            raise ValueError(f"Formato não suportado: {extension}")
+
+        print(f"Lendo arquivo {file_path.name} em blocos de {chunksize} linhas")
+
+        if extension in self.EXCEL_EXTENSIONS:
+            for chunk in self._excel_text_chunks(file_path, chunksize, usecols):
+                yield chunk[usecols].astype(dtype)
+            return
+
+        dialect = self.csv_sniffer.sniff(file_path)
+        if dialect is None:
+            yield self._read_csv_probing(file_path)[usecols].astype(dtype)
+            return
+
+        with pd.read_csv(
+            file_path,
+            sep=dialect.sep,
+            encoding=dialect.encoding,
+            decimal=dialect.decimal,
+            usecols=usecols,
+            dtype=dtype,
+            chunksize=chunksize,
+        ) as reader:
+            yield from reader
+
+    @staticmethod
+    def _excel_header(header: tuple[Any, ...]) -> list[str]:
+        # Colunas sem nome recebem o mesmo rótulo que o pandas dá a elas
+        return [f"Unnamed: {i}" if col is None else str(col) for i, col in enumerate(header)]
+
+    @staticmethod
+    def _excel_cell_text(value: Any) -> str | None:
+        """Texto da célula como o leitor openpyxl do pandas a interpreta."""
+        if value is None or value == "":
+            return None
+        # Números inteiros gravados como float voltam a ser inteiros
+        if isinstance(value, float) and value.is_integer():
+            return str(int(value))
+        return str(value)
+
+    def iter_excel_chunks(self, file_path: Path, chunksize: int) -> Iterator[pd.DataFrame]:
+        """Lê a primeira planilha em streaming (openpyxl read_only), em blocos de linhas.
+
+        As células vêm como texto, como as colunas de um CSV lido com `dtype=str`; linhas
+        totalmente vazias são ignoradas. O pico de memória é o de um bloco, não o da
+        planilha inteira.
+        """
+        workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            columns = self._excel_header(next(rows, ()))
+            width = len(columns)
+            cell_text = self._excel_cell_text
+            chunk: list[list[str | None]] = []
+            emitted = False
+            for row in rows:
+                values = [cell_text(value) for value in row[:width]]
+                if not any(value is not None for value in values):
+                    continue
+                values.extend([None] * (width - len(values)))
+                chunk.append(values)
+                if len(chunk) >= chunksize:
+                    yield pd.DataFrame(chunk, columns=columns, dtype="str")
+                    chunk = []
+                    emitted = True
+            if chunk or not emitted:
+                yield pd.DataFrame(chunk, columns=columns, dtype="str")
+        finally:
+            workbook.close()
+
+    def _excel_text_chunks(
+        self, file_path: Path, chunksize: int, columns: list[str] | None = None
+    ) -> Iterator[pd.DataFrame]:
+        """Blocos da planilha como texto, do Parquet convertido se ele existir.
+
+        Sem conversão em cache, a planilha é lida em streaming e convertida no caminho.
+        """
+        if self.excel_cache is None:
+            yield from self.iter_excel_chunks(file_path, chunksize)
+            return
+
+        converted = self.excel_cache.get(file_path)
+        if converted is not None:
+            print(f"Planilha {file_path.name} lida da conversão em cache")
+            yield from self.excel_cache.iter_chunks(converted, chunksize, columns)
+            return
+
+        print(f"Convertendo {file_path.name} para Parquet (cache)")
+        yield from self.excel_cache.convert(file_path, self.iter_excel_chunks(file_path, chunksize))
+
+    @staticmethod
+    def _infer_excel_types(df: pd.DataFrame) -> pd.DataFrame:
+        """Colunas cujos valores são todos numéricos viram números, como no read_csv."""
+        for column in df.columns:
+            values = df[column]
+            numbers = pd.to_numeric(values, errors="coerce")
+            if numbers.notna().sum() == values.notna().sum():
+                df[column] = numbers
+        return df
 
     def _read_excel(self, file_path: Path) -> pd.DataFrame:
-        df = pd.read_excel(file_path, engine="openpyxl")
+        frames = list(self._excel_text_chunks(file_path, self.EXCEL_CHUNK_ROWS))
+        df = self._infer_excel_types(pd.concat(frames, ignore_index=True))
         print(f"{len(df)} linhas")
         return df
 
     def _read_csv(self, file_path: Path) -> pd.DataFrame:
-        encodings = ["utf-8", "latin1", "cp1252"]
-        separators = [";", ",", "\t", "|"]
+        """Lê o CSV em uma única passada usando o dialeto detectado na amostra."""
+        dialect = self.csv_sniffer.sniff(file_path)
+        if dialect is not None:
+            try:
+                df = pd.read_csv(
+                    file_path,
+                    sep=dialect.sep,
+                    encoding=dialect.encoding,
+                    decimal=dialect.decimal,
+                    low_memory=False,
+                )
+                if len(df.columns) > 1:
+                    print(
+                        f"encoding={dialect.encoding}, sep='{dialect.sep}', "
+                        f"decimal='{dialect.decimal}', {len(df)} linhas"
+                    )
+                    return df
+            except (UnicodeDecodeError, pd.errors.ParserError):
+                pass
+
+            # A amostra não representava o arquivo inteiro
+            self.csv_sniffer.invalidate(file_path)
+
+        return self._read_csv_probing(file_path)
 
-        for encoding in encodings:
-            for sep in separators:
+    def _read_csv_probing(self, file_path: Path) -> pd.DataFrame:
+        for encoding in self.csv_sniffer.ENCODINGS:
+            for sep in self.csv_sniffer.SEPARATORS:
                 try:
                     df = pd.read_csv(
                         file_path,
@@ -73,35 +279,78 @@ class LocalStorageClient:
                     )
                     if len(df.columns) > 1:
                         print(f"encoding={encoding}, sep='{sep}', {len(df)} linhas")
+                        self.csv_sniffer.remember(file_path, CsvDialect(encoding, sep, ","))
                         return df
                 except (UnicodeDecodeError, pd.errors.ParserError):
                     continue
 
         raise ValueError(f"Não foi possível ler o arquivo: {file_path}")
 
+    def read_csv_from_zip(self, zip_path: Path, member: str) -> pd.DataFrame:
+        """Lê um CSV direto do stream descompactado do zip, sem extração temporária."""
+        print(f"Lendo {member} de {zip_path.name}")
+        with self.zip_handler.open_member(zip_path, member) as stream:
+            sample = stream.read(self.csv_sniffer.SAMPLE_SIZE)
+            truncated = bool(stream.read(1))
+
+        dialect = self.csv_sniffer.sniff_bytes(sample, truncated)
+        if dialect is None:
+            raise ValueError(f"Não foi possível ler o arquivo: {zip_path.name}/{member}")
+
+        with (
+            instrumentation.stage("read", zip_path) as record,
+            self.zip_handler.open_member(zip_path, member) as stream,
+        ):
+            record.bytes_read = zip_path.stat().st_size
+            df = pd.read_csv(
+                stream,
+                sep=dialect.sep,
+                encoding=dialect.encoding,
+                decimal=dialect.decimal,
+                low_memory=False,
+            )
+            record.rows_out = len(df)
+        print(f"encoding={dialect.encoding}, sep='{dialect.sep}', {len(df)} linhas")
+        return df
+
     def extract_despesas_consolidate_df(self) -> pd.DataFrame:
-        self.zip_handler.extract_local_file(
-            constant_paths.output_dir / "consolidado_despesas.zip",
-            constant_paths.data_dir / "consolidado",
-        )
-        df = self.read(
-            constant_paths.data_dir / "consolidado" / "consolidado_despesas.csv",
+        return self.read_csv_from_zip(
+            constant_paths.output_dir / "consolidado_despesas.zip", "consolidado_despesas.csv"
         )
-        return df
+
+    def load_despesas_consolidate_df(self) -> pd.DataFrame:
+        """Lê o consolidado intermediário (Arrow); o zip só é usado se ele não existir."""
+        arrow_path = constant_paths.consolidado_dir / "consolidado_despesas.arrow"
+        if arrow_path.exists():
+            return self.read_arrow(arrow_path)
+
+        print(f"{arrow_path.name} não encontrado, lendo consolidado_despesas.zip")
+        return self.extract_despesas_consolidate_df()
 
 
 class ANSApiClient:
     BASE_URL = "https://dadosabertos.ans.gov.br/FTP/PDA/"
-    DEMO_CONTABEIS_URL = BASE_URL + "demonstracoes_contabeis/"
-    OPERADORAS_ATIVAS_URL = "https://dadosabertos.ans.gov.br/FTP/PDA/operadoras_de_plano_de_saude_ativas/Relatorio_cadop.csv"
+    DEMO_CONTABEIS_PATH = "demonstracoes_contabeis/"
+    OPERADORAS_ATIVAS_PATH = "operadoras_de_plano_de_saude_ativas/Relatorio_cadop.csv"
+    DEMO_CONTABEIS_URL = BASE_URL + DEMO_CONTABEIS_PATH
+    OPERADORAS_ATIVAS_URL = BASE_URL + OPERADORAS_ATIVAS_PATH
 
     def __init__(
         self,
         zip_handler: ZipHandler,
         local_storage_client: LocalStorageClient,
+        downloader: Downloader | None = None,
+        base_url: str = BASE_URL,
+        mirror: DownloadMirror | None = None,
     ):
         self.zip_handler = zip_handler
         self.local_storage_client = local_storage_client
+        self.downloader = downloader or Downloader()
+        self.mirror = mirror or DownloadMirror(
+            self.downloader, constant_paths.cache_dir / "mirror.json"
+        )
+        self.demo_contabeis_url = base_url + self.DEMO_CONTABEIS_PATH
+        self.operadoras_ativas_url = base_url + self.OPERADORAS_ATIVAS_PATH
 
     def _find_directories_and_files(self, html_string: str) -> dict[str, list[str]]:
         items: dict[str, list[str]] = {"directories": [], "files": []}
@@ -120,53 +369,62 @@ class ANSApiClient:
 
         return items
 
-    def _fetch_zip_file(self, url: str) -> io.BytesIO | None:
-        try:
-            response = requests.get(url, timeout=30)
-            zip_bytes = io.BytesIO(response.content)
-            return zip_bytes
-        except requests.HTTPError as e:
-            print("Error fetching zip file: ", str(e))
-            return None
-
-    def download_demo_contabeis(self, limit: int = 3) -> None:
-        print("Buscando demonstrações contábeis")
-        response = requests.get(self.DEMO_CONTABEIS_URL, timeout=30)
-        response.raise_for_status()
-        items = self._find_directories_and_files(response.text)
+    def _list_demo_contabeis(self, limit: int) -> list[tuple[str, str]]:
+        """Lista (ano, arquivo) dos `limit` zips mais recentes."""
+        items = self.mirror.get_listing(self.demo_contabeis_url, self._find_directories_and_files)
         years = items.get("directories") or []
         if not years:
-            raise RuntimeError(f"No directories found in {self.DEMO_CONTABEIS_URL}")
+            raise RuntimeError(f"No directories found in {self.demo_contabeis_url}")
 
-        downloads = 0
+        selected: list[tuple[str, str]] = []
         for year in reversed(years):
-            if downloads >= limit:
+            if len(selected) >= limit:
                 break
 
-            year_url = f"{self.DEMO_CONTABEIS_URL}{year}/"
-            year_response = requests.get(year_url, timeout=30)
-            year_response.raise_for_status()
-
-            year_items = self._find_directories_and_files(year_response.text)
-            files = year_items.get("files") or []
-
+            year = year.rstrip("/")
+            year_items = self.mirror.get_listing(
+                f"{self.demo_contabeis_url}{year}/", self._find_directories_and_files
+            )
+            files = [file for file in year_items.get("files") or [] if file.endswith(".zip")]
             for file in reversed(files):
-                if downloads >= limit:
+                if len(selected) >= limit:
                     break
+                selected.append((year, file))
 
-                url = f"{year_url}{file}"
-                zip_bytes = self._fetch_zip_file(url)
-                if not zip_bytes:
-                    break
+        return selected
 
-                files_map = self.zip_handler.extract_files_from_zip_bytes(zip_bytes)
-                if files_map:
-                    self.local_storage_client.save_files(files_map, constant_paths.trimestres_dir)
-                    downloads += 1
+    def download_demo_contabeis(self, limit: int = 3) -> None:
+        print("Buscando demonstrações contábeis")
+        selected = self._list_demo_contabeis(limit)
+        jobs = [
+            (
+                f"{self.demo_contabeis_url}{year}/{file}",
+                constant_paths.downloads_dir / "demonstracoes_contabeis" / year / file,
+            )
+            for year, file in selected
+        ]
+
+        for result in self.mirror.fetch_many(jobs):
+            if result is None:
+                continue
+            members = self.zip_handler.list_members(result.path)
+            extracted = all((constant_paths.trimestres_dir / name).exists() for name in members)
+            if not result.modified and extracted:
+                continue
+            self.zip_handler.extract_local_file(result.path, constant_paths.trimestres_dir)
+        self.mirror.save()
 
     def download_operadoras_ativas(self) -> None:
         print("Buscando operadoras ativas...")
-        df = pd.read_csv(self.OPERADORAS_ATIVAS_URL, sep=";", encoding="utf-8", decimal=",")
+        result = self.mirror.fetch(
+            self.operadoras_ativas_url, constant_paths.downloads_dir / "Relatorio_cadop.csv"
+        )
+        self.mirror.save()
+        if not result.modified and (constant_paths.operadoras_dir / "operadoras.csv").exists():
+            print("Cadastro de operadoras sem alterações")
+            return
+
+        df = pd.read_csv(result.path, sep=";", encoding="utf-8", decimal=",")
         df = df[
             ["REGISTRO_OPERADORA", "CNPJ", "Razao_Social", "Modalidade", "UF", "Data_Registro_ANS"]
         ]
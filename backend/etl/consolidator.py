@@ -1,10 +1,21 @@
+import hashlib
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 import pandas as pd
 
+from .backends import DuckDBBackend
+from .cache import ConsolidateCache
 from .clients import LocalStorageClient
 from .constants import constant_paths
+from .instrumentation import StageRecord, instrumentation
 from .libs import ColumnNormalizer
+from .schema import CONSOLIDADO_SCHEMA, DESPESAS_SCHEMA, OPERADORAS_SCHEMA, apply_schema
+
+# Resultado do processamento de um arquivo: (despesas filtradas, motivo do descarte)
+FileResult = tuple[pd.DataFrame | None, str | None]
 
 
 class DespesasConsolidator:
@@ -17,18 +28,41 @@ class DespesasConsolidator:
         "VL_SALDO_FINAL",
     ]
 
+    # Regras do filtro de despesas com eventos/sinistros
+    CONTA_PREFIXO = "4"
+    CONTA_DIGITOS = 9
+    DESCRICAO_DESPESAS = "DESPESAS COM EVENTOS / SINISTROS"
+    # Incrementar quando a lógica de filtro/join mudar, para invalidar o cache de resultados
+    FILTER_VERSION = 3
+
+    # Colunas efetivamente usadas pelo filtro; o modo em blocos lê apenas estas
+    STREAM_COLUMNS = ["DATA", "REG_ANS", "CD_CONTA_CONTABIL", "DESCRICAO", "VL_SALDO_FINAL"]
+    STREAM_DTYPES = {
+        "DATA": "str",
+        "REG_ANS": "str",
+        "CD_CONTA_CONTABIL": "str",
+        "DESCRICAO": "category",
+        "VL_SALDO_FINAL": "str",
+    }
+
     def __init__(
-        self, local_storage_client: LocalStorageClient, column_normalizer: ColumnNormalizer
+        self,
+        local_storage_client: LocalStorageClient,
+        column_normalizer: ColumnNormalizer,
+        chunksize: int | None = None,
+        max_workers: int = 1,
+        result_cache: ConsolidateCache | None = None,
+        backend: DuckDBBackend | None = None,
     ):
         self.local_storage_client = local_storage_client
         self.column_normalizer = column_normalizer
+        self.chunksize = chunksize
+        self.max_workers = max_workers
+        self.result_cache = result_cache
+        # None: filtro em pandas; com backend, os CSVs que ele lê nativamente passam por ele
+        self.backend = backend
 
-    def load_despesas_df(self, file_path: Path) -> pd.DataFrame:
-        df = self.local_storage_client.read(file_path)
-        missing = self.column_normalizer.validate_required_columns(df, self.REQUIRED_COLUMNS)
-        if missing:
-            raise ValueError(f"Colunas obrigatórias ausentes: {missing}")
-
+    def _prepare_despesas(self, df: pd.DataFrame) -> pd.DataFrame:
         df["CD_CONTA_CONTABIL"] = df["CD_CONTA_CONTABIL"].astype(str)
         df["VL_SALDO_FINAL"] = df["VL_SALDO_FINAL"].astype(str).str.replace(",", ".", regex=False)
         df["VL_SALDO_FINAL"] = pd.to_numeric(df["VL_SALDO_FINAL"], errors="coerce").fillna(0)
@@ -36,48 +70,161 @@ class DespesasConsolidator:
         df = df.dropna(subset=["DATA"])
         return df
 
+    def load_despesas_df(self, file_path: Path) -> pd.DataFrame:
+        df = self.local_storage_client.read(file_path)
+        df = self.column_normalizer.normalize_column_names(df)
+        missing = self.column_normalizer.validate_required_columns(df, self.REQUIRED_COLUMNS)
+        if missing:
+            raise ValueError(f"Colunas obrigatórias ausentes: {missing}")
+
+        return self._prepare_despesas(df)
+
+    def resolve_columns(self, file_path: Path) -> dict[str, str]:
+        """Nome de cada coluna obrigatória no arquivo, lendo apenas o cabeçalho."""
+        columns = self.local_storage_client.read_columns(file_path)
+        resolved = {col: col for col in columns if col in self.REQUIRED_COLUMNS}
+        resolved.update(self.column_normalizer.resolve_column_names(columns))
+        missing = [col for col in self.REQUIRED_COLUMNS if col not in resolved]
+        if missing:
+            raise ValueError(f"Colunas obrigatórias ausentes: {missing}")
+        return resolved
+
+    def load_filtered_despesas_chunked(self, file_path: Path) -> pd.DataFrame:
+        """Lê o arquivo em blocos aplicando filtro e somas parciais por bloco.
+
+        O pico de memória fica limitado pelo tamanho do bloco e não pelo tamanho do arquivo.
+        """
+        chunksize = self.chunksize or 100_000
+        resolved = self.resolve_columns(file_path)
+        usecols = [resolved[col] for col in self.STREAM_COLUMNS]
+        dtype = {resolved[col]: self.STREAM_DTYPES[col] for col in self.STREAM_COLUMNS}
+        rename_map = {resolved[col]: col for col in self.STREAM_COLUMNS}
+
+        # Leitura e filtro se intercalam bloco a bloco, então são medidos como uma etapa só
+        with instrumentation.stage("read_filter", file_path) as record:
+            record.bytes_read = file_path.stat().st_size
+            partials: list[pd.DataFrame] = []
+            rows_read = 0
+            chunks = self.local_storage_client.read_chunks(file_path, usecols, dtype, chunksize)
+            for chunk in chunks:
+                rows_read += len(chunk)
+                chunk = chunk.rename(columns=rename_map)
+                chunk["CD_CONTA_CONTABIL"] = chunk["CD_CONTA_CONTABIL"].astype(str)
+                chunk = self._select_contas(chunk)
+                if chunk.empty:
+                    continue
+                chunk = self._prepare_despesas(chunk)
+                partials.append(self._sum_por_periodo(self._add_periodo(chunk)))
+
+            print(f"{rows_read} linhas lidas em blocos")
+            if not partials:
+                df_despesas = pd.DataFrame(
+                    columns=["REG_ANS", "Ano", "Trimestre", "VL_SALDO_FINAL"]
+                )
+            else:
+                df_despesas = self._sum_por_periodo(pd.concat(partials, ignore_index=True))
+
+            df_despesas = self._finalize_despesas(df_despesas)
+            record.rows_in = rows_read
+            record.rows_out = len(df_despesas)
+        print(f"linhas finais: {len(df_despesas)}")
+        return df_despesas
+
     def load_operadoras_df(self) -> pd.DataFrame:
         df = self.local_storage_client.read(constant_paths.operadoras_dir / "operadoras.csv")
-        df["CNPJ"] = df["CNPJ"].astype(str).str.zfill(14)
+        return apply_schema(df, OPERADORAS_SCHEMA)
+
+    def _select_contas(self, df: pd.DataFrame) -> pd.DataFrame:
+        descricao = df["DESCRICAO"].astype(str).str.strip().str.upper()
+        return df[
+            (df["CD_CONTA_CONTABIL"].str.startswith(self.CONTA_PREFIXO))
+            & (descricao == self.DESCRICAO_DESPESAS)
+            & (df["CD_CONTA_CONTABIL"].str.len() == self.CONTA_DIGITOS)
+        ].copy()
+
+    def _add_periodo(self, df: pd.DataFrame) -> pd.DataFrame:
+        df["Ano"] = df["DATA"].dt.year
+        df["Trimestre"] = df["DATA"].dt.quarter
+        return df
+
+    def _sum_por_periodo(self, df: pd.DataFrame) -> pd.DataFrame:
+        return df.groupby(["REG_ANS", "Ano", "Trimestre"])["VL_SALDO_FINAL"].sum().reset_index()
+
+    def _finalize_despesas(self, df: pd.DataFrame) -> pd.DataFrame:
+        df = apply_schema(df[["Ano", "Trimestre", "REG_ANS", "VL_SALDO_FINAL"]], DESPESAS_SCHEMA)
+        df["VL_SALDO_FINAL"] = df["VL_SALDO_FINAL"].round(2)
         return df
 
     def filter_despesas(self, df: pd.DataFrame) -> pd.DataFrame:
         print("Filtrando por despesas de evento/sinistro...")
-        df["DESCRICAO"] = df["DESCRICAO"].str.strip().str.upper()
-        df_despesas = df[
-            (df["CD_CONTA_CONTABIL"].str.startswith("4"))
-            & (df["DESCRICAO"] == "DESPESAS COM EVENTOS / SINISTROS")
-            & (df["CD_CONTA_CONTABIL"].str.len() == 9)
-        ].copy()
-
-        df_despesas["Ano"] = df_despesas["DATA"].dt.year
-        df_despesas["Trimestre"] = df_despesas["DATA"].dt.quarter
-        df_despesas = (
-            df_despesas.groupby(["REG_ANS", "Ano", "Trimestre"])["VL_SALDO_FINAL"]
-            .sum()
-            .reset_index()
-        )
-        df_despesas = df_despesas[["Ano", "Trimestre", "REG_ANS", "VL_SALDO_FINAL"]]
-        df_despesas[["VL_SALDO_FINAL"]] = df_despesas[["VL_SALDO_FINAL"]].round(2)
+        df_despesas = self._add_periodo(self._select_contas(df))
+        df_despesas = self._finalize_despesas(self._sum_por_periodo(df_despesas))
         print(f"linhas finais: {len(df_despesas)}")
         return df_despesas
 
+    def load_filtered_despesas_backend(
+        self, file_path: Path, backend: DuckDBBackend
+    ) -> pd.DataFrame | None:
+        """Leitura, filtro e soma por período em uma consulta do backend.
+
+        Retorna None quando o backend não lê o arquivo (Excel, encoding não suportado).
+        """
+        dialect = backend.csv_dialect(file_path, self.local_storage_client.csv_sniffer)
+        if dialect is None:
+            return None
+        resolved = self.resolve_columns(file_path)
+
+        with instrumentation.stage("read_filter", file_path) as record:
+            record.bytes_read = file_path.stat().st_size
+            df_despesas = backend.sum_despesas_por_periodo(file_path, dialect, resolved, self)
+            if df_despesas is None:
+                return None
+            df_despesas = self._finalize_despesas(df_despesas)
+            record.rows_out = len(df_despesas)
+        print(f"{file_path.name} ({backend.name}): linhas finais: {len(df_despesas)}")
+        return df_despesas
+
+    def load_filtered_despesas(self, file_path: Path) -> pd.DataFrame:
+        if self.backend is not None:
+            df_despesas = self.load_filtered_despesas_backend(file_path, self.backend)
+            if df_despesas is not None:
+                return df_despesas
+
+        if self.chunksize:
+            return self.load_filtered_despesas_chunked(file_path)
+
+        df = self.load_despesas_df(file_path)
+        with instrumentation.stage("filter", file_path) as record:
+            record.rows_in = len(df)
+            df_despesas = self.filter_despesas(df)
+            record.rows_out = len(df_despesas)
+        return df_despesas
+
     def join_operadoras(
         self, df_despesas: pd.DataFrame, df_operadoras: pd.DataFrame
     ) -> pd.DataFrame:
-        """Enriquece despesas com dados cadastrais das operadoras."""
+        """Enriquece despesas com dados cadastrais das operadoras.
 
+        A junção é feita sobre códigos inteiros de REG_ANS (ver `etl.schema`).
+        """
         df_final = df_despesas.merge(
             df_operadoras,
             on="REG_ANS",
             how="left",
+            indicator=True,
         )
-        sem_cadastro = df_final["CNPJ"].isna() | (df_final["CNPJ"] == "")
+        sem_cadastro = df_final["_merge"] == "left_only"
+        # Cadastro encontrado, mas com CNPJ malformado (sem código inteiro)
+        cnpj_invalido = ~sem_cadastro & df_final["CNPJ"].isna()
         qtd_sem_cadastro = sem_cadastro.sum()
+        qtd_cnpj_invalido = cnpj_invalido.sum()
 
         if qtd_sem_cadastro > 0:
-            df_final = df_final[~sem_cadastro]
             print(f"{qtd_sem_cadastro} registros removidos (REG_ANS sem cadastro ativo)")
+        if qtd_cnpj_invalido > 0:
+            print(f"{qtd_cnpj_invalido} registros removidos (CNPJ malformado no cadastro)")
+        if qtd_sem_cadastro > 0 or qtd_cnpj_invalido > 0:
+            df_final = df_final[~(sem_cadastro | cnpj_invalido)]
 
         keep_cols = ["CNPJ", "Razao_Social", "Trimestre", "Ano", "VL_SALDO_FINAL"]
         rename_map = {
@@ -86,9 +233,69 @@ class DespesasConsolidator:
         }
         df_final = df_final[keep_cols]
         df_final = df_final.rename(columns=rename_map)
-        return df_final
+        return apply_schema(df_final, CONSOLIDADO_SCHEMA)
+
+    def process_file(self, data_file: Path) -> FileResult:
+        """Carrega e filtra um arquivo. Retorna (despesas por período, motivo do descarte)."""
+        try:
+            return self.load_filtered_despesas(data_file), None
+        except ValueError as e:
+            return None, str(e)
+
+    def _process_files(self, data_files: list[Path]) -> list[FileResult]:
+        if self.max_workers <= 1 or len(data_files) <= 1:
+            return [self.process_file(data_file) for data_file in data_files]
+
+        workers = min(self.max_workers, len(data_files))
+        print(f"Processando em paralelo com {workers} processos")
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=_pool_context(),
+            initializer=_init_worker,
+            initargs=(self,),
+        ) as executor:
+            # map preserva a ordem de entrada, então o resultado é determinístico
+            outputs = list(executor.map(_process_file_in_worker, data_files))
+
+        # Os registros de medição dos workers são reunidos no processo principal
+        for _, records in outputs:
+            instrumentation.extend(records)
+        return [result for result, _ in outputs]
+
+    def cache_context(self) -> str:
+        """Identifica as regras de filtro usadas nos resultados em cache."""
+        rules = {
+            "filter_version": self.FILTER_VERSION,
+            "required_columns": self.REQUIRED_COLUMNS,
+            "conta_prefixo": self.CONTA_PREFIXO,
+            "conta_digitos": self.CONTA_DIGITOS,
+            "descricao": self.DESCRICAO_DESPESAS,
+        }
+        return hashlib.sha256(json.dumps(rules, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _process_files_cached(
+        self, data_files: list[Path], cache: ConsolidateCache
+    ) -> list[FileResult]:
+        cache.set_context(self.cache_context())
+
+        results: dict[Path, FileResult] = {}
+        for data_file in data_files:
+            cached = cache.get(data_file)
+            if cached is not None:
+                results[data_file] = cached
 
-    def run_batch(self) -> pd.DataFrame:
+        pending = [data_file for data_file in data_files if data_file not in results]
+        print(f"Cache: {len(results)} arquivos reaproveitados, {len(pending)} a processar")
+
+        for data_file, result in zip(pending, self._process_files(pending), strict=True):
+            cache.put(data_file, *result)
+            results[data_file] = result
+
+        cache.prune(data_files)
+        cache.save()
+        return [results[data_file] for data_file in data_files]
+
+    def list_data_files(self) -> list[Path]:
         supported_patterns = ["*.csv", "*.txt", "*.xlsx", "*.xls"]
         data_files: list[Path] = []
 
@@ -100,23 +307,73 @@ class DespesasConsolidator:
             raise FileNotFoundError(
                 f"Nenhum arquivo de dados encontrado em {constant_paths.trimestres_dir}"
             )
+        return data_files
 
+    def filter_batch(self, data_files: list[Path]) -> list[FileResult]:
+        """Filtra todos os arquivos trimestrais; não depende do cadastro de operadoras."""
         print(f"Encontrados {len(data_files)} arquivos para processar")
+        if self.result_cache is None:
+            return self._process_files(data_files)
+        return self._process_files_cached(data_files, self.result_cache)
 
-        df_consolidate = pd.DataFrame()
-        df_operadoras = self.load_operadoras_df()
-        processed = 0
+    def join_batch(
+        self,
+        data_files: list[Path],
+        results: list[FileResult],
+        df_operadoras: pd.DataFrame,
+    ) -> pd.DataFrame:
+        """Enriquece o resultado de cada arquivo e concatena tudo uma única vez."""
+        frames: list[pd.DataFrame] = []
         skipped = 0
-        for data_file in data_files:
-            try:
-                df_despesas = self.load_despesas_df(data_file)
-                df_despesas = self.filter_despesas(df_despesas)
-                df_join = self.join_operadoras(df_despesas, df_operadoras)
-                df_consolidate = pd.concat([df_consolidate, df_join], ignore_index=True)
-                processed += 1
-            except ValueError as e:
-                print(f"Arquivo ignorado ({data_file.name}): {e}")
+        for data_file, (df_despesas, skip_reason) in zip(data_files, results, strict=True):
+            if df_despesas is None:
+                print(f"Arquivo ignorado ({data_file.name}): {skip_reason}")
                 skipped += 1
+                continue
+            with instrumentation.stage("join", data_file) as record:
+                record.rows_in = len(df_despesas)
+                df_join = self.join_operadoras(df_despesas, df_operadoras)
+                record.rows_out = len(df_join)
+            frames.append(df_join)
+
+        print(f"Processamento concluído: {len(frames)} arquivos, {skipped} ignorados")
+        if not frames:
+            return pd.DataFrame()
+        # Categorias diferem entre arquivos; o concat as funde em texto, então reaplica o esquema
+        return apply_schema(pd.concat(frames, ignore_index=True), CONSOLIDADO_SCHEMA)
+
+    def run_batch(self, df_operadoras: pd.DataFrame | None = None) -> pd.DataFrame:
+        data_files = self.list_data_files()
+        results = self.filter_batch(data_files)
+        if df_operadoras is None:
+            df_operadoras = self.load_operadoras_df()
+        return self.join_batch(data_files, results, df_operadoras)
+
+
+def _pool_context() -> multiprocessing.context.BaseContext | None:
+    """Contexto do pool de processos: forkserver onde existir.
+
+    O pool é criado a partir de uma thread do pipeline, e um fork com outras threads
+    ativas (inclusive as nativas do DuckDB) pode travar o processo filho.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return None
+
+
+# Estado por processo do pool: o consolidador é enviado uma única vez por worker
+_worker_consolidator: DespesasConsolidator | None = None
+
+
+def _init_worker(consolidator: DespesasConsolidator) -> None:
+    global _worker_consolidator
+    _worker_consolidator = consolidator
+    # Se o worker vier de um fork, herda os registros do processo principal; só os
+    # próprios voltam
+    instrumentation.reset()
+
 
-        print(f"Processamento concluído: {processed} arquivos, {skipped} ignorados")
-        return df_consolidate
+def _process_file_in_worker(data_file: Path) -> tuple[FileResult, list[StageRecord]]:
+    assert _worker_consolidator is not None
+    result = _worker_consolidator.process_file(data_file)
+    return result, instrumentation.drain()
@@ -2,12 +2,19 @@ from pathlib import Path
 
 
 class ConstantPaths:
-    _base_dir = Path(__file__).resolve().parent
-    root_dir = _base_dir.parents[1]
-    data_dir = root_dir / "data"
-    output_dir = root_dir / "output"
-    operadoras_dir = data_dir / "operadoras"
-    trimestres_dir = data_dir / "trimestres"
+    def __init__(self, root_dir: Path):
+        self.set_root(root_dir)
 
+    def set_root(self, root_dir: Path) -> None:
+        """Reaponta todos os diretórios para outra raiz (ex.: dados sintéticos dos benchmarks)."""
+        self.root_dir = root_dir
+        self.data_dir = root_dir / "data"
+        self.output_dir = root_dir / "output"
+        self.operadoras_dir = self.data_dir / "operadoras"
+        self.trimestres_dir = self.data_dir / "trimestres"
+        self.consolidado_dir = self.data_dir / "consolidado"
+        self.downloads_dir = self.data_dir / "downloads"
+        self.cache_dir = self.data_dir / ".cache"
 
-constant_paths = ConstantPaths()
+
+constant_paths = ConstantPaths(Path(__file__).resolve().parents[2])
@@ -0,0 +1,254 @@
+import json
+import os
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .instrumentation import instrumentation
+
+
+class IncompleteDownloadError(requests.RequestException):
+    """Todas as tentativas de retomar/baixar o arquivo receberam 416."""
+
+
+@dataclass(frozen=True)
+class DownloadResult:
+    path: Path
+    modified: bool
+    etag: str | None = None
+    last_modified: str | None = None
+
+
+class Downloader:
+    """Downloads HTTP concorrentes com pool de conexões compartilhado.
+
+    - Uma única `requests.Session` reaproveita conexões entre listagens e arquivos.
+    - No máximo `max_workers` transferências simultâneas.
+    - Erros de conexão e respostas 429/5xx são repetidos com backoff exponencial.
+    - O corpo da resposta é gravado em disco em blocos, nunca inteiro em memória.
+    """
+
+    RETRY_STATUS = (429, 500, 502, 503, 504)
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        retries: int = 3,
+        backoff_factor: float = 0.5,
+        timeout: int = 30,
+        block_size: int = 1024 * 1024,
+    ):
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+        self.block_size = block_size
+        self.session = self._create_session()
+
+    def _create_session(self) -> requests.Session:
+        retry = Retry(
+            total=self.retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=self.RETRY_STATUS,
+            allowed_methods=frozenset({"GET", "HEAD"}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self.max_workers,
+            pool_maxsize=self.max_workers,
+            max_retries=retry,
+        )
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def get_text(self, url: str) -> str:
+        response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        return response.text
+
+    def download(
+        self,
+        url: str,
+        dest_path: Path,
+        etag: str | None = None,
+        last_modified: str | None = None,
+    ) -> DownloadResult:
+        """Grava `url` em `dest_path` via arquivo temporário `.part`.
+
+        Com `etag`/`last_modified` a requisição é condicional (304 mantém o arquivo atual).
+        Um `.part` deixado por uma transferência interrompida é retomado com `Range`,
+        validado por `If-Range` contra o ETag/Last-Modified da resposta original.
+        """
+        dest_path.parent.mkdir(parents=True, exist_ok=True)
+        part_path = dest_path.with_name(dest_path.name + ".part")
+        meta_path = dest_path.with_name(dest_path.name + ".part.json")
+
+        for attempt in range(self.retries + 1):
+            headers: dict[str, str] = {}
+            partial = self._read_partial_meta(part_path, meta_path)
+            if partial is not None:
+                headers["Range"] = f"bytes={part_path.stat().st_size}-"
+                validator = partial["etag"] or partial["last_modified"]
+                assert validator is not None  # garantido por _read_partial_meta
+                headers["If-Range"] = validator
+            elif dest_path.exists():
+                if etag:
+                    headers["If-None-Match"] = etag
+                if last_modified:
+                    headers["If-Modified-Since"] = last_modified
+
+            try:
+                with self.session.get(
+                    url, headers=headers, timeout=self.timeout, stream=True
+                ) as response:
+                    if response.status_code == 304:
+                        return DownloadResult(dest_path, False, etag, last_modified)
+                    if response.status_code == 416:
+                        # Faixa inválida: o arquivo remoto mudou de tamanho, recomeça do zero
+                        part_path.unlink(missing_ok=True)
+                        meta_path.unlink(missing_ok=True)
+                        continue
+                    response.raise_for_status()
+
+                    new_etag = response.headers.get("ETag")
+                    new_last_modified = response.headers.get("Last-Modified")
+                    if response.status_code == 206:
+                        mode = "ab"
+                    else:
+                        mode = "wb"
+                        meta_path.write_text(
+                            json.dumps({"etag": new_etag, "last_modified": new_last_modified}),
+                            encoding="utf-8",
+                        )
+
+                    with open(part_path, mode) as f:
+                        for block in response.iter_content(chunk_size=self.block_size):
+                            f.write(block)
+
+                os.replace(part_path, dest_path)
+                meta_path.unlink(missing_ok=True)
+                return DownloadResult(dest_path, True, new_etag, new_last_modified)
+            except (requests.ConnectionError, requests.exceptions.ChunkedEncodingError):
+                # Falhas no meio do corpo não são repetidas pelo adapter; a próxima
+                # tentativa retoma do ponto em que o .part parou
+                if attempt == self.retries:
+                    raise
+                time.sleep(self.backoff_factor * 2**attempt)
+
+        # Só chega aqui se todas as tentativas receberam 416
+        raise IncompleteDownloadError(f"Download não concluído: {url}")
+
+    def _read_partial_meta(self, part_path: Path, meta_path: Path) -> dict[str, str | None] | None:
+        if not part_path.exists() or not meta_path.exists():
+            return None
+        try:
+            meta: dict[str, str | None] = json.loads(meta_path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            return None
+        if not (meta.get("etag") or meta.get("last_modified")):
+            return None
+        return meta
+
+    def download_many(
+        self,
+        jobs: list[tuple[str, Path]],
+        fetch: Callable[[str, Path], DownloadResult] | None = None,
+    ) -> list[DownloadResult | None]:
+        """Baixa vários arquivos em paralelo. Retorna na ordem de `jobs`; None indica falha."""
+        fetch = fetch or self.download
+
+        def run(job: tuple[str, Path]) -> DownloadResult | None:
+            url, dest_path = job
+            try:
+                result = fetch(url, dest_path)
+                print(f"{'Baixado' if result.modified else 'Sem alterações'}: {url}")
+                return result
+            except requests.RequestException as e:
+                print(f"Erro ao baixar {url}: {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(run, jobs))
+
+
+class DownloadMirror:
+    """Espelho local dos arquivos da ANS.
+
+    Guarda ETag/Last-Modified/tamanho de cada URL para fazer requisições condicionais e
+    mantém as listagens de diretório já interpretadas por `listing_ttl` segundos. Com o
+    servidor inalterado, uma execução custa apenas respostas 304.
+    """
+
+    def __init__(self, downloader: Downloader, manifest_file: Path, listing_ttl: float = 6 * 3600):
+        self.downloader = downloader
+        self.manifest_file = manifest_file
+        self.listing_ttl = listing_ttl
+        self._lock = threading.Lock()
+        # Carregado já na criação: as etapas do pipeline usam o espelho em paralelo
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self) -> dict[str, Any]:
+        if self.manifest_file.exists():
+            try:
+                manifest: dict[str, Any] = json.loads(
+                    self.manifest_file.read_text(encoding="utf-8")
+                )
+                return manifest
+            except (OSError, json.JSONDecodeError):
+                print("Manifesto do espelho corrompido, recriando")
+        return {"files": {}, "listings": {}}
+
+    def get_listing(
+        self, url: str, parse: Callable[[str], dict[str, list[str]]]
+    ) -> dict[str, list[str]]:
+        with self._lock:
+            cached = self.manifest["listings"].get(url)
+        if cached is not None and time.time() - cached["fetched_at"] < self.listing_ttl:
+            return dict(cached["items"])
+
+        items = parse(self.downloader.get_text(url))
+        with self._lock:
+            self.manifest["listings"][url] = {"fetched_at": time.time(), "items": items}
+        return items
+
+    def fetch(self, url: str, dest_path: Path) -> DownloadResult:
+        with self._lock:
+            entry = self.manifest["files"].get(url)
+
+        etag = last_modified = None
+        if entry and dest_path.exists() and dest_path.stat().st_size == entry["size"]:
+            etag, last_modified = entry["etag"], entry["last_modified"]
+
+        with instrumentation.stage("download", dest_path) as record:
+            result = self.downloader.download(url, dest_path, etag, last_modified)
+            record.bytes_read = result.path.stat().st_size if result.modified else 0
+        if result.modified:
+            with self._lock:
+                self.manifest["files"][url] = {
+                    "path": str(result.path),
+                    "etag": result.etag,
+                    "last_modified": result.last_modified,
+                    "size": result.path.stat().st_size,
+                }
+        return result
+
+    def fetch_many(self, jobs: list[tuple[str, Path]]) -> list[DownloadResult | None]:
+        return self.downloader.download_many(jobs, fetch=self.fetch)
+
+    def save(self) -> None:
+        self.manifest_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.manifest_file.with_suffix(".tmp")
+        # Etapas concorrentes do pipeline compartilham o espelho; a troca também fica no lock
+        with self._lock:
+            tmp_file.write_text(json.dumps(self.manifest, indent=2), encoding="utf-8")
+            os.replace(tmp_file, self.manifest_file)
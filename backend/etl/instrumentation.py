@@ -0,0 +1,160 @@
+"""Medição por etapa e por arquivo do ETL: tempo, CPU, linhas, bytes e pico de memória.
+
+Cada trecho instrumentado abre um `instrumentation.stage(...)` e preenche linhas e
+bytes no registro devolvido. Processos do pool enviam seus registros ao processo
+principal (`drain`/`extend`). Ao final, `write_report` grava o relatório em JSON e
+`print_summary` imprime a tabela de resumo.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any
+
+try:
+    import resource
+except ImportError:  # Windows não tem o módulo resource
+    resource = None  # type: ignore[assignment]
+
+
+def peak_rss_mb() -> float | None:
+    """Pico de memória residente do processo até agora, em MiB (None se indisponível)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta em KiB; macOS, em bytes
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+@dataclass
+class StageRecord:
+    stage: str
+    file: str | None = None
+    wall_seconds: float = 0.0
+    # CPU da thread que executou a etapa; etapas em paralelo não se somam
+    cpu_seconds: float = 0.0
+    rows_in: int | None = None
+    rows_out: int | None = None
+    bytes_read: int | None = None
+    bytes_written: int | None = None
+    peak_rss_mb: float | None = None
+    pid: int = field(default_factory=os.getpid)
+
+
+class Instrumentation:
+    SUMMARY_TOP_FILES = 5
+
+    def __init__(self) -> None:
+        self.records: list[StageRecord] = []
+        self.started_at = datetime.now(UTC)
+        self._lock = threading.Lock()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.records = []
+            self.started_at = datetime.now(UTC)
+
+    @contextmanager
+    def stage(self, name: str, file: Path | str | None = None) -> Iterator[StageRecord]:
+        record = StageRecord(name, Path(file).name if file is not None else None)
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield record
+        finally:
+            record.wall_seconds = time.perf_counter() - wall_start
+            record.cpu_seconds = time.thread_time() - cpu_start
+            record.peak_rss_mb = peak_rss_mb()
+            with self._lock:
+                self.records.append(record)
+
+    def drain(self) -> list[StageRecord]:
+        """Retira os registros acumulados (usado nos processos do pool)."""
+        with self._lock:
+            records, self.records = self.records, []
+        return records
+
+    def extend(self, records: list[StageRecord]) -> None:
+        with self._lock:
+            self.records.extend(records)
+
+    def summarize(self) -> dict[str, dict[str, Any]]:
+        """Totais por etapa, na ordem em que cada etapa apareceu pela primeira vez."""
+        summary: dict[str, dict[str, Any]] = {}
+        with self._lock:
+            records = list(self.records)
+        for record in records:
+            totals = summary.setdefault(
+                record.stage,
+                {
+                    "count": 0,
+                    "wall_seconds": 0.0,
+                    "cpu_seconds": 0.0,
+                    "rows_in": 0,
+                    "rows_out": 0,
+                    "bytes_read": 0,
+                    "bytes_written": 0,
+                    "peak_rss_mb": None,
+                },
+            )
+            totals["count"] += 1
+            totals["wall_seconds"] += record.wall_seconds
+            totals["cpu_seconds"] += record.cpu_seconds
+            for key in ("rows_in", "rows_out", "bytes_read", "bytes_written"):
+                totals[key] += getattr(record, key) or 0
+            if record.peak_rss_mb is not None:
+                totals["peak_rss_mb"] = max(totals["peak_rss_mb"] or 0.0, record.peak_rss_mb)
+        return summary
+
+    def write_report(self, report_file: Path, **metadata: Any) -> None:
+        finished_at = datetime.now(UTC)
+        with self._lock:
+            records = [asdict(record) for record in self.records]
+        report = {
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "finished_at": finished_at.isoformat(timespec="seconds"),
+            "wall_seconds": (finished_at - self.started_at).total_seconds(),
+            "peak_rss_mb": peak_rss_mb(),
+            **metadata,
+            "stages": self.summarize(),
+            "records": records,
+        }
+        report_file.parent.mkdir(parents=True, exist_ok=True)
+        report_file.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"Relatório de execução gravado em {report_file}")
+
+    def print_summary(self) -> None:
+        summary = self.summarize()
+        if not summary:
+            return
+
+        print(
+            f"\n{'etapa':<16}{'n':>5}{'tempo (s)':>11}{'cpu (s)':>10}"
+            f"{'linhas in':>12}{'linhas out':>12}{'MB lidos':>10}{'pico MB':>10}"
+        )
+        for name, totals in summary.items():
+            peak = totals["peak_rss_mb"]
+            print(
+                f"{name:<16}{totals['count']:>5}{totals['wall_seconds']:>11.2f}"
+                f"{totals['cpu_seconds']:>10.2f}{totals['rows_in']:>12}{totals['rows_out']:>12}"
+                f"{totals['bytes_read'] / 1024**2:>10.1f}"
+                f"{peak if peak is not None else float('nan'):>10.0f}"
+            )
+
+        with self._lock:
+            per_file = [record for record in self.records if record.file is not None]
+        slowest = sorted(per_file, key=lambda record: record.wall_seconds, reverse=True)
+        if slowest:
+            print("\nArquivos mais lentos:")
+            for record in slowest[: self.SUMMARY_TOP_FILES]:
+                print(f"  {record.stage:<12} {record.file:<40} {record.wall_seconds:8.2f}s")
+
+
+instrumentation = Instrumentation()
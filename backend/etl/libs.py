@@ -1,10 +1,21 @@
+import codecs
+import csv
+import json
 import os
 import re
+import shutil
 import zipfile as zf
-from io import BytesIO
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
 from pathlib import Path
+from typing import IO, BinaryIO
 
+import numpy as np
 import pandas as pd
+from pandas.api.types import is_integer_dtype
+
+from .constants import constant_paths
 
 
 def normalize_cnpj(cnpj: str | None) -> str | None:
@@ -32,6 +43,50 @@ def normalize_cnpj(cnpj: str | None) -> str | None:
     return cnpj if cnpj[12:] == dv_1 + dv_2 else None
 
 
+CNPJ_DV_1_WEIGHTS = np.array((5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2), dtype=np.int64)
+CNPJ_DV_2_WEIGHTS = np.array((6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2), dtype=np.int64)
+CNPJ_DIGIT_POWERS = 10 ** np.arange(13, -1, -1, dtype=np.int64)
+
+
+def _cnpj_check_digits(digits: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    rest = (digits @ weights) % 11
+    return np.where(rest < 2, 0, 11 - rest)
+
+
+def normalize_cnpj_series(cnpjs: pd.Series) -> pd.Series:
+    """Versão vetorizada de `normalize_cnpj` para uma coluna inteira.
+
+    Os dígitos verificadores são calculados com produto matricial sobre uma matriz
+    (n, 14) de dígitos. Valores nulos ou inválidos viram NaN.
+    """
+    result = np.full(len(cnpjs), np.nan, dtype=object)
+
+    present = cnpjs.notna().to_numpy()
+    if is_integer_dtype(cnpjs.dtype):
+        # Códigos inteiros: dígitos extraídos aritmeticamente, sem passar por texto
+        codes = np.abs(cnpjs[present].to_numpy(dtype=np.int64))
+        has_14 = codes < 10**14
+        matrix = (codes[has_14, None] // CNPJ_DIGIT_POWERS) % 10
+        candidates = pd.Series(codes[has_14].astype(str)).str.zfill(14)
+    else:
+        digits = cnpjs[present].astype(str).str.replace(r"[^0-9]", "", regex=True).str.zfill(14)
+        has_14 = (digits.str.len() == 14).to_numpy()
+        candidates = digits[has_14]
+        matrix = np.frombuffer(candidates.str.cat().encode("ascii"), dtype=np.uint8)
+        matrix = matrix.reshape(-1, 14).astype(np.int64) - ord("0")
+
+    if not candidates.empty:
+        repeated = (matrix == matrix[:, :1]).all(axis=1)
+        dv_1 = _cnpj_check_digits(matrix[:, :12], CNPJ_DV_1_WEIGHTS)
+        dv_2 = _cnpj_check_digits(matrix[:, :13], CNPJ_DV_2_WEIGHTS)
+        valid = ~repeated & (matrix[:, 12] == dv_1) & (matrix[:, 13] == dv_2)
+
+        positions = np.flatnonzero(present)[has_14]
+        result[positions[valid]] = candidates.to_numpy()[valid]
+
+    return pd.Series(result, index=cnpjs.index, dtype="str")
+
+
 COLUMN_MAPPINGS: dict[str, list[str]] = {
     "REG_ANS": ["REG_ANS", "REGISTRO_ANS", "CD_OPERADORA", "OPERADORA"],
     "CD_CONTA_CONTABIL": ["CD_CONTA_CONTABIL", "CONTA_CONTABIL", "COD_CONTA", "CONTA"],
@@ -45,18 +100,26 @@ class ColumnNormalizer:
     def __init__(self, mappings: dict[str, list[str]]):
         self.mappings = mappings
 
-    def normalize_column_names(self, df: pd.DataFrame) -> pd.DataFrame:
-        df_columns_upper = {col.upper(): col for col in df.columns}
-        rename_map: dict[str, str] = {}
+    def resolve_column_names(self, columns: list[str]) -> dict[str, str]:
+        """Mapeia nome padrão -> nome original encontrado no arquivo."""
+        columns_upper = {str(col).upper(): str(col) for col in columns}
+        resolved: dict[str, str] = {}
 
         for standard_name, variants in self.mappings.items():
             for variant in variants:
-                if variant.upper() in df_columns_upper:
-                    original_col = df_columns_upper[variant.upper()]
-                    if original_col != standard_name:
-                        rename_map[original_col] = standard_name
+                if variant.upper() in columns_upper:
+                    resolved[standard_name] = columns_upper[variant.upper()]
                     break
 
+        return resolved
+
+    def normalize_column_names(self, df: pd.DataFrame) -> pd.DataFrame:
+        rename_map = {
+            original_col: standard_name
+            for standard_name, original_col in self.resolve_column_names(list(df.columns)).items()
+            if original_col != standard_name
+        }
+
         if rename_map:
             print(f"Colunas normalizadas: {rename_map}")
             df = df.rename(columns=rename_map)
@@ -70,21 +133,200 @@ class ColumnNormalizer:
 column_normalizer = ColumnNormalizer(COLUMN_MAPPINGS)
 
 
+@dataclass(frozen=True)
+class CsvDialect:
+    encoding: str
+    sep: str
+    decimal: str
+
+
+class CsvDialectSniffer:
+    """Detecta encoding, separador e decimal a partir de uma amostra limitada do arquivo.
+
+    O resultado fica em cache por arquivo (chave: caminho, tamanho e mtime), de modo que
+    execuções seguintes do ETL não precisam repetir a detecção.
+    """
+
+    ENCODINGS = ("utf-8", "latin1", "cp1252")
+    SEPARATORS = (";", ",", "\t", "|")
+    SAMPLE_SIZE = 64 * 1024
+    SAMPLE_LINES = 50
+
+    _COMMA_DECIMAL = re.compile(r"^-?(\d{1,3}(\.\d{3})+|\d+),\d+$")
+    _DOT_DECIMAL = re.compile(r"^-?\d+\.\d+$")
+
+    def __init__(self, cache_file: Path | None = None):
+        self.cache_file = cache_file
+        self._cache: dict[str, dict[str, str | int]] | None = None
+
+    def sniff(self, file_path: Path) -> CsvDialect | None:
+        cached = self._get_cached(file_path)
+        if cached is not None:
+            return cached
+
+        with open(file_path, "rb") as f:
+            sample = f.read(self.SAMPLE_SIZE)
+            truncated = bool(f.read(1))
+
+        dialect = self.sniff_bytes(sample, truncated)
+        if dialect is not None:
+            self.remember(file_path, dialect)
+        return dialect
+
+    def sniff_bytes(self, sample: bytes, truncated: bool = False) -> CsvDialect | None:
+        decoded = self._decode(sample, truncated)
+        if decoded is None:
+            return None
+        encoding, text = decoded
+
+        lines = text.splitlines()
+        if truncated and len(lines) > 1:
+            lines = lines[:-1]
+        lines = [line for line in lines[: self.SAMPLE_LINES] if line.strip()]
+        if not lines:
+            return None
+
+        sep = self._detect_separator(lines)
+        if sep is None:
+            return None
+
+        return CsvDialect(encoding=encoding, sep=sep, decimal=self._detect_decimal(lines, sep))
+
+    def remember(self, file_path: Path, dialect: CsvDialect) -> None:
+        cache = self._load_cache()
+        stat = file_path.stat()
+        cache[str(file_path.resolve())] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            **asdict(dialect),
+        }
+        self._save_cache()
+
+    def invalidate(self, file_path: Path) -> None:
+        cache = self._load_cache()
+        if cache.pop(str(file_path.resolve()), None) is not None:
+            self._save_cache()
+
+    def _decode(self, sample: bytes, truncated: bool) -> tuple[str, str] | None:
+        for encoding in self.ENCODINGS:
+            decoder = codecs.getincrementaldecoder(encoding)()
+            try:
+                # Amostra truncada pode terminar no meio de um caractere multibyte
+                return encoding, decoder.decode(sample, final=not truncated)
+            except UnicodeDecodeError:
+                continue
+        return None
+
+    def _detect_separator(self, lines: list[str]) -> str | None:
+        candidates: list[str] = []
+        for sep in self.SEPARATORS:
+            rows = list(csv.reader(lines, delimiter=sep))
+            n_columns = len(rows[0])
+            if n_columns <= 1:
+                continue
+            if all(len(row) == n_columns for row in rows[1:]):
+                return sep
+            candidates.append(sep)
+
+        return candidates[0] if candidates else None
+
+    def _detect_decimal(self, lines: list[str], sep: str) -> str:
+        if sep == ",":
+            return "."
+
+        comma_hits = 0
+        dot_hits = 0
+        for row in csv.reader(lines[1:], delimiter=sep):
+            for value in row:
+                value = value.strip()
+                if self._COMMA_DECIMAL.match(value):
+                    comma_hits += 1
+                elif self._DOT_DECIMAL.match(value):
+                    dot_hits += 1
+
+        return "." if dot_hits > comma_hits else ","
+
+    def _get_cached(self, file_path: Path) -> CsvDialect | None:
+        entry = self._load_cache().get(str(file_path.resolve()))
+        if entry is None:
+            return None
+
+        stat = file_path.stat()
+        if entry["size"] != stat.st_size or entry["mtime_ns"] != stat.st_mtime_ns:
+            return None
+
+        return CsvDialect(
+            encoding=str(entry["encoding"]), sep=str(entry["sep"]), decimal=str(entry["decimal"])
+        )
+
+    def _load_cache(self) -> dict[str, dict[str, str | int]]:
+        if self._cache is None:
+            self._cache = {}
+            if self.cache_file is not None and self.cache_file.exists():
+                try:
+                    self._cache = json.loads(self.cache_file.read_text(encoding="utf-8"))
+                except (OSError, json.JSONDecodeError):
+                    self._cache = {}
+        return self._cache
+
+    def _save_cache(self) -> None:
+        if self.cache_file is None or self._cache is None:
+            return
+
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.cache_file.with_suffix(f".{os.getpid()}.tmp")
+        tmp_file.write_text(json.dumps(self._cache, indent=2), encoding="utf-8")
+        os.replace(tmp_file, self.cache_file)
+
+
+csv_dialect_sniffer = CsvDialectSniffer(constant_paths.cache_dir / "csv_dialects.json")
+
+
 class ZipHandler:
-    def _safe_extract(self, zip_file: zf.ZipFile, path: Path) -> None:
-        for member in zip_file.namelist():
-            final_path = os.path.abspath(os.path.join(path, member))
-            if not final_path.startswith(os.path.abspath(path)):
-                raise RuntimeError("Zip malicioso detectado")
-        zip_file.extractall(path)
-
-    def extract_from_zip_bytes(self, zip_bytes: BytesIO, output_dir: Path) -> None:
+    BLOCK_SIZE = 1024 * 1024
+
+    def _member_path(self, info: zf.ZipInfo, output_dir: Path) -> Path:
+        member = Path(info.filename)
+        if member.is_absolute() or ".." in member.parts:
+            raise RuntimeError("Zip malicioso detectado")
+
+        final_path = (output_dir / member).resolve()
+        if not final_path.is_relative_to(output_dir.resolve()):
+            raise RuntimeError("Zip malicioso detectado")
+        return final_path
+
+    def _safe_extract(self, zip_file: zf.ZipFile, path: Path) -> list[Path]:
+        """Extrai membro a membro, copiando em blocos de BLOCK_SIZE direto para o disco."""
+        members = [info for info in zip_file.infolist() if not info.is_dir()]
+        # Valida todos os caminhos antes de gravar qualquer arquivo
+        targets = [self._member_path(info, path) for info in members]
+
+        for info, target in zip(members, targets, strict=True):
+            target.parent.mkdir(parents=True, exist_ok=True)
+            with zip_file.open(info) as source, open(target, "wb") as dest:
+                shutil.copyfileobj(source, dest, self.BLOCK_SIZE)
+        return targets
+
+    def extract_from_zip_bytes(self, zip_bytes: BinaryIO, output_dir: Path) -> list[Path]:
         with zf.ZipFile(zip_bytes) as zip_file:
-            self._safe_extract(zip_file, output_dir)
+            return self._safe_extract(zip_file, output_dir)
+
+    def extract_local_file(self, source_file_path: Path, output_dir: Path) -> list[Path]:
+        with zf.ZipFile(source_file_path) as zip_file:
+            return self._safe_extract(zip_file, output_dir)
 
-    def extract_local_file(self, source_file_path: Path, output_dir: Path) -> None:
+    def list_members(self, source_file_path: Path) -> list[str]:
         with zf.ZipFile(source_file_path) as zip_file:
-            self._safe_extract(zip_file, output_dir)
+            return [info.filename for info in zip_file.infolist() if not info.is_dir()]
+
+    @contextmanager
+    def open_member(self, source_file_path: Path, member: str) -> Iterator[IO[bytes]]:
+        """Abre um membro do zip como stream descompactado, sem extraí-lo."""
+        with zf.ZipFile(source_file_path) as zip_file:
+            info = zip_file.getinfo(member)
+            self._member_path(info, source_file_path.parent)
+            with zip_file.open(info) as stream:
+                yield stream
 
     def export_df_to_zip(
         self, df: pd.DataFrame, output_path: Path, zip_name: str, csv_name: str
@@ -98,20 +340,3 @@ class ZipHandler:
             encoding="utf-8",
             compression={"method": "zip", "archive_name": csv_name},
         )
-
-    def extract_files_from_zip_bytes(self, zip_bytes: BytesIO) -> dict[str, BytesIO]:
-        files: dict[str, BytesIO] = {}
-
-        with zf.ZipFile(zip_bytes) as z:
-            for info in z.infolist():
-                if info.is_dir():
-                    continue
-
-                p = Path(info.filename)
-                if p.is_absolute() or ".." in p.parts:
-                    raise RuntimeError("zip malicioso")
-
-                with z.open(info) as f:
-                    files[info.filename] = BytesIO(f.read())
-
-        return files
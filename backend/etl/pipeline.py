@@ -0,0 +1,255 @@
+"""Pipeline do ETL (Partes 1 e 2) como um grafo de etapas.
+
+Os DataFrames passam entre as etapas em memória e etapas independentes rodam em
+paralelo, por exemplo a atualização do cadastro de operadoras enquanto os
+trimestres são filtrados. Artefatos intermediários só vão para o disco quando
+solicitados (`--save-artifacts`). Cada execução grava um relatório com as medições
+por etapa e por arquivo (`etl.instrumentation`).
+"""
+
+import argparse
+import time
+from collections.abc import Callable, Iterable
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+import pandas as pd
+
+from .aggregator import DespesasAggregator
+from .backends import BACKENDS, create_backend
+from .cache import ConsolidateCache
+from .clients import ANSApiClient, LocalStorageClient
+from .consolidator import DespesasConsolidator, FileResult
+from .constants import constant_paths
+from .downloader import Downloader
+from .instrumentation import instrumentation
+from .libs import ZipHandler, column_normalizer
+from .schema import to_export_df
+
+
+@dataclass(frozen=True)
+class Stage:
+    name: str
+    func: Callable[..., Any]
+    deps: tuple[str, ...] = ()
+
+
+class Pipeline:
+    """Executa etapas em ordem topológica; cada etapa recebe os resultados das dependências."""
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self.stages: dict[str, Stage] = {}
+        self.timings: dict[str, float] = {}
+
+    def add(self, name: str, func: Callable[..., Any], deps: Iterable[str] = ()) -> None:
+        deps = tuple(deps)
+        unknown = [dep for dep in deps if dep not in self.stages]
+        if unknown:
+            raise ValueError(f"Etapa {name} depende de etapas inexistentes: {unknown}")
+        self.stages[name] = Stage(name, func, deps)
+
+    def required_stages(self, targets: Iterable[str]) -> list[str]:
+        """Etapas necessárias para os alvos, na ordem em que foram registradas."""
+        required: set[str] = set()
+        pending = list(targets)
+        while pending:
+            name = pending.pop()
+            if name not in self.stages:
+                raise ValueError(f"Etapa desconhecida: {name}")
+            if name not in required:
+                required.add(name)
+                pending.extend(self.stages[name].deps)
+        return [name for name in self.stages if name in required]
+
+    def run(self, targets: Iterable[str] | None = None) -> dict[str, Any]:
+        order = self.required_stages(self.stages if targets is None else targets)
+        results: dict[str, Any] = {}
+        started: dict[str, float] = {}
+        running: dict[Future[Any], str] = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while order or running:
+                ready = [
+                    name for name in order if all(dep in results for dep in self.stages[name].deps)
+                ]
+                for name in ready:
+                    order.remove(name)
+                    stage = self.stages[name]
+                    print(f"[pipeline] {name}: iniciando")
+                    started[name] = time.perf_counter()
+                    future = executor.submit(stage.func, *(results[dep] for dep in stage.deps))
+                    running[future] = name
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    results[name] = future.result()
+                    elapsed = time.perf_counter() - started[name]
+                    self.timings[name] = elapsed
+                    print(f"[pipeline] {name}: concluída em {elapsed:.2f}s")
+
+        return results
+
+
+DEFAULT_TARGETS = ["exportar_consolidado", "exportar_agregado"]
+
+
+def build_etl_pipeline(
+    chunksize: int | None = None,
+    workers: int = 1,
+    use_cache: bool = True,
+    base_url: str = ANSApiClient.BASE_URL,
+    download_workers: int = 4,
+    save_artifacts: bool = False,
+    from_artifacts: bool = False,
+    backend: str = "pandas",
+) -> Pipeline:
+    """Monta o grafo download -> consolidação -> agregação -> exportação.
+
+    Com `from_artifacts`, o consolidado e o cadastro vêm dos arquivos da última execução
+    em vez de passar pelas etapas de download e filtro. `backend` escolhe o motor da
+    consolidação e da agregação (ver `etl.backends`).
+    """
+    zip_handler = ZipHandler()
+    local_storage_client = LocalStorageClient(zip_handler)
+    result_cache = ConsolidateCache(constant_paths.cache_dir / "consolidado") if use_cache else None
+    query_backend = create_backend(backend)
+    consolidator = DespesasConsolidator(
+        local_storage_client,
+        column_normalizer,
+        chunksize,
+        max_workers=workers,
+        result_cache=result_cache,
+        backend=query_backend,
+    )
+    aggregator = DespesasAggregator(local_storage_client, backend=query_backend)
+
+    pipeline = Pipeline()
+
+    if from_artifacts:
+        pipeline.add("operadoras", consolidator.load_operadoras_df)
+        pipeline.add("consolidar", local_storage_client.load_despesas_consolidate_df)
+    else:
+        ans_api_client = ANSApiClient(
+            zip_handler,
+            local_storage_client,
+            Downloader(max_workers=download_workers),
+            base_url=base_url,
+        )
+
+        def filtrar_trimestres(_: None) -> tuple[list[Path], list[FileResult]]:
+            data_files = consolidator.list_data_files()
+            return data_files, consolidator.filter_batch(data_files)
+
+        def consolidar(
+            filtered: tuple[list[Path], list[FileResult]], df_operadoras: pd.DataFrame
+        ) -> pd.DataFrame:
+            df = consolidator.join_batch(*filtered, df_operadoras)
+            if save_artifacts:
+                # Arrow é o formato de passagem para execuções separadas da Parte 2
+                local_storage_client.save_arrow_from_df(
+                    df, constant_paths.consolidado_dir, "consolidado_despesas.arrow"
+                )
+            return df
+
+        pipeline.add("download_trimestres", ans_api_client.download_demo_contabeis)
+        pipeline.add("download_operadoras", ans_api_client.download_operadoras_ativas)
+        pipeline.add(
+            "operadoras", lambda _: consolidator.load_operadoras_df(), ["download_operadoras"]
+        )
+        pipeline.add("filtrar_trimestres", filtrar_trimestres, ["download_trimestres"])
+        pipeline.add("consolidar", consolidar, ["filtrar_trimestres", "operadoras"])
+
+    pipeline.add("agregar", aggregator.run, ["consolidar", "operadoras"])
+    pipeline.add(
+        "exportar_consolidado",
+        lambda df: local_storage_client.save_zip_csv_from_df(
+            to_export_df(df),
+            constant_paths.output_dir,
+            "consolidado_despesas.zip",
+            "consolidado_despesas.csv",
+        ),
+        ["consolidar"],
+    )
+    pipeline.add(
+        "exportar_agregado",
+        lambda df: local_storage_client.save_csv_from_df(
+            to_export_df(df), constant_paths.output_dir, "despesas_agregadas.csv"
+        ),
+        ["agregar"],
+    )
+    return pipeline
+
+
+def run_pipeline(
+    targets: Iterable[str] | None = None, report_file: Path | None = None, **options: Any
+) -> dict[str, Any]:
+    """Executa o pipeline e grava o relatório de medições, inclusive se alguma etapa falhar."""
+    targets = list(DEFAULT_TARGETS if targets is None else targets)
+    if report_file is None:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        report_file = constant_paths.cache_dir / "reports" / f"etl_{timestamp}.json"
+
+    pipeline = build_etl_pipeline(**options)
+    instrumentation.reset()
+    try:
+        return pipeline.run(targets)
+    finally:
+        instrumentation.print_summary()
+        instrumentation.write_report(
+            report_file, targets=targets, options=options, pipeline_stages=pipeline.timings
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pipeline do ETL (Partes 1 e 2)")
+    parser.add_argument(
+        "--targets",
+        nargs="+",
+        default=DEFAULT_TARGETS,
+        help="Etapas finais a executar; as dependências são incluídas automaticamente",
+    )
+    parser.add_argument(
+        "--save-artifacts",
+        action="store_true",
+        help="Grava o consolidado em Arrow para execuções separadas da Parte 2",
+    )
+    parser.add_argument(
+        "--from-artifacts",
+        action="store_true",
+        help="Usa o consolidado e o cadastro gravados em disco, sem download nem filtro",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default="pandas",
+        help="Motor da consolidação e da agregação (duckdb requer o extra opcional)",
+    )
+    parser.add_argument("--chunksize", type=int, default=None, help="Lê em blocos de N linhas")
+    parser.add_argument("--workers", type=int, default=1, help="Processos para a consolidação")
+    parser.add_argument("--no-cache", action="store_true", help="Ignora o cache por arquivo")
+    parser.add_argument("--base-url", default=ANSApiClient.BASE_URL, help="Raiz do PDA da ANS")
+    parser.add_argument("--download-workers", type=int, default=4, help="Downloads simultâneos")
+    parser.add_argument(
+        "--report",
+        type=Path,
+        default=None,
+        help="Arquivo JSON do relatório (padrão: data/.cache/reports/etl_<data>.json)",
+    )
+    args = parser.parse_args()
+    run_pipeline(
+        args.targets,
+        report_file=args.report,
+        chunksize=args.chunksize,
+        workers=args.workers,
+        use_cache=not args.no_cache,
+        base_url=args.base_url,
+        download_workers=args.download_workers,
+        save_artifacts=args.save_artifacts,
+        from_artifacts=args.from_artifacts,
+        backend=args.backend,
+    )
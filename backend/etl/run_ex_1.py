@@ -1,22 +1,73 @@
-from .clients import ANSApiClient, LocalStorageClient
-from .consolidator import DespesasConsolidator
-from .constants import constant_paths
-from .libs import ZipHandler, column_normalizer
+import argparse
 
+from .backends import BACKENDS
+from .clients import ANSApiClient
+from .pipeline import run_pipeline
 
-def run_ex1() -> None:
-    zip_handler = ZipHandler()
-    local_storage_client = LocalStorageClient(zip_handler)
-    ans_api_client = ANSApiClient(zip_handler, local_storage_client)
 
-    ans_api_client.run()
-
-    consolidator = DespesasConsolidator(local_storage_client, column_normalizer)
-    df = consolidator.run_batch()
-    local_storage_client.save_zip_csv_from_df(
-        df, constant_paths.output_dir, "consolidado_despesas.zip", "consolidado_despesas.csv"
+def run_ex1(
+    chunksize: int | None = None,
+    workers: int = 1,
+    use_cache: bool = True,
+    base_url: str = ANSApiClient.BASE_URL,
+    download_workers: int = 4,
+    backend: str = "pandas",
+) -> None:
+    # Execução isolada da Parte 1: grava o Arrow para que a Parte 2 rode em outro processo
+    run_pipeline(
+        ["exportar_consolidado"],
+        chunksize=chunksize,
+        workers=workers,
+        use_cache=use_cache,
+        base_url=base_url,
+        download_workers=download_workers,
+        save_artifacts=True,
+        backend=backend,
     )
 
 
 if __name__ == "__main__":
-    run_ex1()
+    parser = argparse.ArgumentParser(description="Parte 1: download e consolidação")
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=None,
+        help="Lê os arquivos trimestrais em blocos de N linhas (modo streaming)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Número de processos para consolidar os arquivos trimestrais em paralelo",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Reprocessa todos os arquivos, ignorando o cache de resultados por arquivo",
+    )
+    parser.add_argument(
+        "--base-url",
+        default=ANSApiClient.BASE_URL,
+        help="Raiz do diretório PDA da ANS (ou de um servidor local com a mesma estrutura)",
+    )
+    parser.add_argument(
+        "--download-workers",
+        type=int,
+        default=4,
+        help="Número máximo de downloads simultâneos",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default="pandas",
+        help="Motor da consolidação (duckdb requer o extra opcional)",
+    )
+    args = parser.parse_args()
+    run_ex1(
+        args.chunksize,
+        args.workers,
+        use_cache=not args.no_cache,
+        base_url=args.base_url,
+        download_workers=args.download_workers,
+        backend=args.backend,
+    )
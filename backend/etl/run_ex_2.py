@@ -1,19 +1,9 @@
-from .aggregator import DespesasAggregator
-from .clients import LocalStorageClient
-from .constants import constant_paths
-from .libs import ZipHandler
+from .pipeline import run_pipeline
 
 
 def run_ex_2() -> None:
-    zip_handler = ZipHandler()
-    local_storage_client = LocalStorageClient(zip_handler)
-    aggregator = DespesasAggregator(local_storage_client)
-
-    df_agregado = aggregator.run()
-
-    local_storage_client.save_csv_from_df(
-        df_agregado, constant_paths.output_dir, "despesas_agregadas.csv"
-    )
+    # Execução isolada da Parte 2: parte do consolidado gravado pela Parte 1
+    run_pipeline(["exportar_agregado"], from_artifacts=True)
 
     # local_storage_client.save_zip_csv_from_df(
     #     df_agregado,
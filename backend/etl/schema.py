@@ -0,0 +1,96 @@
+"""Representação tipada e compacta dos DataFrames do ETL.
+
+CNPJ e REG_ANS circulam como códigos inteiros, colunas de baixa cardinalidade como
+categóricas e Ano/Trimestre como inteiros pequenos. O CNPJ só volta a ser texto com
+zeros à esquerda na exportação (`to_export_df`).
+"""
+
+import pandas as pd
+from pandas.api.types import is_integer_dtype, is_numeric_dtype
+
+CNPJ_DIGITOS = 14
+
+OPERADORAS_SCHEMA: dict[str, str] = {
+    "REG_ANS": "Int64",
+    "CNPJ": "Int64",
+    "Modalidade": "category",
+    "UF": "category",
+}
+
+DESPESAS_SCHEMA: dict[str, str] = {
+    "REG_ANS": "Int64",
+    "Ano": "int16",
+    "Trimestre": "int8",
+    "VL_SALDO_FINAL": "float64",
+}
+
+CONSOLIDADO_SCHEMA: dict[str, str] = {
+    "CNPJ": "int64",
+    "RazaoSocial": "category",
+    "Trimestre": "int8",
+    "Ano": "int16",
+    "ValorDespesas": "float64",
+}
+
+AGREGADO_SCHEMA: dict[str, str] = {
+    "CNPJ": "int64",
+    "RegistroANS": "Int64",
+    "RazaoSocial": "category",
+    "Modalidade": "category",
+    "UF": "category",
+}
+
+CODE_DTYPES = {"Int64", "int64"}
+
+
+def to_code(values: pd.Series) -> pd.Series:
+    """Converte identificadores (CNPJ, REG_ANS) em códigos inteiros; inválidos viram <NA>."""
+    if is_integer_dtype(values.dtype):
+        return values.astype("Int64")
+    if not is_numeric_dtype(values.dtype):
+        values = values.astype("str").str.replace(r"[^0-9]", "", regex=True)
+    return pd.to_numeric(values, errors="coerce").astype("Int64")
+
+
+def to_category(values: pd.Series) -> pd.Series:
+    """Categórica com categorias ordenadas, para que groupby ordene como faria com texto."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.cat.remove_unused_categories()
+        return values.cat.reorder_categories(sorted(values.cat.categories))
+    return values.astype("category")
+
+
+def apply_schema(df: pd.DataFrame, schema: dict[str, str]) -> pd.DataFrame:
+    """Aplica os tipos do esquema às colunas presentes no DataFrame."""
+    df = df.copy(deep=False)
+    for column, dtype in schema.items():
+        if column not in df.columns:
+            continue
+        if dtype == "category":
+            df[column] = to_category(df[column])
+        elif df[column].dtype == dtype:
+            continue
+        elif dtype in CODE_DTYPES:
+            codes = to_code(df[column])
+            # Valor presente que não vira código: identificador malformado, não ausente
+            malformados = int((codes.isna() & df[column].notna()).sum())
+            if malformados:
+                print(f"{malformados} valores de {column} malformados (não numéricos)")
+            df[column] = codes.astype(dtype)
+        else:
+            df[column] = df[column].astype(dtype)
+    return df
+
+
+def format_cnpj(codes: pd.Series) -> pd.Series:
+    """Formata códigos de CNPJ como texto de 14 dígitos com zeros à esquerda."""
+    return codes.astype("str").str.zfill(CNPJ_DIGITOS)
+
+
+def to_export_df(df: pd.DataFrame) -> pd.DataFrame:
+    """Prepara o DataFrame para exportação em CSV, restaurando o CNPJ textual."""
+    if "CNPJ" not in df.columns or not is_integer_dtype(df["CNPJ"].dtype):
+        return df
+    df = df.copy(deep=False)
+    df["CNPJ"] = format_cnpj(df["CNPJ"])
+    return df
@@ -21,9 +21,12 @@ CREATE TABLE despesas_consolidadas (
     operadora_id INT NOT NULL REFERENCES operadoras(id) ON DELETE CASCADE,
     trimestre INT NOT NULL,
     ano INT NOT NULL,
-    valor_despesa DECIMAL(18, 2) NOT NULL
+    valor_despesa DECIMAL(18, 2) NOT NULL,
+    -- Valor isolado do trimestre: valor_despesa é YTD (acumulado no ano)
+    valor_trimestre DECIMAL(18, 2) NOT NULL
 );
-CREATE INDEX ON despesas_consolidadas (operadora_id, ano, trimestre);
+CREATE INDEX ON despesas_consolidadas (operadora_id, ano, trimestre, id);
+CREATE INDEX ON despesas_consolidadas (ano, trimestre);
 
 CREATE TABLE despesas_agregadas (
     id INT PRIMARY KEY GENERATED ALWAYS AS IDENTITY,
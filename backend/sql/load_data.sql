@@ -12,6 +12,8 @@
 
 
 -- Ajuste os caminhos para os arquivos CSV gerados nas Partes 1 e 2
+-- O consolidado_despesas.csv deve ser extraído de output/consolidado_despesas.zip
+-- (o pipeline usa data/consolidado/consolidado_despesas.arrow internamente)
 \set path_operadoras '../../data/operadoras/operadoras.csv'
 \set path_consolidado '../../data/consolidado/consolidado_despesas.csv'
 \set path_agregado '../../output/despesas_agregadas.csv'
@@ -94,20 +96,32 @@ WITH (
 );
 
 
-INSERT INTO despesas_consolidadas (operadora_id, trimestre, ano, valor_despesa)
+-- Valores YTD: valor_trimestre guarda o valor isolado (diferença para o trimestre anterior)
+INSERT INTO despesas_consolidadas (operadora_id, trimestre, ano, valor_despesa, valor_trimestre)
 SELECT
-    o.id,
-    CAST(sd.trimestre AS INT),
-    CAST(sd.ano AS INT),
-    CAST(REPLACE(REPLACE(sd.valor_despesas, '.', ''), ',', '.') AS DECIMAL(18,2))
-FROM staging_despesas sd
-INNER JOIN operadoras o ON o.cnpj = REGEXP_REPLACE(sd.cnpj, '[^0-9]', '', 'g')
-WHERE
-    sd.trimestre ~ '^[1-4]$'
-    AND sd.ano ~ '^20[0-9]{2}$'
-    AND sd.valor_despesas IS NOT NULL
-    AND sd.valor_despesas ~ '^-?[0-9.,]+$'
-    AND CAST(REPLACE(REPLACE(sd.valor_despesas, '.', ''), ',', '.') AS DECIMAL(18,2)) > 0;
+    operadora_id,
+    trimestre,
+    ano,
+    valor_despesa,
+    valor_despesa - COALESCE(
+        LAG(valor_despesa) OVER (PARTITION BY operadora_id, ano ORDER BY trimestre),
+        0
+    )
+FROM (
+    SELECT
+        o.id AS operadora_id,
+        CAST(sd.trimestre AS INT) AS trimestre,
+        CAST(sd.ano AS INT) AS ano,
+        CAST(REPLACE(REPLACE(sd.valor_despesas, '.', ''), ',', '.') AS DECIMAL(18,2)) AS valor_despesa
+    FROM staging_despesas sd
+    INNER JOIN operadoras o ON o.cnpj = REGEXP_REPLACE(sd.cnpj, '[^0-9]', '', 'g')
+    WHERE
+        sd.trimestre ~ '^[1-4]$'
+        AND sd.ano ~ '^20[0-9]{2}$'
+        AND sd.valor_despesas IS NOT NULL
+        AND sd.valor_despesas ~ '^-?[0-9.,]+$'
+        AND CAST(REPLACE(REPLACE(sd.valor_despesas, '.', ''), ',', '.') AS DECIMAL(18,2)) > 0
+) despesas;
 
 DO $$
 DECLARE
@@ -0,0 +1,23 @@
+-- Valor isolado do trimestre gravado na carga: os dados são YTD (acumulados no ano) e as
+-- consultas da API não precisam mais desacumular com LAG() sobre a tabela inteira.
+-- Bancos criados depois desta migração já recebem a coluna e o índice do db_schema.sql.
+ALTER TABLE despesas_consolidadas ADD COLUMN IF NOT EXISTS valor_trimestre DECIMAL(18, 2);
+
+UPDATE despesas_consolidadas dc
+SET valor_trimestre = di.valor_trimestre
+FROM (
+    SELECT
+        id,
+        valor_despesa - COALESCE(
+            LAG(valor_despesa) OVER (PARTITION BY operadora_id, ano ORDER BY trimestre, id),
+            0
+        ) AS valor_trimestre
+    FROM despesas_consolidadas
+) di
+WHERE di.id = dc.id AND dc.valor_trimestre IS NULL;
+
+ALTER TABLE despesas_consolidadas ALTER COLUMN valor_trimestre SET NOT NULL;
+
+-- Primeiro e último período das estatísticas sem varrer a tabela
+CREATE INDEX IF NOT EXISTS despesas_consolidadas_ano_trimestre_idx
+    ON despesas_consolidadas (ano, trimestre);
@@ -0,0 +1,9 @@
+-- Respostas de /api/estatisticas e /api/estatisticas-complementares, calculadas uma vez
+-- por versão dos dados (database/stats_snapshot.py). JSON, e não JSONB, para preservar a
+-- ordem das chaves da resposta.
+CREATE TABLE estatisticas_snapshot (
+    nome TEXT PRIMARY KEY,
+    versao CHAR(64) NOT NULL,
+    conteudo JSON NOT NULL,
+    gerado_em TIMESTAMPTZ NOT NULL DEFAULT now()
+);
@@ -0,0 +1,6 @@
+-- Paginação por cursor de /api/operadoras/{cnpj}/despesas: a ordem (ano, trimestre) ganha o
+-- id como desempate, e o índice cobre a comparação (ano, trimestre, id) < (...) da página
+-- seguinte. Bancos criados depois desta migração já recebem o índice do db_schema.sql.
+DROP INDEX IF EXISTS despesas_consolidadas_operadora_id_ano_trimestre_idx;
+CREATE INDEX IF NOT EXISTS despesas_consolidadas_operadora_id_ano_trimestre_id_idx
+    ON despesas_consolidadas (operadora_id, ano, trimestre, id);
@@ -1,43 +1,31 @@
 -- ============================================================================
 -- QUERIES ANALÍTICAS (Item 3.4)
 -- IMPORTANTE: Os valores em despesas_consolidadas são YTD (Year-to-Date)
--- Por isso, usamos o valor do último trimestre como total do ano ou
--- desacumulamos usando LAG() para obter valores isolados por trimestre
+-- Por isso, usamos o valor isolado de cada trimestre, desacumulado uma única vez
+-- na carga e gravado em despesas_consolidadas.valor_trimestre
 -- ============================================================================
 
 -- QUERY 1: Top 5 operadoras com maior crescimento percentual
 -- Compara gasto ISOLADO do primeiro trimestre com gasto ISOLADO do último
-WITH periodo AS (
-    SELECT
-        MIN(ano * 10 + trimestre) AS primeiro_periodo,
-        MAX(ano * 10 + trimestre) AS ultimo_periodo
-    FROM despesas_consolidadas
+WITH primeiro_periodo AS (
+    SELECT ano, trimestre FROM despesas_consolidadas
+    ORDER BY ano, trimestre
+    LIMIT 1
 ),
-despesas_com_lag AS (
-    SELECT
-        dc.operadora_id,
-        dc.ano,
-        dc.trimestre,
-        dc.valor_despesa AS valor_ytd,
-        dc.valor_despesa - COALESCE(
-            LAG(dc.valor_despesa) OVER (
-                PARTITION BY dc.operadora_id, dc.ano 
-                ORDER BY dc.trimestre
-            ), 0
-        ) AS valor_isolado
-    FROM despesas_consolidadas dc
+ultimo_periodo AS (
+    SELECT ano, trimestre FROM despesas_consolidadas
+    ORDER BY ano DESC, trimestre DESC
+    LIMIT 1
 ),
 despesas_primeiro AS (
-    SELECT dl.operadora_id, dl.valor_isolado AS valor_despesa
-    FROM despesas_com_lag dl
-    CROSS JOIN periodo p
-    WHERE dl.ano * 10 + dl.trimestre = p.primeiro_periodo
+    SELECT dc.operadora_id, dc.valor_trimestre AS valor_despesa
+    FROM despesas_consolidadas dc
+    JOIN primeiro_periodo p USING (ano, trimestre)
 ),
 despesas_ultimo AS (
-    SELECT dl.operadora_id, dl.valor_isolado AS valor_despesa
-    FROM despesas_com_lag dl
-    CROSS JOIN periodo p
-    WHERE dl.ano * 10 + dl.trimestre = p.ultimo_periodo
+    SELECT dc.operadora_id, dc.valor_trimestre AS valor_despesa
+    FROM despesas_consolidadas dc
+    JOIN ultimo_periodo p USING (ano, trimestre)
 )
 SELECT
     o.cnpj,
@@ -58,27 +46,14 @@ LIMIT 5;
 
 -- QUERY 2: Distribuição de despesas por UF (top 5)
 -- Usa valores ISOLADOS (desacumulados) para soma e média corretas
-WITH despesas_isoladas AS (
-    SELECT
-        dc.operadora_id,
-        dc.ano,
-        dc.trimestre,
-        dc.valor_despesa - COALESCE(
-            LAG(dc.valor_despesa) OVER (
-                PARTITION BY dc.operadora_id, dc.ano 
-                ORDER BY dc.trimestre
-            ), 0
-        ) AS valor_isolado
-    FROM despesas_consolidadas dc
-)
 SELECT
     o.uf,
     COUNT(DISTINCT o.id) AS qtd_operadoras,
-    SUM(di.valor_isolado) AS total_despesas,
-    ROUND(AVG(di.valor_isolado), 2) AS media_por_registro,
-    ROUND(SUM(di.valor_isolado) / NULLIF(COUNT(DISTINCT o.id), 0), 2) AS media_por_operadora
-FROM despesas_isoladas di
-INNER JOIN operadoras o ON o.id = di.operadora_id
+    SUM(dc.valor_trimestre) AS total_despesas,
+    ROUND(AVG(dc.valor_trimestre), 2) AS media_por_registro,
+    ROUND(SUM(dc.valor_trimestre) / NULLIF(COUNT(DISTINCT o.id), 0), 2) AS media_por_operadora
+FROM despesas_consolidadas dc
+INNER JOIN operadoras o ON o.id = dc.operadora_id
 GROUP BY o.uf
 ORDER BY total_despesas DESC
 LIMIT 5;
@@ -87,16 +62,7 @@ LIMIT 5;
 -- QUERY 3: Operadoras com despesas acima da média em 2+ trimestres
 -- Usa valores ISOLADOS para comparação justa entre trimestres
 WITH despesas_isoladas AS (
-    SELECT
-        dc.operadora_id,
-        dc.ano,
-        dc.trimestre,
-        dc.valor_despesa - COALESCE(
-            LAG(dc.valor_despesa) OVER (
-                PARTITION BY dc.operadora_id, dc.ano 
-                ORDER BY dc.trimestre
-            ), 0
-        ) AS valor_isolado
+    SELECT dc.operadora_id, dc.ano, dc.trimestre, dc.valor_trimestre AS valor_isolado
     FROM despesas_consolidadas dc
 ),
 media_geral AS (
@@ -119,16 +85,7 @@ WHERE trimestres_acima >= 2;
 
 -- QUERY 3 (versão detalhada): Lista das operadoras acima da média
 WITH despesas_isoladas AS (
-    SELECT
-        dc.operadora_id,
-        dc.ano,
-        dc.trimestre,
-        dc.valor_despesa - COALESCE(
-            LAG(dc.valor_despesa) OVER (
-                PARTITION BY dc.operadora_id, dc.ano 
-                ORDER BY dc.trimestre
-            ), 0
-        ) AS valor_isolado
+    SELECT dc.operadora_id, dc.ano, dc.trimestre, dc.valor_trimestre AS valor_isolado
     FROM despesas_consolidadas dc
 ),
 media_geral AS (
@@ -19,6 +19,7 @@ export interface PaginatedResponse<T> {
   page: number
   limit: number
   total_pages: number
+  next_cursor?: string | null  // Próxima página por cursor (keyset); null na última
 }
 
 export interface DespesasResponse extends PaginatedResponse<Despesa> {